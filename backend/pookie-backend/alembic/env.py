@@ -30,7 +30,7 @@ from app.models import Base
 # Import all models to ensure they're registered with Base.metadata
 from app.models import (
     User, Something, Circle, Intention, IntentionCare, Story,
-    SomethingCircle, Action, ActionIntention, StoryAction
+    SomethingCircle, Action, ActionIntention, StoryAction, VectorIndexLogEntry
 )
 
 target_metadata = Base.metadata
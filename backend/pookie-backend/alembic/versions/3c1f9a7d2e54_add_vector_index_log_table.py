@@ -0,0 +1,42 @@
+"""add_vector_index_log_table
+
+Revision ID: 3c1f9a7d2e54
+Revises: 80625ba7815f
+Create Date: 2026-01-12 10:14:03.512840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f9a7d2e54'
+down_revision: Union[str, Sequence[str], None] = '80625ba7815f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Append-only write-ahead log of FAISS index changes, replayed on top of the latest snapshot
+    op.create_table(
+        'vector_index_log',
+        sa.Column('seq', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('op', sa.Enum('add', 'remove', name='vector_index_op'), nullable=False),
+        sa.Column('something_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('embedding', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_index(op.f('ix_vector_index_log_something_id'), 'vector_index_log', ['something_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_vector_index_log_something_id'), table_name='vector_index_log')
+    op.drop_table('vector_index_log')
+    sa.Enum(name='vector_index_op').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,43 @@
+"""add_vector_index_log_marks_table
+
+Revision ID: 9b4e2c61f0a8
+Revises: 3c1f9a7d2e54
+Create Date: 2026-10-17 09:41:27.118604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e2c61f0a8'
+down_revision: Union[str, Sequence[str], None] = '3c1f9a7d2e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # How far the index log was pruned, and holds that keep an offline reindex's entries from being pruned
+    marks = op.create_table(
+        'vector_index_log_marks',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # Entries pruned before this migration leave no record; assume everything before the oldest was pruned
+    op.execute(
+        marks.insert().from_select(
+            ['name', 'seq'],
+            sa.select(sa.literal('truncated'), sa.func.coalesce(sa.func.min(sa.column('seq')) - 1, 0))
+            .select_from(sa.table('vector_index_log', sa.column('seq')))
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('vector_index_log_marks')
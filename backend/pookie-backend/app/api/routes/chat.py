@@ -31,6 +31,7 @@ async def stream_chat(
     **Request Body:**
     - query (str): User's question (1-500 characters)
     - top_k (int, optional): Number of somethings to retrieve (1-50, default: 10)
+    - diversity (float, optional): Novelty vs relevance when choosing context (0-1, default: 0)
 
     **Response:** Server-Sent Events (SSE) stream
     - Content-Type: text/event-stream
@@ -56,7 +57,8 @@ async def stream_chat(
                 query=request.query,
                 user_id=user_id,
                 db=db,
-                top_k=request.top_k
+                top_k=request.top_k,
+                diversity=request.diversity
             ):
                 # Format as SSE: data: {json}\n\n
                 yield f"data: {json.dumps(event)}\n\n"
@@ -17,6 +17,7 @@ from app.models.something_circle import SomethingCircle
 from app.services.centroid_service import centroid_service
 from app.services.embedding_service import embedding_service
 from app.services.vector_service import vector_service
+from app.ml.vector_metadata import SearchFilter
 from loguru import logger
 
 router = APIRouter()
@@ -25,6 +26,20 @@ router = APIRouter()
 MAX_PREDICTION_RESULTS = 50  # Maximum predictions to return
 
 
+async def _sync_circle_filter(something_id: int, db: Session):
+    """Mirror a committed assignment change into the vector index's circle filter"""
+    circle_ids = [
+        row[0] for row in db.query(SomethingCircle.circle_id)
+        .filter(SomethingCircle.something_id == something_id)
+        .all()
+    ]
+    try:
+        await vector_service.set_something_circles(something_id, circle_ids)
+    except ValueError as e:
+        # The assignment itself is committed; only circle-filtered searches miss it
+        logger.warning(f"Could not index circles of something {something_id}: {e}")
+
+
 @router.post(
     "/{circle_id}/somethings/{something_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -125,6 +140,7 @@ async def assign_something_to_circle(
         # Commit both assignment and centroid update atomically
         db.commit()
         logger.info(f"Assigned something {something_id} to circle {circle_id} (user_assigned=True)")
+        await _sync_circle_filter(something_id, db)
 
         return None  # 204 No Content
 
@@ -238,6 +254,7 @@ async def remove_something_from_circle(
         # Commit both deletion and centroid update atomically
         db.commit()
         logger.info(f"Removed something {something_id} from circle {circle_id}")
+        await _sync_circle_filter(something_id, db)
 
         return None  # 204 No Content
 
@@ -319,12 +336,16 @@ async def get_predict_similar(
             .all()
         )
 
-        # Search FAISS index using centroid
-        # Request more than top_k to account for filtering
-        search_limit = min(top_k * 3, 150)  # Over-fetch to compensate for filtering
+        # Search FAISS index using centroid. The circle filter skips members
+        # inside the scan, but it's per-worker metadata that can lag behind
+        # assignments made on other workers, so the database stays the source
+        # of truth: over-fetch a little to cover members the filter missed
+        search_limit = min(top_k + len(assigned_something_ids), top_k * 3)
         faiss_results = await vector_service.search_similar(
             circle.centroid_embedding,
-            top_k=search_limit
+            top_k=search_limit,
+            user_id=user_id,
+            search_filter=SearchFilter(exclude_circle_ids=[circle_id])
         )
 
         # Filter and format results
@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from uuid import UUID
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_user_id
 from app.models.something import Something
@@ -39,9 +40,10 @@ async def create_something(
     **Process:**
     1. Create something in database
     2. Generate embedding from content
-    3. Add embedding to FAISS index
-    4. Generate meaning (text content only, async)
-    5. Save FAISS index every 10 somethings (debounced)
+    3. Flag it as a duplicate if one of the user's somethings is at least
+       DUPLICATE_SIMILARITY_THRESHOLD similar
+    4. Add embedding to FAISS index (persisted via the index write-ahead log)
+    5. Generate meaning (text content only, async)
 
     **Returns:**
     - 201 Created with SomethingResponse
@@ -62,6 +64,7 @@ async def create_something(
         db.refresh(db_something)
 
         logger.info(f"Created something {db_something.id} for user {user_id}")
+        duplicate_of, duplicate_similarity = None, None
 
         # Generate embedding from text content only
         # Note: Media URLs are not embedded - only actual text content
@@ -69,10 +72,27 @@ async def create_something(
         if something_data.content and something_data.content.strip():
             embedding = embedding_service.generate_embedding(something_data.content)
 
+            # Near-duplicate check against the user's existing somethings (before this one is indexed)
+            try:
+                duplicates = await vector_service.range_search_similar(
+                    embedding,
+                    min_similarity=settings.DUPLICATE_SIMILARITY_THRESHOLD,
+                    user_id=user_id
+                )
+                if duplicates:
+                    duplicate_of, duplicate_similarity = duplicates[0]
+                    logger.info(f"Something {db_something.id} duplicates {duplicate_of} (similarity {duplicate_similarity:.3f})")
+            except Exception as e:
+                # Graceful degradation - don't fail creation if the check fails
+                logger.warning(f"Duplicate check failed for something {db_something.id}: {str(e)}")
+
             # Add to FAISS index
             await vector_service.add_something_embedding(
                 something_id=db_something.id,
-                embedding=embedding
+                embedding=embedding,
+                user_id=user_id,
+                content_type=db_something.content_type,
+                created_at=db_something.created_at
             )
 
             logger.info(f"Generated embedding and added to FAISS index for something {db_something.id}")
@@ -90,12 +110,6 @@ async def create_something(
             else:
                 logger.debug(f"LLM service returned None for something {db_something.id} (stub mode or failure)")
 
-        # Debounced FAISS save every 10 somethings
-        # Use something ID modulo to avoid expensive count query
-        if db_something.id % 10 == 0:
-            await vector_service.save_to_storage()
-            logger.info(f"FAISS index saved at something ID: {db_something.id}")
-
         # Predict circle suggestions using centroid similarity (MVP-1)
         # This helps users organize their thoughts with AI assistance
         suggested_circles = []
@@ -120,6 +134,8 @@ async def create_something(
         # serialization_alias in the schema handles snake_case to camelCase output
         response = SomethingResponse.model_validate(db_something)
         response.suggested_circles = suggested_circles
+        response.duplicate_of = duplicate_of
+        response.duplicate_similarity = round(duplicate_similarity, 3) if duplicate_similarity is not None else None
         
         return response
 
@@ -306,7 +322,8 @@ async def delete_something(
     """
     Delete a something with ownership validation.
 
-    Cascade deletes SomethingCircle junction table entries.
+    Cascade deletes SomethingCircle junction table entries and removes the
+    something's embedding from the FAISS index.
 
     **Returns:**
     - 204 No Content on success
@@ -335,6 +352,9 @@ async def delete_something(
         db.delete(something)
         db.commit()
 
+        # Drop its vector so it stops taking top-k slots in searches
+        await vector_service.remove_something_embedding(something_id, user_id=user_id)
+
         logger.info(f"Deleted something {something_id} for user {user_id}")
 
         # Return 204 No Content (no response body)
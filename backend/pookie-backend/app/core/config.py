@@ -50,6 +50,114 @@ class Settings(BaseSettings):
     # ML Model Configuration
     MODEL_PATH: str = "./ml/model/"
     MODEL_NAME: str = "model.pkl"
+    EMBEDDING_MODEL: str = Field(
+        default="all-MiniLM-L6-v2",
+        description="sentence-transformers model for something and query embeddings (recorded in index manifests)"
+    )
+
+    # Vector Index Configuration
+    VECTOR_INDEX_TYPE: str = Field(
+        default="flat",
+        description="FAISS structure for a fresh index: flat (exact), hnsw or ivf (approximate), "
+                    "sq8 or pq (compressed codes re-scored from full-precision vectors on disk), "
+                    "pca or rp (first pass at 64/128 dimensions, re-scored at full dimension), "
+                    "binary (1-bit sign hash per dimension, Hamming shortlist re-scored at full precision)"
+    )
+    VECTOR_INDEX_AUTO_THRESHOLD: int = Field(
+        default=100_000,
+        description="Live vector count above which a flat index is rebuilt as VECTOR_INDEX_AUTO_TYPE"
+    )
+    VECTOR_INDEX_AUTO_TYPE: str = "hnsw"
+    VECTOR_STORAGE_DTYPE: str = Field(
+        default="float32",
+        description="Element type of embeddings at rest (re-scoring .vectors sidecar, index log, reindex "
+                    "checkpoints): float32, or float16 for half the bytes, widened to float32 for scoring"
+    )
+    VECTOR_INDEX_EXACT_MAX_VECTORS: int = Field(
+        default=128,
+        description="Per-user partitions up to this size are scored exactly with NumPy instead of FAISS; "
+                    "benchmark_vector_search.py measures the crossover on a host"
+    )
+    VECTOR_INDEX_MMAP: bool = Field(
+        default=False,
+        description="Memory-map the index read-only so uvicorn workers share its pages"
+    )
+    VECTOR_INDEX_CACHE: bool = Field(
+        default=False,
+        description="Keep downloaded index versions in VECTOR_INDEX_DIR and load a version from there when its "
+                    "checksums match the storage pointer (off by default to use no local disk; always on with "
+                    "VECTOR_INDEX_MMAP)"
+    )
+    VECTOR_INDEX_DIR: str = Field(
+        default="./ml/index/",
+        description="Local directory for index artifacts when VECTOR_INDEX_MMAP or VECTOR_INDEX_CACHE is enabled"
+    )
+    VECTOR_INDEX_STORAGE: str = Field(
+        default="supabase",
+        description="Where index versions are persisted: supabase (Storage bucket) or local (VECTOR_INDEX_STORAGE_DIR)"
+    )
+    VECTOR_INDEX_STORAGE_DIR: str = Field(
+        default="./ml/index-storage/",
+        description="Directory standing in for the storage bucket when VECTOR_INDEX_STORAGE is local"
+    )
+    VECTOR_INDEX_STORAGE_CODEC: str = Field(
+        default="zstd",
+        description="Compression of uploaded index artifacts: zstd, zlib or none (downloads use the codec "
+                    "recorded in the version pointer)"
+    )
+    VECTOR_INDEX_STORAGE_CHUNK_MB: float = Field(
+        default=32.0,
+        description="Index artifacts are uploaded as compressed chunks of this many (uncompressed) megabytes"
+    )
+    VECTOR_INDEX_STORAGE_CONCURRENCY: int = Field(
+        default=4,
+        description="Chunks of one index artifact uploaded or downloaded at a time"
+    )
+    VECTOR_INDEX_SNAPSHOT_INTERVAL: int = Field(
+        default=1000,
+        description="Logged index changes after which a full snapshot is uploaded to storage"
+    )
+    VECTOR_INDEX_FLUSH_SECONDS: float = Field(
+        default=300.0,
+        description="Maximum time unsaved index changes wait before a snapshot is uploaded"
+    )
+    VECTOR_INDEX_KEEP_VERSIONS: int = Field(
+        default=2,
+        description="Index versions kept in storage; older ones are deleted after an upload"
+    )
+    VECTOR_INDEX_RECONCILE: bool = Field(
+        default=True,
+        description="On startup, embed somethings missing from the index and drop vectors of deleted somethings"
+    )
+    VECTOR_INDEX_SYNC_SECONDS: float = Field(
+        default=2.0,
+        description="Interval at which each worker applies index changes other workers logged; 0 disables"
+    )
+    VECTOR_INDEX_SYNC_GAP_SECONDS: float = Field(
+        default=10.0,
+        description="How long a gap in log sequence numbers is treated as an uncommitted write before it is skipped"
+    )
+    VECTOR_INDEX_SERVER_SOCKET: str = Field(
+        default="",
+        description="Unix socket of a shared index server (python -m app.services.index_server); "
+                    "empty keeps the index inside each API worker"
+    )
+    VECTOR_INDEX_SERVER_POOL_SIZE: int = Field(
+        default=4,
+        description="Connections each API worker keeps open to the index server"
+    )
+    DUPLICATE_SIMILARITY_THRESHOLD: float = Field(
+        default=0.95,
+        description="Cosine similarity to an existing something of the same user at which a capture is flagged as a duplicate"
+    )
+    RETRIEVAL_RECENCY_HALF_LIFE_DAYS: float = Field(
+        default=0.0,
+        description="Half-life of the recency boost applied to chat retrieval candidates inside the index (0 disables it)"
+    )
+    RETRIEVAL_RECENCY_WEIGHT: float = Field(
+        default=0.1,
+        description="Recency boost of a brand-new something, added to its cosine similarity"
+    )
 
     # OpenRouter API Configuration (for chat/LLM features)
     OPENROUTER_API_KEY: str = Field(
@@ -28,9 +28,15 @@ async def on_startup():
     # Load embedding model into memory
     embedding_service.load_model()
 
-    # Load FAISS index from Supabase Storage
+    # Load FAISS index from index storage (VECTOR_INDEX_STORAGE)
     await vector_service.initialize()
 
+    # Upload index snapshots in the background, off the request path
+    vector_service.start_flusher()
+
+    # Apply captures handled by other workers as they are logged
+    vector_service.start_change_feed()
+
     logger.info("Startup complete - all services ready")
 
 
@@ -38,6 +44,11 @@ async def on_shutdown():
     """FastAPI shutdown event handler"""
     logger.info("Application shutdown")
 
+    await vector_service.stop_change_feed()
+
+    # Final snapshot so nothing added since the last flush is left only in the log
+    await vector_service.stop_flusher()
+
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     def start_app() -> None:
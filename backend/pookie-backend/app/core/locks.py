@@ -0,0 +1,72 @@
+"""
+Asyncio synchronization primitives.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class AsyncRWLock:
+    """Reader/writer lock for coroutines.
+
+    Any number of readers may hold the lock at once; a writer holds it alone.
+    Waiting writers block new readers, so a steady stream of searches can't
+    starve compaction or an index swap.
+
+    Usage:
+        async with lock.read():
+            ...  # e.g. search, possibly in a worker thread
+        async with lock.write():
+            ...  # e.g. add, compact, swap
+    """
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        """Hold the lock shared with other readers"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and self._waiting_writers == 0)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        """Hold the lock exclusively"""
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and self._readers == 0)
+            except BaseException:
+                # Cancelled while waiting: stop blocking new readers
+                self._waiting_writers -= 1
+                self._cond.notify_all()
+                raise
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+    @property
+    def readers(self) -> int:
+        """Number of coroutines currently holding the read lock"""
+        return self._readers
+
+    @property
+    def write_locked(self) -> bool:
+        """Whether a writer currently holds the lock"""
+        return self._writer
@@ -0,0 +1,42 @@
+import numpy as np
+
+# Set bits of every byte value, for popcount on NumPy versions without np.bitwise_count
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def sign_codes(vectors: np.ndarray) -> np.ndarray:
+    """1-bit-per-dimension sign hash of each row, packed into uint64 words
+
+    Bit i of a code is set when dimension i is positive, in the same
+    little-endian bit order FAISS IndexLSH uses for its codes.
+
+    Returns:
+        Array of shape (n, ceil(dimension / 64)), uint64
+    """
+    return as_words(np.packbits(np.asarray(vectors) > 0, axis=1, bitorder="little"))
+
+
+def as_words(codes: np.ndarray) -> np.ndarray:
+    """View byte codes of shape (n, code_size) as uint64 words, zero-padding each row to a multiple of 8 bytes"""
+    codes = np.ascontiguousarray(codes, dtype=np.uint8)
+    padding = -codes.shape[1] % 8
+    if padding:
+        codes = np.pad(codes, ((0, 0), (0, padding)))
+    return codes.view(np.uint64)
+
+
+def hamming_distances(query_codes: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Hamming distance between every query code and every code (XOR of uint64 words, then popcount)
+
+    Args:
+        query_codes: Words of shape (m, words)
+        codes: Words of shape (n, words)
+
+    Returns:
+        Array of shape (m, n), int32
+    """
+    differing = query_codes[:, np.newaxis, :] ^ codes[np.newaxis, :, :]
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(differing).sum(axis=2, dtype=np.int32)
+    bytes_view = differing.view(np.uint8).reshape(len(query_codes), len(codes), -1)
+    return POPCOUNT_TABLE[bytes_view].sum(axis=2, dtype=np.int32)
@@ -0,0 +1,246 @@
+import time
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+# Partition sizes timed when measuring where exact NumPy scoring stops beating FAISS
+CALIBRATION_SIZES = (32, 64, 128, 256, 512, 1024, 2048)
+
+
+class ExactPartition:
+    """One user's vectors as a dense float32 matrix, scored exactly with NumPy.
+
+    For a few hundred vectors a single ``matrix @ query`` plus
+    ``np.argpartition`` is cheaper than a FAISS call and the position-to-ID
+    mapping around it. Removals compact the matrix immediately, so there are
+    no tombstones. Has the subset of the VectorIndex interface that
+    UserIndexManager uses.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._count = 0
+
+    def add(self, something_id: int, embedding: np.ndarray):
+        """Add one embedding (normalized here)
+
+        Raises:
+            ValueError: If embedding has the wrong shape or zero norm
+        """
+        self.add_batch([something_id], np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+
+    def add_batch(self, something_ids: Sequence[int], embeddings: np.ndarray):
+        """Add embeddings of shape (n, dimension) (normalized here)
+
+        Raises:
+            ValueError: If shapes don't match or any embedding has zero norm
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Embeddings must have shape (n, {self.dimension}), got {embeddings.shape}")
+        if len(something_ids) != len(embeddings):
+            raise ValueError(f"Got {len(something_ids)} IDs for {len(embeddings)} embeddings")
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        if np.any(norms < 1e-10):
+            raise ValueError("Cannot add embeddings with zero or near-zero norm")
+
+        needed = self._count + len(embeddings)
+        if needed > len(self._ids):
+            # Grow geometrically so one-at-a-time adds stay amortized O(1)
+            capacity = max(needed, 2 * len(self._ids), 64)
+            vectors = np.empty((capacity, self.dimension), dtype=np.float32)
+            vectors[:self._count] = self._vectors[:self._count]
+            ids = np.empty(capacity, dtype=np.int64)
+            ids[:self._count] = self._ids[:self._count]
+            self._vectors, self._ids = vectors, ids
+        self._vectors[self._count:needed] = embeddings / norms
+        self._ids[self._count:needed] = something_ids
+        self._count = needed
+
+    def remove(self, something_ids: Iterable[int]) -> int:
+        """Remove embeddings by ID
+
+        Returns:
+            Number of vectors removed
+        """
+        wanted = np.fromiter(something_ids, dtype=np.int64)
+        keep = ~np.isin(self._ids[:self._count], wanted)
+        kept = int(keep.sum())
+        removed = self._count - kept
+        if removed:
+            self._vectors[:kept] = self._vectors[:self._count][keep]
+            self._ids[:kept] = self._ids[:self._count][keep]
+            self._count = kept
+        return removed
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Exact top-k of one query by cosine similarity
+
+        Returns:
+            List of (something_id, similarity_score) tuples, sorted by similarity desc
+
+        Raises:
+            ValueError: If the query has the wrong shape or zero norm, or top_k isn't positive
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query must have shape ({self.dimension},), got {query.shape}")
+        if top_k <= 0:
+            raise ValueError(f"top_k must be positive, got {top_k}")
+        k = min(top_k, self._count)
+        if k == 0:
+            return []
+        norm = np.linalg.norm(query)
+        if norm < 1e-10:
+            raise ValueError(f"Query embedding has zero or near-zero norm ({norm}), cannot normalize")
+
+        # One matrix-vector product, then a partial sort of the k best
+        similarities = self._vectors[:self._count] @ (query / norm)
+        top = np.argpartition(similarities, self._count - k)[self._count - k:] if k < self._count else np.arange(k)
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return list(zip(self._ids[top].tolist(), similarities[top].tolist()))
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        """Exact top-k of each query by cosine similarity
+
+        Returns:
+            One list of (something_id, similarity_score) tuples per query, sorted by similarity desc
+
+        Raises:
+            ValueError: If queries have the wrong shape or zero norm, or top_k isn't positive
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.dimension:
+            raise ValueError(f"Queries must have shape (m, {self.dimension}), got {queries.shape}")
+        if top_k <= 0:
+            raise ValueError(f"top_k must be positive, got {top_k}")
+        k = min(top_k, self._count)
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        if np.any(norms < 1e-10):
+            raise ValueError("Query embedding has zero or near-zero norm, cannot normalize")
+
+        similarities = (queries / norms) @ self._vectors[:self._count].T
+        if k < self._count:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(self._count), (len(queries), k))
+        top_sims = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+        positions = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+        ids = self._ids[positions]
+        return [list(zip(row_ids.tolist(), row_sims.tolist())) for row_ids, row_sims in zip(ids, top_sims)]
+
+    def range_search(self, query_embedding: np.ndarray, min_similarity: float) -> List[Tuple[int, float]]:
+        """Every vector whose cosine similarity to the query is at least min_similarity
+
+        Returns:
+            List of (something_id, similarity_score) tuples, sorted by similarity desc
+
+        Raises:
+            ValueError: If the query has the wrong shape or zero norm, or min_similarity is out of range
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query must have shape ({self.dimension},), got {query.shape}")
+        if not -1.0 <= min_similarity <= 1.0:
+            raise ValueError(f"min_similarity must be in [-1, 1], got {min_similarity}")
+        if self._count == 0:
+            return []
+        norm = np.linalg.norm(query)
+        if norm < 1e-10:
+            raise ValueError(f"Query embedding has zero or near-zero norm ({norm}), cannot normalize")
+
+        similarities = self._vectors[:self._count] @ (query / norm)
+        hits = np.flatnonzero(similarities >= min_similarity)
+        hits = hits[np.argsort(-similarities[hits], kind="stable")]
+        return list(zip(self._ids[hits].tolist(), similarities[hits].tolist()))
+
+    def embeddings(self) -> Tuple[List[int], np.ndarray]:
+        """(something_ids, normalized embeddings) of every stored vector"""
+        return self._ids[:self._count].tolist(), self._vectors[:self._count].copy()
+
+    def needs_compaction(self) -> bool:
+        """Always False: removals compact immediately"""
+        return False
+
+    def compact(self) -> int:
+        return 0
+
+    @property
+    def something_ids(self) -> np.ndarray:
+        return self._ids[:self._count]
+
+    @property
+    def total_vectors(self) -> int:
+        return self._count
+
+    @property
+    def live_vectors(self) -> int:
+        return self._count
+
+
+def time_search_paths(
+    dimension: int = 384,
+    sizes: Sequence[int] = CALIBRATION_SIZES,
+    top_k: int = 10,
+    repeats: int = 20
+) -> List[Tuple[int, float, float]]:
+    """Median single-query latency of ExactPartition and a flat VectorIndex per partition size
+
+    VectorIndex's debug logging is disabled while timing so the result doesn't
+    depend on the log level.
+
+    Returns:
+        (size, exact seconds, FAISS seconds) per size
+    """
+    from app.ml.vector_index import VectorIndex
+
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(dimension).astype(np.float32)
+    timings = []
+    logger.disable("app.ml.vector_index")
+    try:
+        for size in sizes:
+            embeddings = rng.standard_normal((size, dimension)).astype(np.float32)
+            exact = ExactPartition(dimension)
+            exact.add_batch(list(range(size)), embeddings)
+            flat = VectorIndex(dimension=dimension)
+            flat.add_batch(list(range(size)), embeddings)
+
+            medians = []
+            for partition in (exact, flat):
+                partition.search(query, top_k)  # Warm up
+                samples = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    partition.search(query, top_k)
+                    samples.append(time.perf_counter() - start)
+                medians.append(float(np.median(samples)))
+            timings.append((size, medians[0], medians[1]))
+    finally:
+        logger.enable("app.ml.vector_index")
+    return timings
+
+
+def measure_crossover(dimension: int = 384, sizes: Sequence[int] = CALIBRATION_SIZES, top_k: int = 10) -> int:
+    """Largest partition size up to which exact NumPy scoring is at least as fast as FAISS on this host
+
+    Depends on the BLAS NumPy is linked against; run it (or
+    benchmark_vector_search.py for the full table) on a deployment host to
+    tune VECTOR_INDEX_EXACT_MAX_VECTORS.
+
+    Returns:
+        The crossover size, or 0 if FAISS wins even at the smallest size
+    """
+    crossover = 0
+    for size, exact_seconds, faiss_seconds in time_search_paths(dimension, sizes, top_k):
+        if exact_seconds > faiss_seconds:
+            break
+        crossover = size
+    return crossover
@@ -0,0 +1,160 @@
+"""
+Binary sidecar formats for VectorIndex artifacts.
+
+The id mapping is stored as a small fixed header followed by a raw little-endian
+int64 array, so it can be memory-mapped without copying or unpickling. Quantized
+indices keep their full-precision vectors the same way (a float32 matrix, or a
+float16 one in the half-size storage tier).
+"""
+import hashlib
+import pickle
+import struct
+
+import numpy as np
+from loguru import logger
+
+IDS_MAGIC = b"PKIDS\x00\x00\x00"
+IDS_FORMAT_VERSION = 1
+# magic (8s), format version (I), reserved (I), count (Q); data starts at IDS_HEADER_SIZE
+IDS_HEADER = struct.Struct("<8sIIQ")
+IDS_HEADER_SIZE = 64  # Keeps the int64 payload cache-line aligned for mmap
+
+VECTORS_MAGIC = b"PKVECS\x00\x00"
+VECTORS_FORMAT_VERSION = 2
+# magic (8s), format version (I), dimension (I), count (Q); data starts at VECTORS_HEADER_SIZE
+VECTORS_HEADER = struct.Struct("<8sIIQ")
+# Version 2 follows with the element type name (8s); version 1 files (still written for float32) are float32
+VECTORS_DTYPE = struct.Struct("<8s")
+VECTORS_HEADER_SIZE = 64
+# Element types a vectors file can hold, by name
+VECTOR_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+CHECKSUM_CHUNK_BYTES = 1 << 20
+
+
+def write_ids(filepath: str, ids: np.ndarray):
+    """Write an id mapping in the versioned binary format
+
+    Args:
+        filepath: Destination path (conventionally <index>.faiss.ids)
+        ids: 1D array of something IDs, one per index position
+    """
+    ids = np.ascontiguousarray(ids, dtype="<i8")
+    header = IDS_HEADER.pack(IDS_MAGIC, IDS_FORMAT_VERSION, 0, len(ids))
+    with open(filepath, "wb") as f:
+        f.write(header.ljust(IDS_HEADER_SIZE, b"\x00"))
+        f.write(ids.tobytes())
+
+
+def read_ids(filepath: str, mmap: bool = True) -> np.ndarray:
+    """Read an id mapping written by write_ids (or a legacy pickled list)
+
+    Args:
+        filepath: Path to the .ids file
+        mmap: Map the payload read-only instead of reading it into memory
+
+    Returns:
+        1D int64 array of something IDs
+
+    Raises:
+        ValueError: If the file is truncated or uses an unsupported format version
+    """
+    with open(filepath, "rb") as f:
+        header = f.read(IDS_HEADER_SIZE)
+
+        if not header.startswith(IDS_MAGIC):
+            # Artifacts saved before the binary format: a pickled List[int]
+            logger.warning(f"Reading legacy pickled id mapping from {filepath}")
+            f.seek(0)
+            return np.asarray(pickle.load(f), dtype=np.int64)
+
+    if len(header) < IDS_HEADER.size:
+        raise ValueError(f"Truncated id mapping header in {filepath}")
+    _, version, _, count = IDS_HEADER.unpack(header[:IDS_HEADER.size])
+    if version != IDS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported id mapping format version {version} in {filepath}")
+
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    if mmap:
+        return np.memmap(filepath, dtype="<i8", mode="r", offset=IDS_HEADER_SIZE, shape=(count,))
+    ids = np.fromfile(filepath, dtype="<i8", count=count, offset=IDS_HEADER_SIZE)
+    if len(ids) != count:
+        raise ValueError(f"Truncated id mapping in {filepath}: expected {count} ids, got {len(ids)}")
+    return ids
+
+
+def write_vectors(filepath: str, vectors: np.ndarray, dtype: str = "float32"):
+    """Write a matrix in the versioned binary format
+
+    float32 files keep the version 1 layout, so readers that predate float16
+    storage can still open them.
+
+    Args:
+        filepath: Destination path (conventionally <index>.faiss.vectors)
+        vectors: Array of shape (count, dimension), one row per index position
+        dtype: Element type to store, a key of VECTOR_DTYPES
+
+    Raises:
+        ValueError: If dtype is unknown
+    """
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype {dtype!r}, expected one of {sorted(VECTOR_DTYPES)}")
+    vectors = np.ascontiguousarray(vectors, dtype=VECTOR_DTYPES[dtype])
+    if dtype == "float32":
+        header = VECTORS_HEADER.pack(VECTORS_MAGIC, 1, vectors.shape[1], vectors.shape[0])
+    else:
+        header = VECTORS_HEADER.pack(VECTORS_MAGIC, VECTORS_FORMAT_VERSION, vectors.shape[1], vectors.shape[0])
+        header += VECTORS_DTYPE.pack(dtype.encode())
+    with open(filepath, "wb") as f:
+        f.write(header.ljust(VECTORS_HEADER_SIZE, b"\x00"))
+        f.write(vectors.tobytes())
+
+
+def read_vectors(filepath: str, mmap: bool = True) -> np.ndarray:
+    """Read a matrix written by write_vectors, in its stored element type
+
+    Args:
+        filepath: Path to the .vectors file
+        mmap: Map the payload read-only instead of reading it into memory
+
+    Returns:
+        Array of shape (count, dimension), float32 or float16
+
+    Raises:
+        ValueError: If the file is not a vectors file, is truncated or uses an unsupported version
+    """
+    with open(filepath, "rb") as f:
+        header = f.read(VECTORS_HEADER_SIZE)
+
+    if len(header) < VECTORS_HEADER.size or not header.startswith(VECTORS_MAGIC):
+        raise ValueError(f"Not a vectors file: {filepath}")
+    _, version, dimension, count = VECTORS_HEADER.unpack(header[:VECTORS_HEADER.size])
+    if version == 1:
+        dtype = VECTOR_DTYPES["float32"]
+    elif version == VECTORS_FORMAT_VERSION:
+        name, = VECTORS_DTYPE.unpack_from(header, VECTORS_HEADER.size)
+        name = name.rstrip(b"\x00").decode()
+        if name not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype {name!r} in {filepath}")
+        dtype = VECTOR_DTYPES[name]
+    else:
+        raise ValueError(f"Unsupported vectors format version {version} in {filepath}")
+
+    if count == 0:
+        return np.empty((0, dimension), dtype=dtype)
+    if mmap:
+        return np.memmap(filepath, dtype=dtype, mode="r", offset=VECTORS_HEADER_SIZE, shape=(count, dimension))
+    vectors = np.fromfile(filepath, dtype=dtype, count=count * dimension, offset=VECTORS_HEADER_SIZE)
+    if len(vectors) != count * dimension:
+        raise ValueError(f"Truncated vectors file {filepath}: expected {count} rows")
+    return vectors.reshape(count, dimension)
+
+
+def file_checksum(filepath: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,48 @@
+from typing import List
+
+import numpy as np
+
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, diversity: float) -> List[int]:
+    """Pick k candidates by maximal marginal relevance
+
+    Each step takes the candidate maximizing
+    ``(1 - diversity) * relevance - diversity * (highest cosine similarity to anything already picked)``.
+    The pairwise similarity matrix is computed once; every step then costs one
+    pass over the candidates (O(k * n) after the n x n product).
+
+    Args:
+        relevance: Relevance score per candidate, shape (n,)
+        embeddings: Candidate embeddings, shape (n, dimension)
+        k: Number of candidates to pick
+        diversity: 0 ranks purely by relevance, 1 purely by novelty
+
+    Returns:
+        Positions of the picked candidates, in pick order
+
+    Raises:
+        ValueError: If shapes don't match, diversity is outside [0, 1] or an embedding has zero norm
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if not 0.0 <= diversity <= 1.0:
+        raise ValueError(f"diversity must be in [0, 1], got {diversity}")
+    if embeddings.ndim != 2 or len(embeddings) != len(relevance):
+        raise ValueError(f"Expected {len(relevance)} embeddings, got shape {embeddings.shape}")
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    if np.any(norms < 1e-10):
+        raise ValueError("Cannot diversify embeddings with zero or near-zero norm")
+
+    unit = embeddings / norms
+    similarity = unit @ unit.T
+    redundancy = np.zeros(len(relevance), dtype=np.float32)  # Highest similarity to a picked candidate
+    available = np.ones(len(relevance), dtype=bool)
+    picked = []
+    for _ in range(min(k, len(relevance))):
+        scores = (1.0 - diversity) * relevance - diversity * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
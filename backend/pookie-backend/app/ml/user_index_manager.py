@@ -0,0 +1,252 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from app.ml.exact_partition import ExactPartition
+from app.ml.vector_index import VectorIndex
+
+# Loader signature: user_id -> (something_ids, embeddings of shape (n, dimension))
+PartitionLoader = Callable[[str], Tuple[List[int], np.ndarray]]
+Partition = Union[ExactPartition, VectorIndex]
+
+# NumPy/FAISS crossover reported by benchmark_vector_search.py (384-dim, top_k=10)
+DEFAULT_EXACT_MAX_VECTORS = 128
+
+
+class UserIndexManager:
+    """Keeps one VectorIndex partition per user so searches only scan that user's vectors.
+
+    Partitions are created lazily on first access through ``loader`` and kept in
+    an LRU cache. When the resident partitions exceed ``max_memory_bytes`` the
+    least recently used ones are dropped; they are rebuilt by the loader on the
+    next access.
+
+    Each partition is planned from its live size: small ones are an
+    ExactPartition (one NumPy matrix product per query), mid-sized ones a flat
+    FAISS index, and ones of at least ``ann_min_vectors`` an approximate index.
+    An exact partition that outgrows ``exact_max_vectors`` is promoted in
+    place; one that shrinks to half of it is demoted after compaction.
+
+    The cache itself is thread-safe so searches can run from worker threads;
+    callers must still keep writes to a partition from overlapping its searches.
+    """
+
+    def __init__(
+        self,
+        dimension: int = 384,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        loader: Optional[PartitionLoader] = None,
+        exact_max_vectors: int = DEFAULT_EXACT_MAX_VECTORS,
+        ann_min_vectors: Optional[int] = None,
+        ann_index_type: str = "hnsw"
+    ):
+        """Initialize an empty partition cache
+
+        Args:
+            dimension: Embedding dimension of every partition
+            max_memory_bytes: Memory budget for resident partitions (float32 vectors)
+            loader: Callable that returns (something_ids, embeddings) for a user
+            exact_max_vectors: Largest partition scored exactly with NumPy (see
+                measure_crossover to tune it for a host)
+            ann_min_vectors: Partitions at least this large are loaded as
+                ann_index_type (None: always flat)
+            ann_index_type: Approximate FAISS structure for large partitions
+        """
+        if max_memory_bytes <= 0:
+            raise ValueError(f"max_memory_bytes must be positive, got {max_memory_bytes}")
+        if exact_max_vectors < 0:
+            raise ValueError(f"exact_max_vectors must be non-negative, got {exact_max_vectors}")
+        self.dimension = dimension
+        self.max_memory_bytes = max_memory_bytes
+        self.loader = loader
+        self.exact_max_vectors = exact_max_vectors
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_index_type = ann_index_type
+        self._partitions: "OrderedDict[str, Partition]" = OrderedDict()
+        self._mutex = threading.RLock()  # Guards _partitions; loaders run outside it
+        logger.debug(f"Initialized UserIndexManager (dimension={dimension}, budget={max_memory_bytes} bytes)")
+
+    def plan(self, live_vectors: int) -> str:
+        """Search structure for a partition of live_vectors: "exact", "flat" or ann_index_type"""
+        if live_vectors <= self.exact_max_vectors:
+            return "exact"
+        if self.ann_min_vectors is not None and live_vectors >= self.ann_min_vectors:
+            return self.ann_index_type
+        return "flat"
+
+    def get(self, user_id: str) -> Partition:
+        """Return the user's partition, loading it on a cache miss
+
+        Args:
+            user_id: Owner of the partition
+
+        Returns:
+            ExactPartition or VectorIndex holding only this user's embeddings
+        """
+        user_id = str(user_id)
+        with self._mutex:
+            partition = self._partitions.get(user_id)
+            if partition is not None:
+                self._partitions.move_to_end(user_id)
+                return partition
+
+        something_ids, embeddings = [], np.empty((0, self.dimension), dtype=np.float32)
+        if self.loader is not None:
+            something_ids, embeddings = self.loader(user_id)
+        partition = self._build(list(something_ids), embeddings)
+
+        with self._mutex:
+            # Another thread may have loaded the same user meanwhile; keep the first copy
+            partition = self._partitions.setdefault(user_id, partition)
+            self._partitions.move_to_end(user_id)
+            self._evict_if_needed(keep=user_id)
+        logger.debug(f"Loaded partition for user {user_id} ({partition.total_vectors} vectors, {self.plan(partition.live_vectors)})")
+        return partition
+
+    def _build(self, something_ids: List[int], embeddings: np.ndarray) -> Partition:
+        """Partition of the structure planned for len(something_ids) vectors"""
+        plan = self.plan(len(something_ids))
+        if plan == "exact":
+            partition = ExactPartition(self.dimension)
+        else:
+            partition = VectorIndex(dimension=self.dimension, index_type=plan)
+        if len(something_ids) > 0:
+            partition.add_batch(something_ids, embeddings)
+        return partition
+
+    def add(self, user_id: str, something_id: int, embedding: np.ndarray):
+        """Add an embedding to the user's partition if it is resident
+
+        Non-resident partitions are left alone: the loader picks the vector up
+        the next time the partition is built, so writes never trigger a load.
+
+        Args:
+            user_id: Owner of the embedding
+            something_id: Unique identifier for this embedding
+            embedding: Numpy array of shape (dimension,)
+        """
+        with self._mutex:
+            partition = self._partitions.get(str(user_id))
+            if partition is None:
+                return
+            partition.add(something_id, embedding)
+            if isinstance(partition, ExactPartition) and partition.live_vectors > self.exact_max_vectors:
+                self._partitions[str(user_id)] = self._build(*partition.embeddings())
+            self._evict_if_needed(keep=str(user_id))
+
+    def remove(self, something_ids: Iterable[int], user_id: Optional[str] = None) -> int:
+        """Remove embeddings from resident partitions
+
+        Partitions are small, so they are compacted inline once their
+        tombstone ratio passes the threshold.
+
+        Args:
+            something_ids: IDs to remove
+            user_id: Owner of the IDs; if None every resident partition is checked
+
+        Returns:
+            Number of vectors removed
+        """
+        something_ids = list(something_ids)
+        with self._mutex:
+            if user_id is not None:
+                partition = self._partitions.get(str(user_id))
+                partitions = [(str(user_id), partition)] if partition is not None else []
+            else:
+                partitions = list(self._partitions.items())
+
+        removed = 0
+        for owner, partition in partitions:
+            removed += partition.remove(something_ids)
+            if partition.needs_compaction():
+                partition.compact()
+                if partition.live_vectors <= self.exact_max_vectors // 2:
+                    # After compaction every stored vector is live
+                    exact = self._build(*partition.get_embeddings(partition.something_ids.tolist()))
+                    with self._mutex:
+                        if self._partitions.get(owner) is partition:
+                            self._partitions[owner] = exact
+        return removed
+
+    def search(self, user_id: str, query_embedding: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Search only the given user's vectors
+
+        Args:
+            user_id: Owner whose partition to search
+            query_embedding: Query vector of shape (dimension,)
+            top_k: Number of results to return
+
+        Returns:
+            List of (something_id, similarity_score) tuples, sorted by similarity desc
+        """
+        return self.get(user_id).search(query_embedding, top_k)
+
+    def search_batch(self, user_id: str, query_embeddings: np.ndarray, top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        """Search several queries against the given user's vectors in one call
+
+        Args:
+            user_id: Owner whose partition to search
+            query_embeddings: Query vectors of shape (m, dimension)
+            top_k: Number of results to return per query
+
+        Returns:
+            One list of (something_id, similarity_score) tuples per query
+        """
+        return self.get(user_id).search_batch(query_embeddings, top_k)
+
+    def range_search(self, user_id: str, query_embedding: np.ndarray, min_similarity: float) -> List[Tuple[int, float]]:
+        """Every vector of the given user at least min_similarity to the query
+
+        Args:
+            user_id: Owner whose partition to search
+            query_embedding: Query vector of shape (dimension,)
+            min_similarity: Cosine similarity threshold in [-1, 1]
+
+        Returns:
+            List of (something_id, similarity_score) tuples, sorted by similarity desc
+        """
+        return self.get(user_id).range_search(query_embedding, min_similarity)
+
+    def evict(self, user_id: str) -> bool:
+        """Drop a user's partition from memory
+
+        Returns:
+            True if a resident partition was evicted
+        """
+        with self._mutex:
+            return self._partitions.pop(str(user_id), None) is not None
+
+    def clear(self):
+        """Drop every resident partition (e.g. after the global index is reloaded)"""
+        with self._mutex:
+            self._partitions.clear()
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory held by resident partitions"""
+        with self._mutex:
+            return sum(self._partition_bytes(p) for p in self._partitions.values())
+
+    def __contains__(self, user_id: str) -> bool:
+        return str(user_id) in self._partitions
+
+    def __len__(self) -> int:
+        return len(self._partitions)
+
+    def _partition_bytes(self, partition: Partition) -> int:
+        return partition.total_vectors * self.dimension * 4
+
+    def _evict_if_needed(self, keep: str):
+        """Evict least recently used partitions until under the memory budget"""
+        used = self.memory_bytes
+        while used > self.max_memory_bytes and len(self._partitions) > 1:
+            user_id, partition = next(iter(self._partitions.items()))
+            if user_id == keep:
+                self._partitions.move_to_end(user_id)
+                continue
+            self._partitions.pop(user_id)
+            used -= self._partition_bytes(partition)
+            logger.debug(f"Evicted partition for user {user_id} ({partition.total_vectors} vectors)")
@@ -1,30 +1,134 @@
+import copy
 import faiss
 import numpy as np
-from typing import List, Tuple
-import pickle
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import json
 import os
+from datetime import datetime, timezone
 from loguru import logger
+from app.ml.binary_codes import as_words, hamming_distances, sign_codes
+from app.ml.index_io import VECTOR_DTYPES, file_checksum, read_ids, write_ids
+from app.ml.vector_metadata import RecencyDecay, SearchFilter, VectorMetadata
+from app.ml.vector_store import VectorStore
+
+# Supported FAISS structures and their tunable parameters
+INDEX_TYPES = ("flat", "hnsw", "ivf", "sq8", "pq", "pca", "rp", "binary")
+DEFAULT_INDEX_PARAMS: Dict[str, Dict[str, int]] = {
+    "flat": {},
+    "hnsw": {"M": 32, "ef_construction": 80, "ef_search": 64},
+    "ivf": {"nlist": 1024, "nprobe": 16},
+    # Quantized codes shortlist rerank_factor * top_k candidates, re-scored exactly
+    "sq8": {"rerank_factor": 4},
+    "pq": {"m": 48, "nbits": 8, "rerank_factor": 4},
+    # First pass over vectors projected to dim dimensions (PCA, or a random orthonormal projection)
+    "pca": {"dim": 64, "rerank_factor": 8},
+    "rp": {"dim": 128, "rerank_factor": 8},
+    # 1-bit sign hash per dimension (48 bytes at 384 dims); Hamming-distance shortlists need a deep re-score
+    "binary": {"rerank_factor": 16},
+}
+# Reduced-dimension types: an L2 index over projected vectors (the projection is stored in the .faiss file)
+REDUCED_INDEX_TYPES = ("pca", "rp")
+# Compressed types (codes or reduced dimensions): full-precision vectors live in a VectorStore (.vectors sidecar)
+QUANTIZED_INDEX_TYPES = ("sq8", "pq", "binary") + REDUCED_INDEX_TYPES
+# Types that need training: they start as an exact flat index until enough vectors arrive (see _train_if_ready)
+TRAINED_INDEX_TYPES = ("ivf",) + QUANTIZED_INDEX_TYPES
+SQ8_MIN_TRAIN_POINTS = 1000  # Below this an SQ8 index stays exact (flat) until enough vectors arrive
+REDUCED_MIN_TRAIN_POINTS = 1000  # Likewise for PCA/random projection: fit on enough vectors to span the data
+IVF_MIN_POINTS_PER_CENTROID = 39  # FAISS k-means warns below this many training points per list
+# Filters matching at most this many vectors are scored exactly instead of through the index
+FILTER_EXACT_MAX_CANDIDATES = 4096
+# SQ8 range searches gather code-space matches this far below the threshold before exact re-scoring
+QUANTIZED_RANGE_MARGIN = 0.05
+# PQ and sign-hash scores are too coarse for a margin: their range searches grow an exactly re-scored k-NN search from this k
+RANGE_KNN_START_K = 64
+# Recency-weighted searches shortlist this many times top_k by similarity, growing it 4x until the ranking is exact
+RECENCY_SHORTLIST_FACTOR = 4
+# Index types that can't skip tombstones inside FAISS fetch this many times k, growing it 4x for queries left short
+TOMBSTONE_FETCH_FACTOR = 2
+# Candidates hashed and compared per block when a filtered sign-hash search shortlists by Hamming distance
+HAMMING_BLOCK = 65536
+# Read-only mmap: vector storage stays in the page cache, shared by every process mapping the file
+MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
 
 
 class VectorIndex:
-    def __init__(self, dimension: int = 384):
-        """Initialize FAISS index with IndexFlatIP (exact cosine similarity)"""
+    def __init__(
+        self,
+        dimension: int = 384,
+        compaction_threshold: float = 0.2,
+        index_type: str = "flat",
+        index_params: Optional[Dict[str, int]] = None,
+        auto_index_threshold: Optional[int] = None,
+        auto_index_type: str = "hnsw",
+        model: Optional[str] = None,
+        vector_dtype: str = "float32"
+    ):
+        """Initialize FAISS index (IndexFlatIP by default, exact cosine similarity)
+
+        Args:
+            dimension: Embedding dimension
+            compaction_threshold: Tombstone ratio above which needs_compaction() is True
+            index_type: One of INDEX_TYPES ("flat", "hnsw", "ivf", compressed "sq8"/"pq"/"binary",
+                reduced-dimension "pca"/"rp")
+            index_params: Overrides for DEFAULT_INDEX_PARAMS of the chosen type
+            auto_index_threshold: Live vector count above which a flat index needs_upgrade()
+            auto_index_type: Approximate index type to upgrade to
+            model: Embedding model the vectors come from; load() rejects artifacts of another model
+            vector_dtype: Element type of the re-scoring vector store of quantized types
+                ("float32", or "float16" for half the memory and disk)
+        """
         if dimension <= 0:
             raise ValueError(f"Dimension must be positive, got {dimension}")
+        if not 0.0 < compaction_threshold <= 1.0:
+            raise ValueError(f"compaction_threshold must be in (0, 1], got {compaction_threshold}")
+        if auto_index_threshold is not None and auto_index_threshold <= 0:
+            raise ValueError(f"auto_index_threshold must be positive, got {auto_index_threshold}")
+        self._validate_index_type(auto_index_type)
+        if vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector_dtype {vector_dtype!r}, expected one of {sorted(VECTOR_DTYPES)}")
         self.dimension = dimension
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        self.something_ids: List[int] = []  # Maps index position to something ID
-        logger.debug(f"Initialized VectorIndex with dimension={dimension}")
+        self.vector_dtype = vector_dtype
+        self.compaction_threshold = compaction_threshold
+        self.auto_index_threshold = auto_index_threshold
+        self.auto_index_type = auto_index_type
+        self.index_type = self._validate_index_type(index_type)
+        self.index_params = self._resolve_params(index_type, index_params)
+        self.index = self._create_index(self.index_type, self.index_params)
+        # Exact vectors for re-scoring, kept only for quantized types
+        self.vector_store: Optional[VectorStore] = (
+            VectorStore(dimension, dtype=vector_dtype) if index_type in QUANTIZED_INDEX_TYPES else None
+        )
+        # In-memory flat buffer for vectors added on top of a read-only mmapped index
+        self.delta_index: Optional[faiss.IndexFlatIP] = None
+        self._ids = np.empty(0, dtype=np.int64)  # Maps index position to something ID (grows by doubling)
+        self._id_count = 0
+        self.deleted_positions: Set[int] = set()  # Tombstones: positions skipped by search
+        self.metadata = VectorMetadata()  # Per-position owner/content type/created_at/circles for filtered search
+        self.log_seq = 0  # Last write-ahead log entry reflected in this index (persisted in .meta)
+        self.model = model
+        self.generation = 0  # Bumped by offline rebuilds; snapshots of this index carry it forward
+        logger.debug(f"Initialized VectorIndex with dimension={dimension}, type={index_type}")
 
-    def add(self, something_id: int, embedding: np.ndarray):
+    def add(
+        self,
+        something_id: int,
+        embedding: np.ndarray,
+        user_id: Optional[str] = None,
+        content_type: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ):
         """Add single embedding to index
 
         Args:
             something_id: Unique identifier for this embedding (must be >= 0)
             embedding: Numpy array of shape (dimension,)
+            user_id: Owner, for filtered search
+            content_type: One of app.ml.vector_metadata.CONTENT_TYPES, for filtered search
+            created_at: Creation time, for filtered search
 
         Raises:
-            ValueError: If embedding is None, wrong dimension, or has zero norm
+            ValueError: If embedding is None, wrong dimension, or has zero norm,
+                or content_type is unknown
         """
         # Validate inputs
         if embedding is None:
@@ -35,6 +139,7 @@ class VectorIndex:
             raise ValueError(f"Embedding dimension mismatch: expected {self.dimension}, got {embedding.shape[0]}")
         if something_id < 0:
             raise ValueError(f"something_id must be non-negative, got {something_id}")
+        VectorMetadata.validate(1, content_types=[content_type])
 
         # Check for zero-norm vector (would cause division by zero)
         norm = np.linalg.norm(embedding)
@@ -43,16 +148,28 @@ class VectorIndex:
 
         # Normalize for cosine similarity
         embedding_normalized = embedding / norm
-        self.index.add(np.array([embedding_normalized], dtype=np.float32))
-        self.something_ids.append(something_id)
+        self._add_normalized(np.array([embedding_normalized], dtype=np.float32))
+        self._append_ids(np.array([something_id], dtype=np.int64))
+        self.metadata.append(1, [user_id], [content_type], [created_at])
+        self._train_if_ready()
         logger.debug(f"Added something_id={something_id} to index (total: {self.total_vectors})")
 
-    def add_batch(self, something_ids: List[int], embeddings: np.ndarray):
+    def add_batch(
+        self,
+        something_ids: Sequence[int],
+        embeddings: np.ndarray,
+        user_ids: Optional[Sequence[Optional[str]]] = None,
+        content_types: Optional[Sequence[Optional[str]]] = None,
+        created_at: Optional[Sequence[Optional[datetime]]] = None
+    ):
         """Add multiple embeddings to index (more efficient)
 
         Args:
-            something_ids: List of unique identifiers (all must be >= 0)
+            something_ids: List or int array of unique identifiers (all must be >= 0)
             embeddings: Numpy array of shape (n, dimension)
+            user_ids: Owner of each embedding, for filtered search
+            content_types: Content type of each embedding, for filtered search
+            created_at: Creation time of each embedding, for filtered search
 
         Raises:
             ValueError: If inputs are invalid or any embedding has zero norm
@@ -68,8 +185,10 @@ class VectorIndex:
             raise ValueError(f"Embedding dimension mismatch: expected {self.dimension}, got {embeddings.shape[1]}")
         if len(something_ids) != embeddings.shape[0]:
             raise ValueError(f"ID count ({len(something_ids)}) must match embedding count ({embeddings.shape[0]})")
-        if any(sid < 0 for sid in something_ids):
+        ids_array = np.asarray(something_ids, dtype=np.int64)
+        if np.any(ids_array < 0):
             raise ValueError("All something_ids must be non-negative")
+        VectorMetadata.validate(len(ids_array), user_ids, content_types, created_at)
 
         # Normalize all embeddings
         norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
@@ -81,17 +200,29 @@ class VectorIndex:
 
         embeddings_normalized = embeddings / norms
 
-        self.index.add(embeddings_normalized.astype(np.float32))
-        self.something_ids.extend(something_ids)
+        self._add_normalized(embeddings_normalized.astype(np.float32))
+        self._append_ids(ids_array)
+        self.metadata.append(len(ids_array), user_ids, content_types, created_at)
+        self._train_if_ready()
         logger.debug(f"Added batch of {len(something_ids)} embeddings to index (total: {self.total_vectors})")
 
-    def search(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Tuple[int, float]]:
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        search_filter: Optional[SearchFilter] = None,
+        recency: Optional[RecencyDecay] = None
+    ) -> List[Tuple[int, float]]:
         """
         Search for most similar embeddings
 
         Args:
             query_embedding: Query vector of shape (dimension,)
             top_k: Number of results to return
+            search_filter: Only return vectors whose metadata matches (full top_k
+                as long as enough vectors match)
+            recency: Rank by similarity plus a boost that decays with each vector's
+                created_at (scores returned are the boosted ones)
 
         Returns:
             List of (something_id, similarity_score) tuples, sorted by similarity desc
@@ -110,7 +241,7 @@ class VectorIndex:
             raise ValueError(f"top_k must be positive, got {top_k}")
 
         # Warn if index is empty
-        if self.total_vectors == 0:
+        if self.live_vectors == 0:
             logger.warning("Searching empty index, returning empty results")
             return []
 
@@ -122,51 +253,1150 @@ class VectorIndex:
         # Normalize query
         query_normalized = query_embedding / norm
         query_normalized = np.array([query_normalized], dtype=np.float32)
+        if recency is not None:
+            return self._recency_search(query_normalized, top_k, search_filter, recency)[0]
+        if search_filter is not None:
+            return self._filtered_search(query_normalized, top_k, search_filter)[0]
 
-        # Search
-        similarities, indices = self.index.search(query_normalized, top_k)
+        # Search among live vectors (tombstones never take result slots)
+        similarities, indices = self._live_search(query_normalized, top_k)
 
         # Map to something IDs
-        results = []
-        for idx, sim in zip(indices[0], similarities[0]):
-            if idx < len(self.something_ids):
-                something_id = self.something_ids[idx]
-                results.append((something_id, float(sim)))
-
+        results = self._to_results(similarities[0], indices[0], top_k)
         logger.debug(f"Search returned {len(results)} results (top_k={top_k})")
         return results
 
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        search_filter: Optional[SearchFilter] = None,
+        recency: Optional[RecencyDecay] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Search for the most similar embeddings of several queries in one FAISS call
+
+        Args:
+            query_embeddings: Query vectors of shape (m, dimension)
+            top_k: Number of results to return per query
+            search_filter: Only return vectors whose metadata matches
+            recency: Rank by similarity plus a creation-time boost (see search())
+
+        Returns:
+            One list of (something_id, similarity_score) tuples per query, sorted by similarity desc
+
+        Raises:
+            ValueError: If queries are invalid or any query has zero norm
+        """
+        # Validate inputs
+        if query_embeddings is None:
+            raise ValueError("Query embeddings cannot be None")
+        if not isinstance(query_embeddings, np.ndarray):
+            raise ValueError(f"Queries must be numpy array, got {type(query_embeddings)}")
+        if len(query_embeddings.shape) != 2:
+            raise ValueError(f"Queries must be 2D array, got shape {query_embeddings.shape}")
+        if query_embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Query dimension mismatch: expected {self.dimension}, got {query_embeddings.shape[1]}")
+        if top_k <= 0:
+            raise ValueError(f"top_k must be positive, got {top_k}")
+
+        if len(query_embeddings) == 0:
+            return []
+        if self.live_vectors == 0:
+            logger.warning("Searching empty index, returning empty results")
+            return [[] for _ in range(len(query_embeddings))]
+
+        # Check for zero-norm queries
+        norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        if np.any(norms < 1e-10):
+            zero_indices = np.where(norms.flatten() < 1e-10)[0]
+            raise ValueError(f"Queries at indices {zero_indices.tolist()} have zero or near-zero norm")
+
+        queries_normalized = np.ascontiguousarray(query_embeddings / norms, dtype=np.float32)
+        if recency is not None:
+            return self._recency_search(queries_normalized, top_k, search_filter, recency)
+        if search_filter is not None:
+            return self._filtered_search(queries_normalized, top_k, search_filter)
+
+        similarities, indices = self._live_search(queries_normalized, top_k)
+
+        results = [self._to_results(sims, idxs, top_k) for sims, idxs in zip(similarities, indices)]
+        logger.debug(f"Batch search of {len(results)} queries (top_k={top_k})")
+        return results
+
+    def range_search(
+        self,
+        query_embedding: np.ndarray,
+        min_similarity: float,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find every embedding whose similarity to the query is at least min_similarity
+
+        Unlike search() there is no top_k: all neighbours above the threshold
+        are returned, e.g. for duplicate detection. Exact for flat indices and
+        small filtered candidate sets; HNSW/IVF only see the neighbourhood they
+        explore, and quantized indices re-score code-space matches exactly.
+
+        Args:
+            query_embedding: Query vector of shape (dimension,)
+            min_similarity: Cosine similarity threshold in [-1, 1]
+            search_filter: Only return vectors whose metadata matches
+
+        Returns:
+            List of (something_id, similarity_score) tuples, sorted by similarity desc
+
+        Raises:
+            ValueError: If query is invalid or has zero norm, or min_similarity is out of range
+        """
+        if query_embedding is None:
+            raise ValueError("Query embedding cannot be None")
+        if not isinstance(query_embedding, np.ndarray):
+            raise ValueError(f"Query must be numpy array, got {type(query_embedding)}")
+        if len(query_embedding.shape) != 1:
+            raise ValueError(f"Query must be 1D array, got shape {query_embedding.shape}")
+        return self.range_search_batch(query_embedding[np.newaxis, :], min_similarity, search_filter)[0]
+
+    def range_search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        min_similarity: float,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        range_search() for several queries in one FAISS call
+
+        Args:
+            query_embeddings: Query vectors of shape (m, dimension)
+            min_similarity: Cosine similarity threshold in [-1, 1]
+            search_filter: Only return vectors whose metadata matches
+
+        Returns:
+            One list of (something_id, similarity_score) tuples per query, sorted by similarity desc
+
+        Raises:
+            ValueError: If queries are invalid, any query has zero norm, or min_similarity is out of range
+        """
+        if query_embeddings is None:
+            raise ValueError("Query embeddings cannot be None")
+        if not isinstance(query_embeddings, np.ndarray):
+            raise ValueError(f"Queries must be numpy array, got {type(query_embeddings)}")
+        if len(query_embeddings.shape) != 2:
+            raise ValueError(f"Queries must be 2D array, got shape {query_embeddings.shape}")
+        if query_embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Query dimension mismatch: expected {self.dimension}, got {query_embeddings.shape[1]}")
+        if not -1.0 <= min_similarity <= 1.0:
+            raise ValueError(f"min_similarity must be in [-1, 1], got {min_similarity}")
+
+        if len(query_embeddings) == 0:
+            return []
+        if self.live_vectors == 0:
+            logger.warning("Searching empty index, returning empty results")
+            return [[] for _ in range(len(query_embeddings))]
+
+        norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        if np.any(norms < 1e-10):
+            zero_indices = np.where(norms.flatten() < 1e-10)[0]
+            raise ValueError(f"Queries at indices {zero_indices.tolist()} have zero or near-zero norm")
+        queries_normalized = np.ascontiguousarray(query_embeddings / norms, dtype=np.float32)
+
+        allowed = self._live_mask()
+        if search_filter is not None:
+            allowed &= self.metadata.mask(search_filter)
+        candidates = np.flatnonzero(allowed)
+        knn_only = not self._accepts_search_params
+        if len(candidates) <= FILTER_EXACT_MAX_CANDIDATES or (knn_only and search_filter is not None):
+            rows, positions, similarities = self._exact_range_search(queries_normalized, candidates, min_similarity)
+        elif knn_only:
+            rows, positions, similarities = self._knn_range_search(queries_normalized, min_similarity, allowed)
+        else:
+            rows, positions, similarities = self._faiss_range_search(queries_normalized, min_similarity, allowed)
+
+        # Group matches by query, best first
+        order = np.lexsort((-similarities, rows))
+        rows, positions, similarities = rows[order], positions[order], similarities[order]
+        limits = np.searchsorted(rows, np.arange(len(queries_normalized) + 1))
+        something_ids = self.something_ids
+        results = [
+            [(int(something_ids[p]), float(sim)) for p, sim in zip(positions[start:end], similarities[start:end])]
+            for start, end in zip(limits[:-1], limits[1:])
+        ]
+        logger.debug(f"Range search of {len(results)} queries returned {len(positions)} matches (min_similarity={min_similarity})")
+        return results
+
+    def _exact_range_search(
+        self,
+        queries: np.ndarray,
+        candidates: np.ndarray,
+        min_similarity: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Brute-force range search over candidate positions, reconstructing them in blocks
+
+        Returns:
+            (query rows, positions, similarities) of every match, unordered
+        """
+        rows, positions, similarities = [], [], []
+        for start in range(0, len(candidates), FILTER_EXACT_MAX_CANDIDATES):
+            block = candidates[start:start + FILTER_EXACT_MAX_CANDIDATES]
+            block_sims = queries @ self._reconstruct(block).T
+            row, col = np.nonzero(block_sims >= min_similarity)
+            rows.append(row)
+            positions.append(block[col])
+            similarities.append(block_sims[row, col])
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(positions), np.concatenate(similarities)
+
+    def _faiss_range_search(
+        self,
+        queries: np.ndarray,
+        min_similarity: float,
+        allowed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """FAISS range search over the main index and the delta buffer, restricted to allowed positions
+
+        SQ8 codes are range-searched QUANTIZED_RANGE_MARGIN below the threshold
+        and the matches re-scored exactly. Reduced-dimension indices need no
+        margin: an orthonormal projection never lengthens a distance, so the
+        projected similarity bounds the exact one from above.
+
+        Returns:
+            (query rows, positions, similarities) of every match, unordered
+        """
+        threshold = min_similarity - QUANTIZED_RANGE_MARGIN if self.is_quantized else min_similarity
+        main_total = self.index.ntotal
+        # The bitmap must stay referenced while searching: FAISS selectors only hold a pointer
+        main_bitmap, main_selector = self._bitmap_selector(allowed[:main_total])
+        if self.is_reduced:
+            # |q - x|^2 = 2 - 2 q.x for unit vectors; FAISS L2 range search keeps distances below the radius
+            limits, distances, positions = self.index.range_search(
+                queries, 2.0 - 2.0 * min_similarity + 1e-6, params=self._search_params(0, main_selector)
+            )
+            similarities = 1.0 - distances / 2.0
+            threshold = min_similarity
+        else:
+            limits, similarities, positions = self.index.range_search(
+                queries, threshold, params=self._search_params(0, main_selector)
+            )
+        rows = np.repeat(np.arange(len(queries)), np.diff(limits.astype(np.int64)))
+
+        if self.delta_index is not None and self.delta_index.ntotal > 0:
+            delta_limits, delta_sims, delta_positions = self.delta_index.range_search(queries, threshold)
+            rows = np.concatenate([rows, np.repeat(np.arange(len(queries)), np.diff(delta_limits.astype(np.int64)))])
+            positions = np.concatenate([positions, delta_positions + main_total])
+            similarities = np.concatenate([similarities, delta_sims])
+
+        keep = allowed[positions]
+        rows, positions, similarities = rows[keep], positions[keep], similarities[keep]
+        if self.is_quantized:
+            # Replace code-space scores with exact ones and apply the real threshold
+            similarities = np.einsum("nd,nd->n", self.vector_store.take(positions), queries[rows])
+            keep = similarities >= min_similarity
+            rows, positions, similarities = rows[keep], positions[keep], similarities[keep]
+        return rows, positions, similarities
+
+    def _knn_range_search(
+        self,
+        queries: np.ndarray,
+        min_similarity: float,
+        allowed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Range search by k-NN with growing k, until every query's k-th neighbour falls below the threshold
+
+        Returns:
+            (query rows, positions, similarities) of every match, unordered
+        """
+        k = RANGE_KNN_START_K
+        while True:
+            similarities, positions = self._live_search(queries, k)
+            if k >= self.live_vectors or np.all(similarities[:, -1] < min_similarity):
+                break
+            k *= 4
+
+        matches = (positions >= 0) & (similarities >= min_similarity)
+        matches &= allowed[np.where(positions >= 0, positions, 0)]
+        rows, cols = np.nonzero(matches)
+        return rows, positions[rows, cols], similarities[rows, cols]
+
+    def _filtered_search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        search_filter: SearchFilter
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k of normalized queries among live vectors matching search_filter
+
+        The filter becomes a position bitmap. Small candidate sets are scored
+        exactly; larger ones are searched through FAISS with the bitmap as an
+        IDSelector, so non-matching vectors never take result slots. Queries an
+        approximate index can't fill (HNSW/IVF may run out of matching
+        neighbours) are re-run exactly. A sign-hash index can't take a selector
+        either; its large candidate sets are shortlisted by Hamming distance.
+        """
+        allowed = self.metadata.mask(search_filter) & self._live_mask()
+        candidates = np.flatnonzero(allowed)
+        k = min(top_k, len(candidates))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        similarities, positions = self._filtered_top_k(queries, k, allowed, candidates)
+        results = [self._to_results(sims, idxs, top_k) for sims, idxs in zip(similarities, positions)]
+        logger.debug(f"Filtered search over {len(candidates)} candidates (top_k={top_k})")
+        return results
+
+    def _filtered_top_k(
+        self,
+        queries: np.ndarray,
+        k: int,
+        allowed: np.ndarray,
+        candidates: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k positions among candidates (the positions set in allowed), by the strategy _filtered_search describes
+
+        Returns:
+            (similarities, positions) arrays of shape (len(queries), k)
+        """
+        # IndexPQ and IndexLSH reject search parameters, so they can't take a selector
+        if len(candidates) <= FILTER_EXACT_MAX_CANDIDATES or isinstance(self.index, faiss.IndexPQ):
+            similarities, positions = self._exact_search(queries, candidates, k)
+        elif isinstance(self.index, faiss.IndexLSH):
+            similarities, positions = self._hamming_search(queries, candidates, k)
+        else:
+            similarities, positions = self._faiss_search(queries, k, allowed)
+            underfilled = np.flatnonzero(np.sum(positions >= 0, axis=1) < k)
+            if len(underfilled) > 0:
+                similarities[underfilled], positions[underfilled] = self._exact_search(
+                    queries[underfilled], candidates, k
+                )
+        return similarities, positions
+
+    def _recency_search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        search_filter: Optional[SearchFilter],
+        recency: RecencyDecay
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k of normalized queries by similarity plus recency boost
+
+        A shortlist ranked by similarity is re-scored with boosts computed from
+        the created_at column in one vectorized pass. No boost exceeds
+        recency.weight, so a vector outside the shortlist can't outrank the
+        k-th re-scored result once that beats the shortlist's lowest similarity
+        plus the weight; until then the shortlist grows.
+        """
+        allowed = self._live_mask()
+        if search_filter is not None:
+            allowed &= self.metadata.mask(search_filter)
+        candidates = np.flatnonzero(allowed)
+        k = min(top_k, len(candidates))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        shortlist_k = min(k * RECENCY_SHORTLIST_FACTOR, len(candidates))
+        while True:
+            if search_filter is None:
+                similarities, positions = self._live_search(queries, shortlist_k)
+            else:
+                similarities, positions = self._filtered_top_k(queries, shortlist_k, allowed, candidates)
+            exhausted = shortlist_k == len(candidates)
+            valid = positions >= 0
+            valid[valid] = allowed[positions[valid]]
+            scores = similarities + recency.boosts(self.metadata.created_at[np.where(valid, positions, 0)])
+            scores[~valid] = -np.inf
+            kth_scores = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+            if exhausted or np.all(kth_scores >= similarities[:, -1] + recency.weight):
+                break
+            shortlist_k = min(shortlist_k * 4, len(candidates))
+
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        positions = np.take_along_axis(positions, order, axis=1)
+        results = [self._to_results(row_scores, row_positions, top_k) for row_scores, row_positions in zip(scores, positions)]
+        logger.debug(f"Recency-weighted search over {len(candidates)} candidates (shortlist {shortlist_k}, top_k={top_k})")
+        return results
+
+    def _exact_search(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force top-k over candidate positions, reconstructing them in blocks
+
+        Returns:
+            (similarities, positions) arrays of shape (len(queries), k)
+        """
+        best_sims = np.empty((len(queries), 0), dtype=np.float32)
+        best_positions = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(candidates), FILTER_EXACT_MAX_CANDIDATES):
+            block = candidates[start:start + FILTER_EXACT_MAX_CANDIDATES]
+            block_sims = queries @ self._reconstruct(block).T
+            all_sims = np.concatenate([best_sims, block_sims], axis=1)
+            all_positions = np.concatenate([best_positions, np.broadcast_to(block, block_sims.shape)], axis=1)
+            keep = min(k, all_sims.shape[1])
+            top = np.argpartition(-all_sims, keep - 1, axis=1)[:, :keep]
+            best_sims = np.take_along_axis(all_sims, top, axis=1)
+            best_positions = np.take_along_axis(all_positions, top, axis=1)
+
+        order = np.argsort(-best_sims, axis=1, kind="stable")
+        return np.take_along_axis(best_sims, order, axis=1), np.take_along_axis(best_positions, order, axis=1)
+
+    def _hamming_search(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k over candidate positions of a sign-hash index
+
+        The rerank_factor * k candidates nearest in Hamming distance (popcount
+        over uint64 words in NumPy) are re-scored with the exact vectors.
+
+        Returns:
+            (similarities, positions) arrays of shape (len(queries), k)
+        """
+        shortlist_k = min(k * self.index_params["rerank_factor"], len(candidates))
+        query_codes = sign_codes(queries)
+        best_distances = np.empty((len(queries), 0), dtype=np.int32)
+        best_positions = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(candidates), HAMMING_BLOCK):
+            block = candidates[start:start + HAMMING_BLOCK]
+            block_distances = hamming_distances(query_codes, self._sign_codes(block))
+            all_distances = np.concatenate([best_distances, block_distances], axis=1)
+            all_positions = np.concatenate([best_positions, np.broadcast_to(block, block_distances.shape)], axis=1)
+            keep = min(shortlist_k, all_distances.shape[1])
+            top = np.argpartition(all_distances, keep - 1, axis=1)[:, :keep]
+            best_distances = np.take_along_axis(all_distances, top, axis=1)
+            best_positions = np.take_along_axis(all_positions, top, axis=1)
+        return self._rerank_exact(queries, best_positions, k)
+
+    def _sign_codes(self, positions: np.ndarray) -> np.ndarray:
+        """Sign-hash words of the vectors at positions, read from the index codes (delta rows are hashed here)"""
+        main_total = self.index.ntotal
+        codes = faiss.rev_swig_ptr(self.index.codes.data(), main_total * self.index.code_size)
+        codes = codes.reshape(main_total, self.index.code_size)
+        in_main = positions < main_total
+        if np.all(in_main):
+            return as_words(codes[positions])
+        words = np.empty((len(positions), -(-self.dimension // 64)), dtype=np.uint64)
+        words[in_main] = as_words(codes[positions[in_main]])
+        words[~in_main] = sign_codes(self.vector_store.take(positions[~in_main]))
+        return words
+
+    def _to_results(self, similarities: np.ndarray, positions: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Map one row of FAISS output to (something_id, similarity), skipping padding and tombstones"""
+        something_ids = self.something_ids
+        results = []
+        for idx, sim in zip(positions, similarities):
+            # FAISS pads with -1 when top_k exceeds the number of stored vectors
+            if 0 <= idx < self._id_count and idx not in self.deleted_positions:
+                results.append((int(something_ids[idx]), float(sim)))
+                if len(results) == top_k:
+                    break
+        return results
+
+    def get_embeddings(self, something_ids: Iterable[int]) -> Tuple[List[int], np.ndarray]:
+        """Reconstruct stored (normalized) embeddings for the given something IDs
+
+        Args:
+            something_ids: IDs to look up; IDs not present in the index are skipped
+
+        Returns:
+            Tuple of (found_ids, embeddings) where embeddings has shape (len(found_ids), dimension)
+        """
+        positions = self._positions_of(something_ids)
+        if len(positions) == 0:
+            return [], np.empty((0, self.dimension), dtype=np.float32)
+
+        embeddings = self._reconstruct(positions)
+        return self.something_ids[positions].tolist(), embeddings
+
+    def contains(self, something_ids: Sequence[int]) -> np.ndarray:
+        """Whether each ID has a live (non-tombstoned) vector in the index
+
+        Returns:
+            Boolean array aligned with something_ids
+        """
+        wanted = np.asarray(something_ids, dtype=np.int64)
+        return np.isin(wanted, self.something_ids[self._live_mask()])
+
+    def set_metadata(
+        self,
+        something_ids: Sequence[int],
+        user_ids: Optional[Sequence[Optional[str]]] = None,
+        content_types: Optional[Sequence[Optional[str]]] = None,
+        created_at: Optional[Sequence[Optional[datetime]]] = None
+    ) -> int:
+        """Overwrite filter metadata of live vectors (columns left as None are unchanged)
+
+        Args:
+            something_ids: IDs to update; IDs not present in the index are skipped
+            user_ids: Owner of each ID
+            content_types: Content type of each ID
+            created_at: Creation time of each ID
+
+        Returns:
+            Number of vectors updated
+
+        Raises:
+            ValueError: If a column's length doesn't match something_ids or a content type is unknown
+        """
+        VectorMetadata.validate(len(something_ids), user_ids, content_types, created_at)
+        found, positions = self._aligned_positions(something_ids)
+
+        def pick(column):
+            return [value for value, keep in zip(column, found) if keep] if column is not None else None
+
+        self.metadata.update(positions, pick(user_ids), pick(content_types), pick(created_at))
+        return len(positions)
+
+    def set_circles(self, something_id: int, circle_ids: Iterable[int]) -> bool:
+        """Replace the circles a vector belongs to (for circle filters)
+
+        Circles are indexed per owner, so the vector's user must be known.
+
+        Returns:
+            True if the ID has a live vector in the index
+
+        Raises:
+            ValueError: If the owner has more circles than fit in the circle bitmask
+        """
+        _, positions = self._aligned_positions([something_id])
+        self.metadata.set_circles(positions, list(circle_ids))
+        return len(positions) > 0
+
+    @property
+    def missing_metadata_ids(self) -> List[int]:
+        """Live something IDs without filter metadata (to be backfilled from the database)"""
+        positions = self.metadata.missing_positions
+        positions = positions[self._live_mask()[positions]]
+        return self.something_ids[positions].tolist()
+
+    def remove(self, something_ids: Iterable[int]) -> int:
+        """Remove embeddings by something ID
+
+        Vectors are tombstoned rather than physically deleted: search skips them
+        until compact() rewrites the index.
+
+        Args:
+            something_ids: IDs to remove; unknown IDs are ignored
+
+        Returns:
+            Number of vectors tombstoned
+        """
+        positions = self._positions_of(something_ids).tolist()
+        self.deleted_positions.update(positions)
+        if positions:
+            logger.debug(f"Tombstoned {len(positions)} vectors (ratio: {self.tombstone_ratio:.2f})")
+        return len(positions)
+
+    def compact(self) -> int:
+        """Rewrite the index without tombstoned vectors
+
+        Returns:
+            Number of vectors physically removed
+        """
+        removed = len(self.deleted_positions)
+        if removed == 0:
+            return 0
+
+        self._rewrite(self.index_type, self.index_params)
+        logger.info(f"Compacted index: removed {removed} vectors ({self.total_vectors} remaining)")
+        return removed
+
+    def needs_upgrade(self) -> bool:
+        """Whether a flat index has grown past auto_index_threshold"""
+        return (
+            self.auto_index_threshold is not None
+            and self.index_type == "flat"
+            and self.live_vectors >= self.auto_index_threshold
+        )
+
+    def rebuild(self, index_type: Optional[str] = None, index_params: Optional[Dict[str, int]] = None):
+        """Rebuild the index as a different FAISS structure (drops tombstones)
+
+        IVF indices are trained on the current live vectors with their full
+        nlist; until there are IVF_MIN_POINTS_PER_CENTROID points per list
+        they stay exact (flat) and are trained as vectors are added.
+
+        Args:
+            index_type: Target type (defaults to auto_index_type)
+            index_params: Overrides for DEFAULT_INDEX_PARAMS of the target type
+        """
+        index_type = self._validate_index_type(index_type or self.auto_index_type)
+        params = self._resolve_params(index_type, index_params)
+        self._rewrite(index_type, params)
+        logger.info(f"Rebuilt index as {index_type} {self.index_params} ({self.total_vectors} vectors)")
+
+    def _rewrite(self, index_type: str, params: Dict[str, int]):
+        """Copy live vectors into a fresh FAISS index of the given type"""
+        live_positions = np.flatnonzero(self._live_mask())
+        vectors = np.empty((0, self.dimension), dtype=np.float32)
+        if len(live_positions) > 0:
+            vectors = self._reconstruct(live_positions)
+
+        new_index = self._create_index(index_type, params, num_vectors=len(vectors))
+        if len(vectors) > 0:
+            if not new_index.is_trained:
+                new_index.train(vectors)
+            new_index.add(vectors)
+
+        self.index = new_index
+        self.delta_index = None
+        self.vector_store = None
+        if index_type in QUANTIZED_INDEX_TYPES:
+            self.vector_store = VectorStore(self.dimension, dtype=self.vector_dtype)
+            self.vector_store.append(vectors)
+        self.index_type = index_type
+        self.index_params = params
+        self._ids = self.something_ids[live_positions].copy()
+        self._id_count = len(self._ids)
+        self.metadata = self.metadata.take(live_positions)
+        self.deleted_positions = set()
+
+    def needs_compaction(self) -> bool:
+        """Whether the tombstone ratio has passed compaction_threshold"""
+        return len(self.deleted_positions) > 0 and self.tombstone_ratio >= self.compaction_threshold
+
     def save(self, filepath: str):
         """Save index to disk
 
+        Pending deletions are compacted first so tombstones never hit storage,
+        and an mmapped index is merged with its delta buffer into process memory.
+
+        The .meta file is the manifest, written last: index type and params,
+        model, dimension, vector count, creation time and a SHA-256 checksum
+        of every other artifact, which load() verifies.
+
         Args:
-            filepath: Path to save .faiss file (will also create .ids file)
+            filepath: Path to save .faiss file (will also create .ids, .meta, .metadata
+                and, for quantized types, .vectors files)
         """
+        self.compact()
+        if self.delta_index is not None:
+            self._rewrite(self.index_type, self.index_params)
         faiss.write_index(self.index, filepath)
-        # Save something_ids mapping separately
-        with open(filepath + ".ids", "wb") as f:
-            pickle.dump(self.something_ids, f)
+        # Save something_ids mapping separately (raw int64, see app.ml.index_io)
+        write_ids(filepath + ".ids", self.something_ids)
+        # Per-vector metadata for filtered search
+        self.metadata.save(filepath + ".metadata")
+        if self.vector_store is not None:
+            # Full-precision vectors for re-scoring quantized search results
+            self.vector_store.save(filepath + ".vectors")
+        # Manifest: index type/params so a restart restores the same search behaviour, plus what load() validates
+        suffixes = ["", ".ids", ".metadata"] + ([".vectors"] if self.vector_store is not None else [])
+        with open(filepath + ".meta", "w") as f:
+            json.dump({
+                "dimension": self.dimension,
+                "index_type": self.index_type,
+                "index_params": self.index_params,
+                "log_seq": self.log_seq,
+                "model": self.model,
+                "vector_dtype": self.vector_dtype,
+                "count": self.total_vectors,
+                "generation": self.generation,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "checksums": {suffix: file_checksum(filepath + suffix) for suffix in suffixes},
+            }, f)
         logger.info(f"Saved index with {self.total_vectors} vectors to {filepath}")
 
-    def load(self, filepath: str) -> bool:
+    def load(self, filepath: str, mmap: bool = False) -> bool:
         """Load index from disk
 
+        With mmap=True the vector storage is mapped read-only instead of read
+        into the heap: startup doesn't pay the full read cost and every worker
+        mapping the same file shares its pages. New vectors go to an in-memory
+        delta buffer; the file must not be modified in place while mapped
+        (replace it atomically instead).
+
         Args:
-            filepath: Path to .faiss file (will also load .ids file)
+            filepath: Path to .faiss file (will also load .ids and, if present, .meta,
+                .metadata and .vectors files)
+            mmap: Memory-map the index read-only instead of loading it into memory
 
         Returns:
             True if loaded successfully, False if file doesn't exist
+
+        Nothing is replaced until every artifact has been read and validated,
+        so a failed load leaves the current index untouched.
+
+        Raises:
+            ValueError: If an artifact doesn't match its manifest checksum, the
+                manifest is for another model or dimension, or the id mapping,
+                metadata or vector store doesn't match the stored vector count
         """
         if os.path.exists(filepath):
-            self.index = faiss.read_index(filepath)
-            with open(filepath + ".ids", "rb") as f:
-                self.something_ids = pickle.load(f)
-            logger.info(f"Loaded index with {self.total_vectors} vectors from {filepath}")
+            meta = None
+            if os.path.exists(filepath + ".meta"):
+                with open(filepath + ".meta") as f:
+                    meta = json.load(f)
+                self._validate_manifest(filepath, meta)
+
+            index = faiss.read_index(filepath, MMAP_IO_FLAGS) if mmap else faiss.read_index(filepath)
+            if index.d != self.dimension:
+                raise ValueError(f"Index dimension mismatch: expected {self.dimension}, got {index.d}")
+
+            if meta is not None:
+                index_type = self._validate_index_type(meta["index_type"])
+                index_params = self._resolve_params(index_type, meta.get("index_params"))
+                log_seq = meta.get("log_seq", 0)
+                if meta.get("count", index.ntotal) != index.ntotal:
+                    raise ValueError(f"Manifest lists {meta['count']} vectors but index has {index.ntotal}")
+            else:
+                # Artifacts written before index types existed
+                index_type, index_params = self._infer_index_type(index)
+                log_seq = 0
+
+            # Memory-mapped read-only; copied to the heap on the first add
+            ids = read_ids(filepath + ".ids")
+            if len(ids) != index.ntotal:
+                raise ValueError(f"Id mapping has {len(ids)} entries but index has {index.ntotal} vectors")
+
+            if os.path.exists(filepath + ".metadata"):
+                metadata = VectorMetadata.load(filepath + ".metadata")
+                if len(metadata) != index.ntotal:
+                    raise ValueError(f"Metadata has {len(metadata)} rows but index has {index.ntotal} vectors")
+            else:
+                # Artifacts written before filtered search: rows stay unknown until backfilled
+                metadata = VectorMetadata()
+                metadata.append(index.ntotal)
+
+            vector_store = None
+            if index_type in QUANTIZED_INDEX_TYPES:
+                # Always memory-mapped: only shortlisted rows are paged in
+                vector_store = VectorStore.load(filepath + ".vectors", self.dimension)
+                if len(vector_store) != index.ntotal:
+                    raise ValueError(f"Vector store has {len(vector_store)} rows but index has {index.ntotal} vectors")
+
+            self.index = index
+            self.delta_index = faiss.IndexFlatIP(self.dimension) if mmap else None
+            self.vector_store = vector_store
+            if vector_store is not None:
+                self.vector_dtype = vector_store.dtype
+            self.index_type = index_type
+            self.index_params = index_params
+            self._enable_reconstruct(self.index)
+            self._ids = ids
+            self._id_count = len(ids)
+            self.metadata = metadata
+            self.deleted_positions = set()
+            self.log_seq = log_seq
+            self.model = self.model or (meta or {}).get("model")
+            self.generation = (meta or {}).get("generation", 0)
+            logger.info(f"Loaded index with {self.total_vectors} vectors from {filepath} (mmap={mmap})")
             return True
         logger.warning(f"Index file not found at {filepath}")
         return False
 
+    def _validate_manifest(self, filepath: str, meta: Dict[str, Any]):
+        """Check a manifest against this index and the artifacts next to it
+
+        Manifests written before checksums existed only carry type and params
+        and pass unchecked.
+
+        Raises:
+            ValueError: On a model or dimension mismatch, or a missing or corrupt artifact
+        """
+        if meta.get("dimension", self.dimension) != self.dimension:
+            raise ValueError(f"Index dimension mismatch: expected {self.dimension}, got {meta['dimension']}")
+        if self.model is not None and meta.get("model") not in (None, self.model):
+            raise ValueError(f"Index was built with model {meta['model']}, expected {self.model}")
+        for suffix, checksum in meta.get("checksums", {}).items():
+            if not os.path.exists(filepath + suffix):
+                raise ValueError(f"Index artifact {filepath + suffix} listed in the manifest is missing")
+            if file_checksum(filepath + suffix) != checksum:
+                raise ValueError(f"Checksum mismatch for {filepath + suffix}: artifact is corrupt or from another upload")
+
+    def clone(self) -> "VectorIndex":
+        """Copy the live vectors into a new flat index with the same settings
+
+        The copy can be rebuilt as another type without holding up searches on
+        this one, then swapped in (see VectorService.swap_index).
+        """
+        live_positions = np.flatnonzero(self._live_mask())
+        vectors = np.empty((0, self.dimension), dtype=np.float32)
+        if len(live_positions) > 0:
+            vectors = self._reconstruct(live_positions)
+
+        clone = VectorIndex(
+            dimension=self.dimension,
+            compaction_threshold=self.compaction_threshold,
+            auto_index_threshold=self.auto_index_threshold,
+            auto_index_type=self.auto_index_type,
+            model=self.model,
+            vector_dtype=self.vector_dtype
+        )
+        clone._add_normalized(np.ascontiguousarray(vectors, dtype=np.float32))
+        clone._append_ids(self.something_ids[live_positions])
+        clone.metadata = self.metadata.take(live_positions)
+        clone.log_seq = self.log_seq
+        clone.generation = self.generation
+        return clone
+
+    def snapshot(self) -> "VectorIndex":
+        """Point-in-time copy of this index, to save() while this one keeps serving
+
+        Unlike clone(), the FAISS structures are copied as they are (no graph
+        rebuild or retraining), together with tombstones, metadata and the
+        re-scoring vectors, so the copy is cheap; compaction and the delta
+        merge then happen in the copy's save(). A read-only mmapped main index
+        is never modified in place (adds go to the delta buffer), so it is
+        shared rather than copied.
+        """
+        snapshot = copy.copy(self)
+        if self.delta_index is None:
+            snapshot.index = faiss.clone_index(self.index)
+        else:
+            snapshot.delta_index = faiss.clone_index(self.delta_index)
+        if self.vector_store is not None:
+            snapshot.vector_store = self.vector_store.copy()
+        snapshot._ids = self.something_ids.copy()
+        snapshot.deleted_positions = set(self.deleted_positions)
+        snapshot.metadata = self.metadata.take(np.arange(len(self.metadata)))
+        snapshot.index_params = dict(self.index_params)
+        return snapshot
+
+    def _append_ids(self, ids: np.ndarray):
+        """Append to the id array, growing capacity geometrically (amortized O(1))"""
+        needed = self._id_count + len(ids)
+        if needed > len(self._ids) or not self._ids.flags.writeable:
+            capacity = max(needed, 2 * len(self._ids), 1024)
+            grown = np.empty(capacity, dtype=np.int64)
+            grown[:self._id_count] = self._ids[:self._id_count]
+            self._ids = grown
+        self._ids[self._id_count:needed] = ids
+        self._id_count = needed
+
+    def _positions_of(self, something_ids: Iterable[int]) -> np.ndarray:
+        """Index positions of the given IDs, excluding tombstoned ones"""
+        wanted = np.fromiter(something_ids, dtype=np.int64)
+        mask = np.isin(self.something_ids, wanted) & self._live_mask()
+        return np.flatnonzero(mask)
+
+    def _aligned_positions(self, something_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Live positions of the given IDs, in input order
+
+        Returns:
+            (found, positions): boolean mask over something_ids and the positions of the found ones
+        """
+        wanted = np.asarray(something_ids, dtype=np.int64)
+        live_positions = np.flatnonzero(self._live_mask())
+        live_ids = self.something_ids[live_positions]
+        if len(live_ids) == 0:
+            return np.zeros(len(wanted), dtype=bool), np.empty(0, dtype=np.int64)
+        order = np.argsort(live_ids, kind="stable")
+        slots = np.minimum(np.searchsorted(live_ids, wanted, sorter=order), len(order) - 1)
+        positions = live_positions[order[slots]]
+        found = self.something_ids[positions] == wanted
+        return found, positions[found]
+
+    def _live_mask(self) -> np.ndarray:
+        """Boolean mask over positions that are not tombstoned"""
+        mask = np.ones(self._id_count, dtype=bool)
+        if self.deleted_positions:
+            mask[np.fromiter(self.deleted_positions, dtype=np.int64)] = False
+        return mask
+
+    def _add_normalized(self, embeddings: np.ndarray):
+        """Add already-normalized float32 vectors (types that need training are trained by _train_if_ready)"""
+        if self.vector_store is not None:
+            self.vector_store.append(embeddings)
+        if self.delta_index is not None:
+            # A mmapped index is read-only (adding to it aborts inside FAISS)
+            self.delta_index.add(embeddings)
+            return
+        self.index.add(embeddings)
+
+    def _faiss_search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the main index and the delta buffer, merging by similarity
+
+        Quantized indices shortlist rerank_factor * k candidates from their
+        compressed codes, which are then re-scored with the exact vectors.
+
+        Args:
+            queries: Normalized float32 queries of shape (m, dimension)
+            k: Results per query
+            allowed: Optional boolean mask over positions; other positions are skipped inside FAISS
+
+        Returns:
+            (similarities, positions) arrays of shape (len(queries), k); missing entries are -1
+        """
+        if self.is_quantized:
+            shortlist_k = min(k * self.index_params["rerank_factor"], self.total_vectors)
+            _, positions = self._search_main_and_delta(queries, shortlist_k, allowed)
+            return self._rerank_exact(queries, positions, k)
+        return self._search_main_and_delta(queries, k, allowed)
+
+    def _live_search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k of normalized queries among live vectors
+
+        Tombstones are skipped inside FAISS with the live mask as an IDSelector,
+        so HNSW's efSearch stays at max(ef_search, k) however many there are.
+        Index types that reject selectors (PQ, sign hash), and queries an
+        approximate index leaves short of live neighbours, over-fetch
+        TOMBSTONE_FETCH_FACTOR * k instead, growing it until k live results come back.
+
+        Returns:
+            (similarities, positions) arrays with at least k columns; on the
+            over-fetch path tombstoned positions may appear (_to_results skips them)
+        """
+        if not self.deleted_positions:
+            return self._faiss_search(queries, k)
+        live = self._live_mask()
+        wanted = min(k, self.live_vectors)
+        if not self._accepts_search_params:
+            return self._overfetch_live(queries, k, wanted, live)
+
+        similarities, positions = self._faiss_search(queries, k, live)
+        short = np.flatnonzero(np.sum(positions >= 0, axis=1) < wanted)
+        if len(short) == 0:
+            return similarities, positions
+        short_sims, short_positions = self._overfetch_live(queries[short], k, wanted, live)
+        width = max(positions.shape[1], short_positions.shape[1])
+        similarities, positions = self._pad_columns(similarities, positions, width)
+        similarities[short], positions[short] = self._pad_columns(short_sims, short_positions, width)
+        return similarities, positions
+
+    def _overfetch_live(self, queries: np.ndarray, k: int, wanted: int, live: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Search without a selector, growing the fetch until every query has wanted live results"""
+        fetch_k = k * TOMBSTONE_FETCH_FACTOR  # FAISS pads with -1 past the stored vectors
+        while True:
+            similarities, positions = self._faiss_search(queries, fetch_k)
+            valid = positions >= 0
+            valid[valid] = live[positions[valid]]
+            if fetch_k >= self.total_vectors or np.all(valid.sum(axis=1) >= wanted):
+                return similarities, positions
+            fetch_k *= 4
+
+    @staticmethod
+    def _pad_columns(similarities: np.ndarray, positions: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Pad search results to width columns the way FAISS does (-inf, -1)"""
+        padding = ((0, 0), (0, width - positions.shape[1]))
+        return np.pad(similarities, padding, constant_values=-np.inf), np.pad(positions, padding, constant_values=-1)
+
+    def _search_main_and_delta(
+        self,
+        queries: np.ndarray,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        main_total = self.index.ntotal
+        # The bitmaps must stay referenced while searching: FAISS selectors only hold a pointer
+        main_bitmap, main_selector = self._bitmap_selector(allowed[:main_total]) if allowed is not None else (None, None)
+        similarities, positions = self.index.search(queries, k, params=self._search_params(k, main_selector))
+        if self.is_reduced:
+            similarities = 1.0 - similarities / 2.0  # Squared L2 between unit vectors -> inner product
+        elif isinstance(self.index, faiss.IndexLSH):
+            # Hamming distance h of sign hashes estimates the angle as pi * h / bits
+            similarities = np.cos(np.pi * similarities / self.dimension).astype(np.float32)
+        if self.delta_index is None or self.delta_index.ntotal == 0:
+            return similarities, positions
+
+        delta_params = None
+        if allowed is not None:
+            delta_bitmap, delta_selector = self._bitmap_selector(allowed[main_total:])
+            delta_params = faiss.SearchParameters(sel=delta_selector)
+        delta_sims, delta_positions = self.delta_index.search(queries, k, params=delta_params)
+        delta_positions = np.where(delta_positions >= 0, delta_positions + main_total, -1)
+
+        all_sims = np.concatenate([similarities, delta_sims], axis=1)
+        all_positions = np.concatenate([positions, delta_positions], axis=1)
+        all_sims[all_positions < 0] = -np.inf
+        order = np.argsort(-all_sims, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(all_sims, order, axis=1), np.take_along_axis(all_positions, order, axis=1)
+
+    def _rerank_exact(self, queries: np.ndarray, positions: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score candidate positions with full-precision vectors and keep the best k per query"""
+        valid = positions >= 0
+        vectors = self.vector_store.take(np.where(valid, positions, 0).ravel())
+        vectors = vectors.reshape(positions.shape[0], positions.shape[1], self.dimension)
+        similarities = np.einsum("mkd,md->mk", vectors, queries)
+        similarities[~valid] = -np.inf
+
+        order = np.argsort(-similarities, axis=1, kind="stable")[:, :k]
+        similarities = np.take_along_axis(similarities, order, axis=1)
+        positions = np.take_along_axis(positions, order, axis=1)
+        return similarities.astype(np.float32), positions
+
+    def _train_if_ready(self):
+        """Swap the exact warm-up index of a type that needs training for the real one once it can be trained"""
+        if (
+            self.index_type in TRAINED_INDEX_TYPES
+            and isinstance(self.index, faiss.IndexFlat)
+            and self.delta_index is None
+            and self.live_vectors >= self._min_train_points(self.index_type, self.index_params)
+        ):
+            self._rewrite(self.index_type, self.index_params)
+            logger.info(f"Trained {self.index_type} index on {self.total_vectors} vectors")
+
+    def _reconstruct(self, positions: np.ndarray) -> np.ndarray:
+        """Reconstruct vectors by position across the main index and the delta buffer"""
+        if self.vector_store is not None:
+            return self.vector_store.take(positions)  # Exact, unlike decoding compressed codes
+        base_total = self.index.ntotal
+        if self.delta_index is None or np.all(positions < base_total):
+            return self.index.reconstruct_batch(positions)
+
+        vectors = np.empty((len(positions), self.dimension), dtype=np.float32)
+        in_base = positions < base_total
+        if np.any(in_base):
+            vectors[in_base] = self.index.reconstruct_batch(positions[in_base])
+        vectors[~in_base] = self.delta_index.reconstruct_batch(positions[~in_base] - base_total)
+        return vectors
+
+    def _create_index(self, index_type: str, params: Dict[str, int], num_vectors: int = 0) -> faiss.Index:
+        """Create an empty FAISS index using inner product (cosine on normalized vectors)
+
+        Types that need training (IVF and quantized types) need num_vectors
+        training points; with fewer they start as an exact flat index that
+        _train_if_ready() replaces later.
+        """
+        if index_type in TRAINED_INDEX_TYPES and num_vectors < self._min_train_points(index_type, params):
+            return faiss.IndexFlatIP(self.dimension)
+        if index_type == "sq8":
+            return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        if index_type in REDUCED_INDEX_TYPES:
+            if not 0 < params["dim"] < self.dimension:
+                raise ValueError(f"{index_type} dim={params['dim']} must be between 0 and the dimension {self.dimension}")
+            if index_type == "pca":
+                projection = faiss.PCAMatrix(self.dimension, params["dim"])
+            else:
+                projection = faiss.RandomRotationMatrix(self.dimension, params["dim"])
+            # L2 in the projected space: PCA's mean subtraction cancels out of differences
+            return faiss.IndexPreTransform(projection, faiss.IndexFlatL2(params["dim"]))
+        if index_type == "binary":
+            # Sign of every dimension, no rotation or learned thresholds (so nothing to train)
+            return faiss.IndexLSH(self.dimension, self.dimension, False, False)
+        if index_type == "pq":
+            if self.dimension % params["m"] != 0:
+                raise ValueError(f"pq m={params['m']} must divide the dimension {self.dimension}")
+            return faiss.IndexPQ(self.dimension, params["m"], params["nbits"], faiss.METRIC_INNER_PRODUCT)
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dimension, params["M"], faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = params["ef_construction"]
+            index.hnsw.efSearch = params["ef_search"]
+            return index
+        if index_type == "ivf":
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFFlat(quantizer, self.dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = params["nprobe"]
+            self._enable_reconstruct(index)
+            return index
+        return faiss.IndexFlatIP(self.dimension)
+
+    def _search_params(self, top_k: int, selector: Optional[faiss.IDSelector] = None) -> Optional[Any]:
+        """Per-query search parameters (efSearch must be at least top_k for HNSW)
+
+        Args:
+            top_k: Results requested
+            selector: Optional IDSelector restricting which positions can be returned
+        """
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=max(self.index_params["ef_search"], top_k), sel=selector)
+        if isinstance(self.index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(nprobe=self.index_params["nprobe"], sel=selector)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    @staticmethod
+    def _bitmap_selector(mask: np.ndarray) -> Tuple[np.ndarray, faiss.IDSelector]:
+        """IDSelector accepting the positions set in mask (keep the returned bitmap alive while searching)"""
+        bitmap = np.packbits(mask, bitorder="little")
+        return bitmap, faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+
+    @staticmethod
+    def _enable_reconstruct(index: faiss.Index):
+        """IVF indices need a direct map to reconstruct vectors (compaction, partitions)"""
+        if isinstance(index, faiss.IndexIVF):
+            index.make_direct_map()
+
+    @staticmethod
+    def _min_train_points(index_type: str, params: Dict[str, int]) -> int:
+        """Vectors needed before an index of a type that needs training is trained"""
+        if index_type == "ivf":
+            return params["nlist"] * IVF_MIN_POINTS_PER_CENTROID
+        if index_type == "pq":
+            return (1 << params["nbits"]) * IVF_MIN_POINTS_PER_CENTROID
+        if index_type in REDUCED_INDEX_TYPES:
+            return max(REDUCED_MIN_TRAIN_POINTS, params["dim"])
+        if index_type == "binary":
+            return 0
+        return SQ8_MIN_TRAIN_POINTS
+
+    @staticmethod
+    def _validate_index_type(index_type: str) -> str:
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type '{index_type}', expected one of {INDEX_TYPES}")
+        return index_type
+
+    @staticmethod
+    def _resolve_params(index_type: str, index_params: Optional[Dict[str, int]]) -> Dict[str, int]:
+        params = dict(DEFAULT_INDEX_PARAMS[index_type])
+        unknown = set(index_params or {}) - set(params)
+        if unknown:
+            raise ValueError(f"Unknown {index_type} index params: {sorted(unknown)}")
+        params.update(index_params or {})
+        return params
+
+    @staticmethod
+    def _infer_index_type(index: faiss.Index) -> Tuple[str, Dict[str, int]]:
+        """Recover type and params from a FAISS index loaded without a .meta file"""
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw", {
+                "M": index.hnsw.nb_neighbors(1),
+                "ef_construction": index.hnsw.efConstruction,
+                "ef_search": index.hnsw.efSearch,
+            }
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf", {"nlist": index.nlist, "nprobe": index.nprobe}
+        if isinstance(index, faiss.IndexScalarQuantizer):
+            return "sq8", dict(DEFAULT_INDEX_PARAMS["sq8"])
+        if isinstance(index, faiss.IndexPQ):
+            return "pq", dict(DEFAULT_INDEX_PARAMS["pq"], m=index.pq.M, nbits=index.pq.nbits)
+        if isinstance(index, faiss.IndexLSH):
+            return "binary", dict(DEFAULT_INDEX_PARAMS["binary"])
+        if isinstance(index, faiss.IndexPreTransform):
+            projection = faiss.downcast_VectorTransform(index.chain.at(0))
+            index_type = "pca" if isinstance(projection, faiss.PCAMatrix) else "rp"
+            return index_type, dict(DEFAULT_INDEX_PARAMS[index_type], dim=projection.d_out)
+        return "flat", {}
+
+    @property
+    def something_ids(self) -> np.ndarray:
+        """Something ID for each index position (int64 array view, do not mutate)"""
+        return self._ids[:self._id_count]
+
+    @property
+    def is_quantized(self) -> bool:
+        """Whether the main index holds compressed codes or projected vectors (searches are re-scored exactly)"""
+        return isinstance(self.index, (faiss.IndexScalarQuantizer, faiss.IndexPQ, faiss.IndexLSH, faiss.IndexPreTransform))
+
+    @property
+    def _accepts_search_params(self) -> bool:
+        """IndexPQ and IndexLSH reject search parameters (no selectors, no usable range search)"""
+        return not isinstance(self.index, (faiss.IndexPQ, faiss.IndexLSH))
+
+    @property
+    def is_reduced(self) -> bool:
+        """Whether the main index searches projected vectors by L2 (see REDUCED_INDEX_TYPES)"""
+        return isinstance(self.index, faiss.IndexPreTransform)
+
+    @property
+    def is_mmapped(self) -> bool:
+        """Whether the main index is a read-only memory map (new vectors go to delta_index)"""
+        return self.delta_index is not None
+
     @property
     def total_vectors(self) -> int:
-        """Get total number of vectors in index"""
-        return self.index.ntotal
+        """Get total number of vectors in index (including tombstoned ones)"""
+        delta_total = self.delta_index.ntotal if self.delta_index is not None else 0
+        return self.index.ntotal + delta_total
+
+    @property
+    def live_vectors(self) -> int:
+        """Get number of searchable (non-deleted) vectors"""
+        return self.total_vectors - len(self.deleted_positions)
+
+    @property
+    def tombstone_ratio(self) -> float:
+        """Fraction of stored vectors that are tombstoned"""
+        if self.total_vectors == 0:
+            return 0.0
+        return len(self.deleted_positions) / self.total_vectors
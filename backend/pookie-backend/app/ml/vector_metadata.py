@@ -0,0 +1,326 @@
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Codes for the somethings.content_type enum
+CONTENT_TYPES = ("text", "image", "video", "url")
+UNKNOWN_USER = -1
+UNKNOWN_CONTENT_TYPE = 255
+MAX_CIRCLES_PER_USER = 64  # One bit per circle in a uint64 mask; bits are allocated per user
+DEFAULT_RECENCY_WEIGHT = 0.1  # Largest boost a brand-new vector gets over an equally similar old one
+
+
+class SearchFilter:
+    """Predicate on per-vector metadata, evaluated inside the index scan.
+
+    Every given condition must hold; circle_ids matches vectors in any of the
+    listed circles.
+    """
+
+    def __init__(
+        self,
+        user_id: Optional[str] = None,
+        content_types: Optional[Sequence[str]] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        circle_ids: Optional[Sequence[int]] = None,
+        exclude_circle_ids: Optional[Sequence[int]] = None
+    ):
+        """Initialize a filter
+
+        Args:
+            user_id: Only vectors owned by this user
+            content_types: Only these content types (see CONTENT_TYPES)
+            created_after: Only vectors created at or after this time
+            created_before: Only vectors created before this time
+            circle_ids: Only vectors assigned to at least one of these circles
+            exclude_circle_ids: Skip vectors assigned to any of these circles
+
+        Raises:
+            ValueError: If a content type is unknown
+        """
+        unknown = set(content_types or []) - set(CONTENT_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown content types {sorted(unknown)}, expected some of {CONTENT_TYPES}")
+        self.user_id = str(user_id) if user_id is not None else None
+        self.content_types = list(content_types) if content_types is not None else None
+        self.created_after = created_after
+        self.created_before = created_before
+        self.circle_ids = list(circle_ids) if circle_ids is not None else None
+        self.exclude_circle_ids = list(exclude_circle_ids) if exclude_circle_ids is not None else None
+
+
+class RecencyDecay:
+    """Recency term added to similarity when ranking search results.
+
+    A vector created ``age`` ago scores ``similarity + weight * 0.5 ** (age / half_life)``,
+    so every half_life halves its boost. Vectors without a creation time get no
+    boost, and creation times in the future count as now.
+    """
+
+    def __init__(self, half_life: timedelta, weight: float = DEFAULT_RECENCY_WEIGHT, now: Optional[datetime] = None):
+        """Initialize the decay
+
+        Args:
+            half_life: Age at which the boost is half of weight
+            weight: Boost of a vector created at now
+            now: Reference time for ages (defaults to the time of each search)
+
+        Raises:
+            ValueError: If half_life isn't positive or weight is negative
+        """
+        if half_life <= timedelta(0):
+            raise ValueError(f"half_life must be positive, got {half_life}")
+        if weight < 0:
+            raise ValueError(f"weight must be non-negative, got {weight}")
+        self.half_life = half_life
+        self.weight = weight
+        self.now = now
+
+    def boosts(self, created_at: np.ndarray) -> np.ndarray:
+        """Recency boost per vector from creation epoch seconds (0 means unknown)"""
+        now = self.now.timestamp() if self.now is not None else time.time()
+        ages = np.maximum(now - created_at, 0.0)
+        boosts = self.weight * np.exp2(-ages / self.half_life.total_seconds())
+        return np.where(created_at > 0, boosts, 0.0)
+
+
+class VectorMetadata:
+    """Columnar per-vector metadata aligned with VectorIndex positions.
+
+    Columns are plain numpy arrays (user code, content type code, creation
+    epoch seconds, circle bitmask), so a SearchFilter turns into one
+    vectorized mask per query. User IDs and circle IDs are mapped to small
+    codes; each user's circles get their own bits of the mask.
+    """
+
+    def __init__(self):
+        self.user_codes: Dict[str, int] = {}
+        self.circle_bits: Dict[int, Tuple[int, int]] = {}  # circle_id -> (user code, bit)
+        self._users = np.empty(0, dtype=np.int32)
+        self._content_types = np.empty(0, dtype=np.uint8)
+        self._created_at = np.empty(0, dtype=np.int64)
+        self._circles = np.empty(0, dtype=np.uint64)
+        self._count = 0
+
+    def append(
+        self,
+        count: int,
+        user_ids: Optional[Sequence[Optional[str]]] = None,
+        content_types: Optional[Sequence[Optional[str]]] = None,
+        created_at: Optional[Sequence[Optional[datetime]]] = None
+    ):
+        """Append rows for count newly added vectors (missing values are unknown)
+
+        Raises:
+            ValueError: If a column's length doesn't match count or a content type is unknown
+        """
+        start = self._count
+        rows = np.arange(start, start + count)
+        self.validate(count, user_ids, content_types, created_at)
+        self._reserve(start + count)
+        self._count = start + count
+        self._users[rows] = UNKNOWN_USER
+        self._content_types[rows] = UNKNOWN_CONTENT_TYPE
+        self._created_at[rows] = 0
+        self._circles[rows] = 0
+        self.update(rows, user_ids, content_types, created_at)
+
+    def update(
+        self,
+        positions: np.ndarray,
+        user_ids: Optional[Sequence[Optional[str]]] = None,
+        content_types: Optional[Sequence[Optional[str]]] = None,
+        created_at: Optional[Sequence[Optional[datetime]]] = None
+    ):
+        """Overwrite the given columns at positions (columns left as None are unchanged)
+
+        Raises:
+            ValueError: If a column's length doesn't match positions or a content type is unknown
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        self.validate(len(positions), user_ids, content_types, created_at)
+        if user_ids is not None:
+            self._users[positions] = [self._user_code(u) for u in user_ids]
+        if content_types is not None:
+            self._content_types[positions] = [self._content_type_code(c) for c in content_types]
+        if created_at is not None:
+            self._created_at[positions] = [self._epoch(t) for t in created_at]
+
+    def set_circles(self, positions: np.ndarray, circle_ids: Iterable[int]):
+        """Replace the circle membership of the given positions
+
+        Raises:
+            ValueError: If the owner's circles no longer fit in MAX_CIRCLES_PER_USER bits
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        circle_ids = [int(circle_id) for circle_id in circle_ids]
+        for position in positions:
+            mask = 0
+            user_code = int(self._users[position])
+            for circle_id in circle_ids:
+                mask |= 1 << self._circle_bit(circle_id, user_code, circle_ids)
+            self._circles[position] = mask
+
+    def mask(self, search_filter: SearchFilter) -> np.ndarray:
+        """Boolean array over positions that satisfy search_filter"""
+        mask = np.ones(self._count, dtype=bool)
+        if search_filter.user_id is not None:
+            user_code = self.user_codes.get(search_filter.user_id)
+            if user_code is None:
+                return np.zeros(self._count, dtype=bool)
+            mask &= self.users == user_code
+        if search_filter.content_types is not None:
+            codes = [CONTENT_TYPES.index(c) for c in search_filter.content_types]
+            mask &= np.isin(self.content_types, codes)
+        if search_filter.created_after is not None:
+            mask &= self.created_at >= self._epoch(search_filter.created_after)
+        if search_filter.created_before is not None:
+            mask &= self.created_at < self._epoch(search_filter.created_before)
+        if search_filter.circle_ids is not None:
+            mask &= self._circle_match(search_filter.circle_ids)
+        if search_filter.exclude_circle_ids is not None:
+            mask &= ~self._circle_match(search_filter.exclude_circle_ids)
+        return mask
+
+    def take(self, positions: np.ndarray) -> "VectorMetadata":
+        """Metadata for the given positions, in order (used when compacting)"""
+        taken = VectorMetadata()
+        taken.user_codes = dict(self.user_codes)
+        taken.circle_bits = dict(self.circle_bits)
+        taken._users = self.users[positions].copy()
+        taken._content_types = self.content_types[positions].copy()
+        taken._created_at = self.created_at[positions].copy()
+        taken._circles = self.circles[positions].copy()
+        taken._count = len(positions)
+        return taken
+
+    def save(self, filepath: str):
+        """Write columns and code maps as an .npz archive"""
+        codes = {"user_codes": self.user_codes, "circle_bits": {str(k): v for k, v in self.circle_bits.items()}}
+        with open(filepath, "wb") as f:
+            np.savez(
+                f,
+                users=self.users,
+                content_types=self.content_types,
+                created_at=self.created_at,
+                circles=self.circles,
+                codes=np.array(json.dumps(codes))
+            )
+
+    @classmethod
+    def load(cls, filepath: str) -> "VectorMetadata":
+        """Read metadata written by save()"""
+        metadata = cls()
+        with np.load(filepath, allow_pickle=False) as data:
+            codes = json.loads(str(data["codes"]))
+            metadata.user_codes = codes["user_codes"]
+            metadata.circle_bits = {int(k): tuple(v) for k, v in codes["circle_bits"].items()}
+            metadata._users = data["users"]
+            metadata._content_types = data["content_types"]
+            metadata._created_at = data["created_at"]
+            metadata._circles = data["circles"]
+        metadata._count = len(metadata._users)
+        return metadata
+
+    @property
+    def missing_positions(self) -> np.ndarray:
+        """Positions without a content type (e.g. loaded from artifacts without metadata or replayed from the log)"""
+        return np.flatnonzero(self.content_types == UNKNOWN_CONTENT_TYPE)
+
+    @property
+    def users(self) -> np.ndarray:
+        return self._users[:self._count]
+
+    @property
+    def content_types(self) -> np.ndarray:
+        return self._content_types[:self._count]
+
+    @property
+    def created_at(self) -> np.ndarray:
+        return self._created_at[:self._count]
+
+    @property
+    def circles(self) -> np.ndarray:
+        return self._circles[:self._count]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _circle_match(self, circle_ids: Sequence[int]) -> np.ndarray:
+        """Positions assigned to any of circle_ids"""
+        match = np.zeros(self._count, dtype=bool)
+        for circle_id in circle_ids:
+            if circle_id in self.circle_bits:
+                user_code, bit = self.circle_bits[circle_id]
+                match |= (self.users == user_code) & ((self.circles >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        return match
+
+    def _circle_bit(self, circle_id: int, user_code: int, keep: Sequence[int] = ()) -> int:
+        """Bit of circle_id, allocating the owner's lowest free bit for a new circle
+
+        When all of the owner's bits are taken, bits of circles that no
+        longer have members (emptied or deleted) are reclaimed first; circles
+        in keep are never reclaimed.
+        """
+        if circle_id in self.circle_bits:
+            return self.circle_bits[circle_id][1]
+        bit = self._free_bit(user_code)
+        if bit is None:
+            in_use = int(np.bitwise_or.reduce(self.circles[self.users == user_code], initial=np.uint64(0)))
+            for empty_id in [
+                other_id for other_id, (owner, other_bit) in self.circle_bits.items()
+                if owner == user_code and not in_use >> other_bit & 1 and other_id not in keep
+            ]:
+                del self.circle_bits[empty_id]
+            bit = self._free_bit(user_code)
+        if bit is None:
+            raise ValueError(f"User has more than {MAX_CIRCLES_PER_USER} circles, circle {circle_id} can't be indexed")
+        self.circle_bits[circle_id] = (user_code, bit)
+        return bit
+
+    def _free_bit(self, user_code: int) -> Optional[int]:
+        """Lowest bit not assigned to any of the owner's circles"""
+        taken = {bit for owner, bit in self.circle_bits.values() if owner == user_code}
+        return next((bit for bit in range(MAX_CIRCLES_PER_USER) if bit not in taken), None)
+
+    def _user_code(self, user_id: Optional[str]) -> int:
+        if user_id is None:
+            return UNKNOWN_USER
+        return self.user_codes.setdefault(str(user_id), len(self.user_codes))
+
+    @staticmethod
+    def validate(count: int, user_ids=None, content_types=None, created_at=None):
+        """Check column lengths and content types before anything is modified
+
+        Raises:
+            ValueError: If a column's length doesn't match count or a content type is unknown
+        """
+        for name, column in (("user_ids", user_ids), ("content_types", content_types), ("created_at", created_at)):
+            if column is not None and len(column) != count:
+                raise ValueError(f"{name} has {len(column)} entries for {count} vectors")
+        unknown = {c for c in content_types or [] if c is not None} - set(CONTENT_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown content types {sorted(unknown)}, expected some of {CONTENT_TYPES}")
+
+    @staticmethod
+    def _content_type_code(content_type: Optional[str]) -> int:
+        return CONTENT_TYPES.index(content_type) if content_type is not None else UNKNOWN_CONTENT_TYPE
+
+    @staticmethod
+    def _epoch(value: Optional[datetime]) -> int:
+        return int(value.timestamp()) if value is not None else 0
+
+    def _reserve(self, needed: int):
+        """Grow every column geometrically (amortized O(1) appends)"""
+        if needed <= len(self._users) and self._users.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self._users), 1024)
+        for name in ("_users", "_content_types", "_created_at", "_circles"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._count] = column[:self._count]
+            setattr(self, name, grown)
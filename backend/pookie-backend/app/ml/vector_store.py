@@ -0,0 +1,93 @@
+from typing import Optional
+
+import numpy as np
+
+from app.ml.index_io import VECTOR_DTYPES, read_vectors, write_vectors
+
+
+class VectorStore:
+    """Full-precision vectors, one row per index position.
+
+    Quantized indices only keep compressed codes in memory; this store holds
+    the exact vectors used to re-score their shortlists. Rows loaded from disk
+    stay memory-mapped, so re-scoring only pages in the rows it reads; rows
+    appended afterwards live in a growable in-memory tail.
+
+    With dtype="float16" rows are kept (and saved) at half size and widened
+    to float32 only when take() hands them out for scoring.
+    """
+
+    def __init__(self, dimension: int, base: Optional[np.ndarray] = None, dtype: str = "float32"):
+        """Initialize a store
+
+        Args:
+            dimension: Vector dimension
+            base: Existing rows of shape (n, dimension), e.g. a read-only memmap
+            dtype: Storage element type, a key of app.ml.index_io.VECTOR_DTYPES
+
+        Raises:
+            ValueError: If dtype is unknown
+        """
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype {dtype!r}, expected one of {sorted(VECTOR_DTYPES)}")
+        self.dimension = dimension
+        self.dtype = dtype
+        self._base = base if base is not None else np.empty((0, dimension), dtype=dtype)
+        self._tail = np.empty((0, dimension), dtype=dtype)  # Grows by doubling
+        self._tail_count = 0
+
+    def append(self, vectors: np.ndarray):
+        """Append rows of shape (n, dimension)"""
+        needed = self._tail_count + len(vectors)
+        if needed > len(self._tail):
+            grown = np.empty((max(needed, 2 * len(self._tail), 1024), self.dimension), dtype=self.dtype)
+            grown[:self._tail_count] = self._tail[:self._tail_count]
+            self._tail = grown
+        self._tail[self._tail_count:needed] = vectors
+        self._tail_count = needed
+
+    def take(self, positions: np.ndarray) -> np.ndarray:
+        """Rows at the given positions as float32, shape (len(positions), dimension)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        base_count = len(self._base)
+        if self._tail_count == 0 or np.all(positions < base_count):
+            return np.asarray(self._base[positions], dtype=np.float32)
+
+        vectors = np.empty((len(positions), self.dimension), dtype=np.float32)
+        in_base = positions < base_count
+        vectors[in_base] = self._base[positions[in_base]]
+        vectors[~in_base] = self._tail[positions[~in_base] - base_count]
+        return vectors
+
+    def copy(self) -> "VectorStore":
+        """Independent copy; the base is shared, since rows are only ever appended to the tail"""
+        store = VectorStore(self.dimension, base=self._base, dtype=self.dtype)
+        store._tail = self._tail[:self._tail_count].copy()
+        store._tail_count = self._tail_count
+        return store
+
+    def save(self, filepath: str):
+        """Write every row to filepath in the store's dtype (see app.ml.index_io.write_vectors)"""
+        write_vectors(filepath, np.concatenate([self._base, self._tail[:self._tail_count]]), self.dtype)
+
+    @classmethod
+    def load(cls, filepath: str, dimension: int, mmap: bool = True) -> "VectorStore":
+        """Open a store written by save(), memory-mapped read-only by default (dtype comes from the file)
+
+        Raises:
+            ValueError: If the stored dimension doesn't match
+        """
+        base = read_vectors(filepath, mmap=mmap)
+        if base.shape[1] != dimension:
+            raise ValueError(f"Vector store dimension mismatch: expected {dimension}, got {base.shape[1]}")
+        dtype = next(name for name, code in VECTOR_DTYPES.items() if base.dtype == np.dtype(code))
+        return cls(dimension, base=base, dtype=dtype)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Heap memory held by the store (memory-mapped rows are not counted)"""
+        base_bytes = 0 if isinstance(self._base, np.memmap) else self._base.nbytes
+        return base_bytes + self._tail.nbytes
+
+    def __len__(self) -> int:
+        return len(self._base) + self._tail_count
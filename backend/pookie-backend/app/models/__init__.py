@@ -9,6 +9,7 @@ from app.models.action import Action
 from app.models.action_intention import ActionIntention
 from app.models.story import Story
 from app.models.story_action import StoryAction
+from app.models.vector_index_log import VectorIndexLogEntry, VectorIndexLogMark
 
 __all__ = [
     "Base",
@@ -22,4 +23,6 @@ __all__ = [
     "ActionIntention",
     "Story",
     "StoryAction",
+    "VectorIndexLogEntry",
+    "VectorIndexLogMark",
 ]
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, BigInteger, LargeBinary, DateTime, Enum, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class VectorIndexLogEntry(Base):
+    """
+    Write-ahead log of changes to the FAISS index.
+
+    Every embedding added to or removed from the index is appended here before
+    it is applied, so persisting a capture is a single INSERT. Index snapshots
+    in Supabase Storage record the last sequence number they contain; on
+    startup the snapshot is loaded and later entries are replayed on top.
+    Entries covered by a snapshot are pruned after it is uploaded.
+
+    something_id has no foreign key: removals must outlive the deleted row.
+    """
+    __tablename__ = "vector_index_log"
+
+    # Monotonic order of changes (BIGSERIAL); SQLite only autoincrements INTEGER keys
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    op = Column(Enum('add', 'remove', name='vector_index_op'), nullable=False)
+    something_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)  # Owner, to update resident user partitions
+    embedding = Column(LargeBinary, nullable=True)  # Raw little-endian vector for 'add' (see IndexLogService.encode_embedding)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<VectorIndexLogEntry(seq={self.seq}, op={self.op}, something_id={self.something_id})>"
+
+
+class VectorIndexLogMark(Base):
+    """
+    Named positions in the index write-ahead log.
+
+    The "truncated" row is the highest sequence number pruned from the log:
+    an index whose log_seq is below it can no longer be caught up by replay.
+    Every other row is a hold placed by an offline reindex on the seq its
+    rebuilt index starts from; the log is never pruned past a hold, so
+    workers adopting the rebuilt index can replay it to the present.
+    """
+    __tablename__ = "vector_index_log_marks"
+
+    name = Column(String(64), primary_key=True)
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<VectorIndexLogMark(name={self.name}, seq={self.seq})>"
@@ -11,13 +11,20 @@ class ChatQueryRequest(BaseModel):
 
     query: str = Field(..., min_length=1, max_length=500, description="User's question")
     top_k: Optional[int] = Field(default=10, ge=1, le=50, description="Number of somethings to retrieve")
+    diversity: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=1.0,
+        description="Weight of novelty over relevance when choosing context somethings (0 = most relevant only)"
+    )
 
     model_config = {
         "json_schema_extra": {
             "examples": [
                 {
                     "query": "What fitness goals have I set?",
-                    "top_k": 10
+                    "top_k": 10,
+                    "diversity": 0.3
                 }
             ]
         }
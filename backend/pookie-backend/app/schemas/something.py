@@ -44,6 +44,8 @@ class SomethingResponse(SomethingBase):
     is_meaning_user_edited: bool = Field(default=False, serialization_alias="isMeaningUserEdited")
     novelty_score: Optional[float] = Field(default=None, ge=0.0, le=1.0, serialization_alias="noveltyScore")
     suggested_circles: List[CirclePrediction] = Field(default_factory=list, serialization_alias="suggestedCircles")
+    duplicate_of: Optional[int] = Field(default=None, serialization_alias="duplicateOf")  # Most similar existing something
+    duplicate_similarity: Optional[float] = Field(default=None, serialization_alias="duplicateSimilarity")
     created_at: datetime = Field(serialization_alias="createdAt")
     updated_at: datetime = Field(serialization_alias="updatedAt")
 
@@ -6,12 +6,16 @@ Implements personalized RAG pipeline with OpenRouter (Claude Haiku) streaming.
 
 import asyncio
 import json
-from typing import AsyncGenerator, Dict, List
+from datetime import timedelta
+from typing import AsyncGenerator, Dict, List, Optional
 import httpx
+import numpy as np
 from sqlalchemy.orm import Session
 from loguru import logger
 
 from app.core.config import settings
+from app.ml.mmr import mmr_select
+from app.ml.vector_metadata import RecencyDecay
 from app.services.personalized_retrieval_service import personalized_retrieval_service
 from app.services.embedding_service import embedding_service
 from app.services.vector_service import vector_service
@@ -25,8 +29,9 @@ class ChatService:
     1. Generate query embedding
     2. FAISS search for top-50 candidates
     3. Re-rank using PersonalizedRetrievalService (hybrid scoring)
-    4. Format context with circle information
-    5. Stream Claude Haiku response via OpenRouter
+    4. Pick a diverse top-k with maximal marginal relevance
+    5. Format context with circle information
+    6. Stream Claude Haiku response via OpenRouter
     """
 
     def __init__(self):
@@ -40,7 +45,8 @@ class ChatService:
         query: str,
         user_id: str,
         db: Session,
-        top_k: int = 10
+        top_k: int = 10,
+        diversity: float = 0.0
     ) -> AsyncGenerator[Dict, None]:
         """
         Stream chat response with personalized RAG context.
@@ -50,6 +56,7 @@ class ChatService:
             user_id: User UUID for filtering
             db: Database session
             top_k: Number of somethings to include in context
+            diversity: MMR weight of novelty over relevance (0 keeps the re-ranked order)
 
         Yields:
             Dict events:
@@ -63,10 +70,12 @@ class ChatService:
             # Step 1: Generate query embedding
             query_embedding = embedding_service.generate_embedding(query)
 
-            # Step 2: FAISS search for top-50 candidates
+            # Step 2: FAISS search for top-50 candidates (user's partition only, recency-weighted if configured)
             faiss_results = await vector_service.search_similar(
                 query_embedding,
-                top_k=50
+                top_k=50,
+                user_id=user_id,
+                recency=self._recency()
             )
 
             if not faiss_results:
@@ -76,19 +85,19 @@ class ChatService:
                 yield {"done": True, "circles_used": []}
                 return
 
-            # Step 3: Re-rank using hybrid scoring
+            # Step 3: Re-rank using hybrid scoring (every candidate, when MMR picks from them next)
             reranked_results = personalized_retrieval_service.retrieve_and_rerank(
                 query_embedding=query_embedding,
                 user_id=user_id,
                 faiss_results=faiss_results,
                 db=db,
-                top_k=top_k
+                top_k=len(faiss_results) if diversity > 0 else top_k
             )
 
-            # Extract something IDs
-            something_ids = [r["something_id"] for r in reranked_results]
+            # Step 4: Diverse top-k, so near-identical captures don't fill the context budget
+            something_ids = await self._select_diverse(reranked_results, top_k, diversity)
 
-            # Step 4: Format RAG context
+            # Step 5: Format RAG context
             context = personalized_retrieval_service.format_rag_context(
                 something_ids,
                 db
@@ -100,10 +109,10 @@ class ChatService:
             circle_matches = re.findall(r'\[Circle: ([^\]]+)\]', context)
             circles_used = list(set([c for c in circle_matches if c != "Uncategorized"]))
 
-            # Step 5: Build system prompt with circle context
+            # Step 6: Build system prompt with circle context
             system_prompt = self._build_system_prompt(context)
 
-            # Step 6: Stream from OpenRouter
+            # Step 7: Stream from OpenRouter
             async for event in self._stream_from_openrouter(query, system_prompt):
                 yield event
 
@@ -114,6 +123,37 @@ class ChatService:
             logger.error(f"Chat stream error: {e}")
             yield {"error": f"Failed to generate response: {str(e)}"}
 
+    async def _select_diverse(self, reranked_results: List[Dict], top_k: int, diversity: float) -> List[int]:
+        """Something IDs of the top_k re-ranked results chosen by maximal marginal relevance
+
+        Relevance is the hybrid final_score; redundancy comes from the
+        candidates' stored embeddings, fetched from the index in one call.
+        """
+        something_ids = [r["something_id"] for r in reranked_results]
+        if diversity <= 0 or len(something_ids) <= top_k:
+            return something_ids[:top_k]
+
+        found_ids, embeddings = await vector_service.get_something_embeddings(something_ids)
+        rows = {sid: row for row, sid in enumerate(found_ids)}
+        candidates = [r for r in reranked_results if r["something_id"] in rows]
+        picked = mmr_select(
+            np.array([r["final_score"] for r in candidates]),
+            embeddings[[rows[r["something_id"]] for r in candidates]],
+            top_k,
+            diversity
+        )
+        return [candidates[i]["something_id"] for i in picked]
+
+    @staticmethod
+    def _recency() -> Optional[RecencyDecay]:
+        """Recency boost for retrieval from settings, or None when disabled"""
+        if settings.RETRIEVAL_RECENCY_HALF_LIFE_DAYS <= 0:
+            return None
+        return RecencyDecay(
+            half_life=timedelta(days=settings.RETRIEVAL_RECENCY_HALF_LIFE_DAYS),
+            weight=settings.RETRIEVAL_RECENCY_WEIGHT
+        )
+
     def _build_system_prompt(self, context: str) -> str:
         """Build system prompt with RAG context."""
         return f"""You are Pookie, a helpful assistant that answers questions based on the user's personal knowledge base.
@@ -2,6 +2,7 @@ from sentence_transformers import SentenceTransformer
 from typing import List, Optional
 import numpy as np
 from loguru import logger
+from app.core.config import settings
 
 
 class EmbeddingService:
@@ -17,7 +18,7 @@ class EmbeddingService:
     Architecture Decision: Backend-only embedding generation (centralized, single source of truth)
     """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = settings.EMBEDDING_MODEL):
         """
         Initialize embedding model.
 
@@ -132,7 +133,8 @@ class EmbeddingService:
         Raises:
             ValueError: If embeddings don't have exactly 384 dimensions
 
-        Used for: RAG confidence thresholds, duplicate detection
+        Used for: RAG confidence thresholds, pairwise duplicate detection
+        (VectorIndex.range_search finds all near-duplicates in the index)
         """
         # Validate dimensions
         if len(embedding1) != 384 or len(embedding2) != 384:
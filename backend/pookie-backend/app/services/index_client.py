@@ -0,0 +1,277 @@
+"""
+Client for the standalone index server (see app.services.index_server).
+
+RemoteVectorService has the same async interface as VectorService, so routes
+and services use whichever one app.services.vector_service.vector_service is.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.ml.vector_metadata import RecencyDecay, SearchFilter
+from app.services.index_protocol import (
+    OP_ADD,
+    OP_GET_EMBEDDINGS,
+    OP_PING,
+    OP_RANGE_SEARCH,
+    OP_REMOVE,
+    OP_SAVE,
+    OP_SEARCH,
+    OP_SET_CIRCLES,
+    STATUS_OK,
+    STATUS_VALUE_ERROR,
+    IndexServerError,
+    decode_results,
+    decode_vectors,
+    encode_filter,
+    encode_recency,
+    encode_vectors,
+    read_frame,
+    write_frame,
+)
+
+SEARCH_BATCH_MAX = 64  # Coalesced searches sent in one request at most
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def _user(user_id: Optional[Any]) -> Optional[str]:
+    return str(user_id) if user_id is not None else None
+
+
+class RemoteVectorService:
+    def __init__(self, socket_path: str, pool_size: int = 4):
+        """Initialize the client (connections are opened on first use)
+
+        Args:
+            socket_path: Unix socket of the index server
+            pool_size: Maximum number of concurrent connections
+        """
+        if pool_size <= 0:
+            raise ValueError(f"pool_size must be positive, got {pool_size}")
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self._idle: List[Connection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        # Searches waiting for the current event loop iteration to end, keyed by their parameters
+        self._pending_searches: Dict[Tuple, Tuple[List[np.ndarray], SearchFilter, RecencyDecay, asyncio.Future]] = {}
+        self._batch_tasks: Set[asyncio.Task] = set()
+
+    async def initialize(self):
+        """Check the index server is reachable (it loads the index itself)"""
+        try:
+            stats, _ = await self._request(OP_PING)
+            logger.info(
+                f"Connected to index server at {self.socket_path} "
+                f"({stats['live_vectors']} vectors, {stats['index_type']})"
+            )
+        except (OSError, IndexServerError) as e:
+            # Requests reconnect on demand, so a server that starts later is picked up
+            logger.warning(f"Index server at {self.socket_path} not reachable yet: {e}")
+
+    def start_flusher(self):
+        """No-op: the index server uploads snapshots"""
+
+    async def stop_flusher(self):
+        """Close pooled connections (the index server flushes on its own shutdown)"""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    def start_change_feed(self):
+        """No-op: the index server tails the log"""
+
+    async def stop_change_feed(self):
+        """No-op: the index server tails the log"""
+
+    async def save_to_storage(self):
+        """Ask the index server to upload a snapshot now"""
+        await self._request(OP_SAVE)
+
+    async def add_something_embedding(
+        self,
+        something_id: int,
+        embedding: List[float],
+        user_id: Optional[str] = None,
+        content_type: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ):
+        """Add a something embedding on the index server (see VectorService.add_something_embedding)"""
+        header, body = encode_vectors(np.asarray([embedding], dtype=np.float32))
+        header.update(
+            something_id=something_id,
+            user_id=_user(user_id),
+            content_type=content_type,
+            created_at=created_at.isoformat() if created_at is not None else None
+        )
+        await self._request(OP_ADD, header, body)
+
+    async def remove_something_embedding(self, something_id: int, user_id: Optional[str] = None) -> bool:
+        """Remove a something embedding on the index server (see VectorService.remove_something_embedding)"""
+        response, _ = await self._request(OP_REMOVE, {
+            "something_id": something_id,
+            "user_id": _user(user_id),
+        })
+        return response["removed"]
+
+    async def set_something_circles(self, something_id: int, circle_ids: List[int]) -> bool:
+        """Replace a something's circles on the index server (see VectorService.set_something_circles)"""
+        response, _ = await self._request(OP_SET_CIRCLES, {"something_id": something_id, "circle_ids": list(circle_ids)})
+        return response["updated"]
+
+    async def search_similar(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        user_id: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None,
+        recency: Optional[RecencyDecay] = None
+    ) -> List[Tuple[int, float]]:
+        """Search for similar somethings (see VectorService.search_similar)
+
+        Searches with the same parameters issued during one event loop
+        iteration (e.g. concurrent requests) are coalesced into a single
+        batched request.
+
+        Raises:
+            ValueError: If query is invalid
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm < 1e-10:
+            # Checked here so one bad query can't fail the whole coalesced batch
+            raise ValueError(f"Query embedding has zero or near-zero norm ({norm}), cannot normalize")
+
+        key = (
+            len(query),
+            top_k,
+            user_id,
+            json.dumps(encode_filter(search_filter), sort_keys=True),
+            json.dumps(encode_recency(recency), sort_keys=True)
+        )
+        pending = self._pending_searches.get(key)
+        if pending is None:
+            pending = ([], search_filter, recency, asyncio.get_running_loop().create_future())
+            self._pending_searches[key] = pending
+            asyncio.get_running_loop().call_soon(self._send_pending_searches, key)
+        queries, _, _, future = pending
+        position = len(queries)
+        queries.append(query)
+        if len(queries) >= SEARCH_BATCH_MAX:
+            self._send_pending_searches(key)
+        return (await asyncio.shield(future))[position]
+
+    async def search_similar_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        user_id: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None,
+        recency: Optional[RecencyDecay] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Search for somethings similar to each query in one request (see VectorService.search_similar_batch)"""
+        if len(query_embeddings) == 0:
+            return []
+        header, body = encode_vectors(np.asarray(query_embeddings, dtype=np.float32))
+        header.update(
+            top_k=top_k,
+            user_id=_user(user_id),
+            filter=encode_filter(search_filter),
+            recency=encode_recency(recency)
+        )
+        response, response_body = await self._request(OP_SEARCH, header, body)
+        return decode_results(response, response_body)
+
+    async def range_search_similar(
+        self,
+        query_embedding: List[float],
+        min_similarity: float,
+        user_id: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[Tuple[int, float]]:
+        """Find every something at least min_similarity to the query (see VectorService.range_search_similar)"""
+        header, body = encode_vectors(np.asarray([query_embedding], dtype=np.float32))
+        header.update(min_similarity=min_similarity, user_id=_user(user_id), filter=encode_filter(search_filter))
+        response, response_body = await self._request(OP_RANGE_SEARCH, header, body)
+        return decode_results(response, response_body)[0]
+
+    async def get_something_embeddings(self, something_ids: List[int]) -> Tuple[List[int], np.ndarray]:
+        """Stored embeddings of somethings from the index server (see VectorService.get_something_embeddings)"""
+        response, response_body = await self._request(OP_GET_EMBEDDINGS, {"something_ids": list(something_ids)})
+        return response["something_ids"], decode_vectors(response, response_body)
+
+    def _send_pending_searches(self, key: Tuple):
+        """Send the searches coalesced under key as one batched request"""
+        pending = self._pending_searches.pop(key, None)
+        if pending is None:
+            return  # Already sent because the batch filled up
+        queries, search_filter, recency, future = pending
+        top_k, user_id = key[1], key[2]
+
+        async def send():
+            try:
+                future.set_result(
+                    await self.search_similar_batch(np.stack(queries), top_k, user_id, search_filter, recency)
+                )
+            except Exception as e:
+                future.set_exception(e)
+
+        task = asyncio.create_task(send())
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _request(self, op: int, header: Optional[Dict[str, Any]] = None, body: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        """Send one request on a pooled connection and wait for its response
+
+        A pooled connection the server closed while it sat idle (e.g. the
+        server restarted) is dropped and the request retried once on a fresh
+        connection.
+
+        Raises:
+            ValueError: If the server rejected the request as invalid
+            IndexServerError: If the server failed or the connection broke
+        """
+        async with self._slots:
+            reused = bool(self._idle)
+            connection = self._idle.pop() if reused else await self._connect()
+            try:
+                try:
+                    status, response, response_body = await self._exchange(connection, op, header, body)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    if not reused:
+                        raise
+                    logger.debug(f"Pooled index server connection went stale ({e!r}), reconnecting")
+                    connection = await self._connect()
+                    status, response, response_body = await self._exchange(connection, op, header, body)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                raise IndexServerError(f"Index server connection failed: {e}") from e
+            self._idle.append(connection)
+
+        if status == STATUS_VALUE_ERROR:
+            raise ValueError(response["error"])
+        if status != STATUS_OK:
+            raise IndexServerError(response["error"])
+        return response, response_body
+
+    @staticmethod
+    async def _exchange(connection: Connection, op: int, header: Optional[Dict[str, Any]], body: bytes) -> Tuple[int, Dict[str, Any], bytes]:
+        """Write one request frame and read the response frame, closing the connection on any failure"""
+        reader, writer = connection
+        try:
+            write_frame(writer, op, header, body)
+            await writer.drain()
+            return await read_frame(reader)
+        except BaseException:
+            # The stream may be mid-frame (or the server went away): never reuse it
+            writer.close()
+            raise
+
+    async def _connect(self) -> Connection:
+        try:
+            return await asyncio.open_unix_connection(self.socket_path)
+        except OSError as e:
+            raise IndexServerError(f"Cannot connect to index server at {self.socket_path}: {e}") from e
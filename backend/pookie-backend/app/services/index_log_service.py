@@ -0,0 +1,236 @@
+"""
+Write-ahead log for the FAISS index.
+
+Index changes are appended to the vector_index_log table (one small INSERT per
+capture) instead of re-uploading the whole index. VectorService periodically
+uploads a full snapshot tagged with the last sequence number it contains and
+replays newer entries on startup. Running workers also tail the log as a
+change feed, applying entries past the last sequence number they reflect.
+
+Pruning is recorded in vector_index_log_marks, so an index that fell behind
+the pruned prefix is detected instead of silently missing changes, and an
+offline reindex holds back pruning past the seq its rebuilt index starts from.
+"""
+import uuid
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.ml.index_io import VECTOR_DTYPES
+from app.models.vector_index_log import VectorIndexLogEntry, VectorIndexLogMark
+
+# Prefix of float16 embeddings; it makes their length odd, unlike float32 payloads (a multiple of 4 bytes)
+FLOAT16_TAG = b"h"
+TRUNCATED_MARK = "truncated"  # Mark holding the highest pruned seq; every other mark is a hold
+
+
+class IndexLogService:
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, embedding_dtype: str = "float32"):
+        """Initialize the log
+
+        Args:
+            session_factory: Callable returning a new Session (defaults to SessionLocal)
+            embedding_dtype: Element type embeddings are logged in ("float32" or "float16")
+
+        Raises:
+            ValueError: If embedding_dtype is unknown
+        """
+        if embedding_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown embedding_dtype {embedding_dtype!r}, expected one of {sorted(VECTOR_DTYPES)}")
+        self._session_factory = session_factory
+        self.embedding_dtype = embedding_dtype
+
+    def append_add(self, something_id: int, embedding: np.ndarray, user_id: Optional[str] = None) -> int:
+        """Log an embedding added to the index
+
+        Args:
+            something_id: Unique identifier for the embedding
+            embedding: Vector of shape (dimension,)
+            user_id: Owner of the something
+
+        Returns:
+            Sequence number of the new entry
+        """
+        return self._append(VectorIndexLogEntry(
+            op="add",
+            something_id=something_id,
+            user_id=self._as_uuid(user_id),
+            embedding=self.encode_embedding(embedding, self.embedding_dtype)
+        ))
+
+    def append_remove(self, something_id: int, user_id: Optional[str] = None) -> int:
+        """Log an embedding removed from the index
+
+        Returns:
+            Sequence number of the new entry
+        """
+        return self._append(VectorIndexLogEntry(op="remove", something_id=something_id, user_id=self._as_uuid(user_id)))
+
+    def read_since(self, seq: int, limit: Optional[int] = None) -> List[VectorIndexLogEntry]:
+        """Entries with a sequence number greater than seq, oldest first
+
+        Args:
+            seq: Last sequence number already applied
+            limit: Maximum number of entries to return
+
+        Returns:
+            Detached log entries
+        """
+        db = self._session()
+        try:
+            query = db.query(VectorIndexLogEntry).filter(VectorIndexLogEntry.seq > seq).order_by(VectorIndexLogEntry.seq)
+            if limit is not None:
+                query = query.limit(limit)
+            entries = query.all()
+            db.expunge_all()
+            return entries
+        finally:
+            db.close()
+
+    def latest_seq(self) -> int:
+        """Sequence number of the newest entry (0 if the log is empty)"""
+        db = self._session()
+        try:
+            return db.query(func.max(VectorIndexLogEntry.seq)).scalar() or 0
+        finally:
+            db.close()
+
+    def truncate_through(self, seq: int) -> int:
+        """Delete entries already contained in a snapshot
+
+        Entries after a hold (see hold) are kept, and the highest seq deleted
+        is recorded for truncated_through.
+
+        Args:
+            seq: Sequence number recorded in the uploaded snapshot
+
+        Returns:
+            Number of entries deleted
+        """
+        db = self._session()
+        try:
+            held = db.query(func.min(VectorIndexLogMark.seq)).filter(VectorIndexLogMark.name != TRUNCATED_MARK).scalar()
+            if held is not None and held < seq:
+                logger.info(f"Index log truncation held at seq {held} (reindex in progress), snapshot is at {seq}")
+                seq = held
+            deleted = db.query(VectorIndexLogEntry).filter(VectorIndexLogEntry.seq <= seq).delete(synchronize_session=False)
+            raised = (
+                db.query(VectorIndexLogMark)
+                .filter(VectorIndexLogMark.name == TRUNCATED_MARK, VectorIndexLogMark.seq < seq)
+                .update({"seq": seq}, synchronize_session=False)
+            )
+            if not raised and db.get(VectorIndexLogMark, TRUNCATED_MARK) is None:
+                db.add(VectorIndexLogMark(name=TRUNCATED_MARK, seq=seq))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        logger.debug(f"Truncated {deleted} index log entries through seq {seq}")
+        return deleted
+
+    def truncated_through(self) -> int:
+        """Highest sequence number deleted by truncate_through (0 if the log was never truncated)
+
+        An index whose log_seq is below it can't be caught up by replay alone.
+        """
+        db = self._session()
+        try:
+            mark = db.get(VectorIndexLogMark, TRUNCATED_MARK)
+            return mark.seq if mark is not None else 0
+        finally:
+            db.close()
+
+    def hold(self, name: str) -> int:
+        """Keep entries after the newest one from being truncated until release(name)
+
+        Placing a hold that already exists keeps its original seq.
+
+        Args:
+            name: Identifies the holder (e.g. one reindex run)
+
+        Returns:
+            Sequence number of the hold; every later entry stays in the log
+
+        Raises:
+            ValueError: If name is reserved
+        """
+        if name == TRUNCATED_MARK:
+            raise ValueError(f"{TRUNCATED_MARK!r} is reserved")
+        db = self._session()
+        try:
+            mark = db.get(VectorIndexLogMark, name)
+            if mark is not None:
+                return mark.seq
+            seq = db.query(func.max(VectorIndexLogEntry.seq)).scalar() or 0
+            db.add(VectorIndexLogMark(name=name, seq=seq))
+            db.commit()
+            return seq
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def release(self, name: str):
+        """Remove a hold placed by hold (no-op if it doesn't exist)
+
+        Raises:
+            ValueError: If name is reserved
+        """
+        if name == TRUNCATED_MARK:
+            raise ValueError(f"{TRUNCATED_MARK!r} is reserved")
+        db = self._session()
+        try:
+            db.query(VectorIndexLogMark).filter(VectorIndexLogMark.name == name).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def encode_embedding(embedding: Iterable[float], dtype: str = "float32") -> bytes:
+        """Pack a vector as raw little-endian float32, or FLOAT16_TAG + float16 at half the size"""
+        if dtype == "float16":
+            return FLOAT16_TAG + np.asarray(embedding, dtype="<f2").tobytes()
+        return np.asarray(embedding, dtype="<f4").tobytes()
+
+    @staticmethod
+    def decode_embedding(data: bytes) -> np.ndarray:
+        """Unpack a vector written by encode_embedding, widened to float32"""
+        if len(data) % 2 == 1 and data[:1] == FLOAT16_TAG:
+            return np.frombuffer(data, dtype="<f2", offset=1).astype(np.float32)
+        return np.frombuffer(data, dtype="<f4").astype(np.float32)
+
+    @staticmethod
+    def _as_uuid(user_id: Optional[str]) -> Optional[uuid.UUID]:
+        return uuid.UUID(str(user_id)) if user_id is not None else None
+
+    def _append(self, entry: VectorIndexLogEntry) -> int:
+        db = self._session()
+        try:
+            db.add(entry)
+            db.commit()
+            return entry.seq
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _session(self) -> Session:
+        if self._session_factory is None:
+            from app.core.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+
+# Singleton instance
+index_log_service = IndexLogService(embedding_dtype=settings.VECTOR_STORAGE_DTYPE)
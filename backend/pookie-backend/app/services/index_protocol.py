@@ -0,0 +1,157 @@
+"""
+Binary protocol between the index server and its clients.
+
+Every message is one frame:
+
+    code (uint8) | header length (uint32) | body length (uint32) | header | body
+
+The header is a small UTF-8 JSON object (IDs, parameters, error messages);
+the body carries arrays as raw little-endian bytes, so vectors and results
+are never converted to JSON. Requests use an OP_* code, responses a STATUS_*
+code.
+"""
+import asyncio
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.ml.vector_metadata import RecencyDecay, SearchFilter
+
+FRAME_HEADER = struct.Struct("<BII")
+MAX_FRAME_BYTES = 256 * 1024 * 1024  # Guards against reading garbage as a huge length
+
+# Request op codes
+OP_PING = 1
+OP_ADD = 2
+OP_REMOVE = 3
+OP_SEARCH = 4
+OP_RANGE_SEARCH = 5
+OP_SET_CIRCLES = 6
+OP_SAVE = 7
+OP_GET_EMBEDDINGS = 8
+
+# Response status codes
+STATUS_OK = 0
+STATUS_VALUE_ERROR = 1  # Re-raised as ValueError by the client
+STATUS_ERROR = 2
+
+
+class IndexServerError(Exception):
+    """The index server failed to handle a request or the connection broke"""
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any], bytes]:
+    """Read one frame
+
+    Returns:
+        (code, header, body)
+
+    Raises:
+        asyncio.IncompleteReadError: If the peer closed the connection
+        IndexServerError: If the frame is larger than MAX_FRAME_BYTES
+    """
+    code, header_length, body_length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if header_length + body_length > MAX_FRAME_BYTES:
+        raise IndexServerError(f"Frame of {header_length + body_length} bytes exceeds {MAX_FRAME_BYTES}")
+    header = json.loads(await reader.readexactly(header_length)) if header_length else {}
+    body = await reader.readexactly(body_length) if body_length else b""
+    return code, header, body
+
+
+def write_frame(writer: asyncio.StreamWriter, code: int, header: Optional[Dict[str, Any]] = None, body: bytes = b""):
+    """Queue one frame on writer (call writer.drain() afterwards)"""
+    header_bytes = json.dumps(header).encode() if header else b""
+    writer.write(FRAME_HEADER.pack(code, len(header_bytes), len(body)) + header_bytes + body)
+
+
+def encode_vectors(vectors: np.ndarray) -> Tuple[Dict[str, Any], bytes]:
+    """Header fields and body for a float32 matrix"""
+    vectors = np.asarray(vectors, dtype="<f4")
+    return {"rows": vectors.shape[0], "dimension": vectors.shape[1]}, vectors.tobytes()
+
+
+def decode_vectors(header: Dict[str, Any], body: bytes) -> np.ndarray:
+    """Matrix written by encode_vectors"""
+    return np.frombuffer(body, dtype="<f4").astype(np.float32).reshape(header["rows"], header["dimension"])
+
+
+def encode_results(results: List[List[Tuple[int, float]]]) -> Tuple[Dict[str, Any], bytes]:
+    """Header fields and body for per-query (something_id, similarity) lists
+
+    Body layout: match count per query (uint32), then all IDs (int64), then all similarities (float32).
+    """
+    counts = np.array([len(r) for r in results], dtype="<u4")
+    ids = np.array([sid for r in results for sid, _ in r], dtype="<i8")
+    similarities = np.array([sim for r in results for _, sim in r], dtype="<f4")
+    return {"queries": len(results)}, counts.tobytes() + ids.tobytes() + similarities.tobytes()
+
+
+def decode_results(header: Dict[str, Any], body: bytes) -> List[List[Tuple[int, float]]]:
+    """Result lists written by encode_results"""
+    queries = header["queries"]
+    counts = np.frombuffer(body, dtype="<u4", count=queries)
+    total = int(counts.sum())
+    ids = np.frombuffer(body, dtype="<i8", count=total, offset=4 * queries)
+    similarities = np.frombuffer(body, dtype="<f4", count=total, offset=4 * queries + 8 * total)
+    limits = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    return [
+        list(zip(ids[start:end].tolist(), similarities[start:end].tolist()))
+        for start, end in zip(limits[:-1], limits[1:])
+    ]
+
+
+def encode_filter(search_filter: Optional[SearchFilter]) -> Optional[Dict[str, Any]]:
+    """JSON-safe form of a SearchFilter"""
+    if search_filter is None:
+        return None
+    return {
+        "user_id": search_filter.user_id,
+        "content_types": search_filter.content_types,
+        "created_after": search_filter.created_after.isoformat() if search_filter.created_after else None,
+        "created_before": search_filter.created_before.isoformat() if search_filter.created_before else None,
+        "circle_ids": search_filter.circle_ids,
+        "exclude_circle_ids": search_filter.exclude_circle_ids,
+    }
+
+
+def decode_filter(data: Optional[Dict[str, Any]]) -> Optional[SearchFilter]:
+    """SearchFilter written by encode_filter"""
+    if data is None:
+        return None
+    return SearchFilter(
+        user_id=data["user_id"],
+        content_types=data["content_types"],
+        created_after=parse_datetime(data["created_after"]),
+        created_before=parse_datetime(data["created_before"]),
+        circle_ids=data["circle_ids"],
+        exclude_circle_ids=data["exclude_circle_ids"]
+    )
+
+
+def encode_recency(recency: Optional[RecencyDecay]) -> Optional[Dict[str, Any]]:
+    """JSON-safe form of a RecencyDecay"""
+    if recency is None:
+        return None
+    return {
+        "half_life_seconds": recency.half_life.total_seconds(),
+        "weight": recency.weight,
+        "now": recency.now.isoformat() if recency.now else None,
+    }
+
+
+def decode_recency(data: Optional[Dict[str, Any]]) -> Optional[RecencyDecay]:
+    """RecencyDecay written by encode_recency"""
+    if data is None:
+        return None
+    return RecencyDecay(
+        half_life=timedelta(seconds=data["half_life_seconds"]),
+        weight=data["weight"],
+        now=parse_datetime(data["now"])
+    )
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
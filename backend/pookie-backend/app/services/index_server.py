@@ -0,0 +1,195 @@
+"""
+Standalone index server.
+
+One process owns the FAISS index (snapshot loading, write-ahead log,
+background flushes) and serves every API worker on the host over a Unix
+socket, so N uvicorn workers share one copy of the index and see each
+other's writes immediately. Workers talk to it through
+app.services.index_client.RemoteVectorService when
+VECTOR_INDEX_SERVER_SOCKET is set.
+
+Run with:
+    python -m app.services.index_server --socket /run/pookie/index.sock
+"""
+import argparse
+import asyncio
+import os
+import signal
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.index_protocol import (
+    OP_ADD,
+    OP_GET_EMBEDDINGS,
+    OP_PING,
+    OP_RANGE_SEARCH,
+    OP_REMOVE,
+    OP_SAVE,
+    OP_SEARCH,
+    OP_SET_CIRCLES,
+    STATUS_ERROR,
+    STATUS_OK,
+    STATUS_VALUE_ERROR,
+    decode_filter,
+    decode_recency,
+    decode_vectors,
+    encode_results,
+    encode_vectors,
+    parse_datetime,
+    read_frame,
+    write_frame,
+)
+from app.services.vector_service import VectorService
+
+
+class IndexServer:
+    def __init__(self, service: VectorService, socket_path: str):
+        """Initialize the server
+
+        Args:
+            service: In-process service that owns the index
+            socket_path: Filesystem path of the Unix socket to listen on
+        """
+        self.service = service
+        self.socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Listen on socket_path, replacing a stale socket file left by a previous run"""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        logger.info(f"Index server listening on {self.socket_path}")
+
+    async def close(self):
+        """Stop accepting connections and remove the socket file"""
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection in order until the client disconnects
+
+        Clients pool connections, so concurrency comes from concurrent
+        connections; the service's lock lets their searches run in parallel.
+        """
+        try:
+            while True:
+                try:
+                    op, header, body = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    return  # Client closed the connection
+
+                try:
+                    response_header, response_body = await self._dispatch(op, header, body)
+                    write_frame(writer, STATUS_OK, response_header, response_body)
+                except ValueError as e:
+                    write_frame(writer, STATUS_VALUE_ERROR, {"error": str(e)})
+                except Exception as e:
+                    logger.error(f"Index server request {op} failed: {e}")
+                    write_frame(writer, STATUS_ERROR, {"error": str(e)})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, op: int, header: Dict[str, Any], body: bytes) -> Tuple[Dict[str, Any], bytes]:
+        """Run one request against the service
+
+        Returns:
+            (response header, response body)
+
+        Raises:
+            ValueError: For invalid requests (sent back as STATUS_VALUE_ERROR)
+        """
+        service = self.service
+        if op == OP_PING:
+            return {
+                "total_vectors": service.index.total_vectors,
+                "live_vectors": service.index.live_vectors,
+                "index_type": service.index.index_type,
+            }, b""
+        if op == OP_ADD:
+            await service.add_something_embedding(
+                header["something_id"],
+                decode_vectors(header, body)[0],
+                user_id=header.get("user_id"),
+                content_type=header.get("content_type"),
+                created_at=parse_datetime(header.get("created_at"))
+            )
+            return {}, b""
+        if op == OP_REMOVE:
+            removed = await service.remove_something_embedding(header["something_id"], user_id=header.get("user_id"))
+            return {"removed": removed}, b""
+        if op == OP_SEARCH:
+            results = await service.search_similar_batch(
+                decode_vectors(header, body),
+                top_k=header["top_k"],
+                user_id=header.get("user_id"),
+                search_filter=decode_filter(header.get("filter")),
+                recency=decode_recency(header.get("recency"))
+            )
+            return encode_results(results)
+        if op == OP_RANGE_SEARCH:
+            results = [
+                await service.range_search_similar(
+                    query,
+                    header["min_similarity"],
+                    user_id=header.get("user_id"),
+                    search_filter=decode_filter(header.get("filter"))
+                )
+                for query in decode_vectors(header, body)
+            ]
+            return encode_results(results)
+        if op == OP_SET_CIRCLES:
+            updated = await service.set_something_circles(header["something_id"], header["circle_ids"])
+            return {"updated": updated}, b""
+        if op == OP_GET_EMBEDDINGS:
+            found_ids, embeddings = await service.get_something_embeddings(header["something_ids"])
+            response_header, response_body = encode_vectors(embeddings)
+            response_header["something_ids"] = found_ids
+            return response_header, response_body
+        if op == OP_SAVE:
+            await service.save_to_storage()
+            return {}, b""
+        raise ValueError(f"Unknown index server op {op}")
+
+
+async def serve(socket_path: str):
+    """Load the index, then serve it until SIGINT/SIGTERM (with a final snapshot on exit)"""
+    service = VectorService()
+    await service.initialize()
+    service.start_flusher()
+    service.start_change_feed()  # Picks up writes from index servers on other hosts
+
+    server = IndexServer(service, socket_path)
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Index server shutting down")
+    await server.close()
+    await service.stop_change_feed()
+    await service.stop_flusher()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the FAISS index to API workers over a Unix socket")
+    parser.add_argument(
+        "--socket",
+        default=settings.VECTOR_INDEX_SERVER_SOCKET or "/tmp/pookie-index.sock",
+        help="Unix socket path (defaults to VECTOR_INDEX_SERVER_SOCKET)"
+    )
+    args = parser.parse_args()
+    asyncio.run(serve(args.socket))
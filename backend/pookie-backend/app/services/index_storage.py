@@ -0,0 +1,360 @@
+"""
+Persistence backends for index artifacts.
+
+An artifact (.faiss, .ids, .vectors, ...) is stored as one or more chunk
+objects, each compressed on its own: the first chunk under the artifact's
+name, chunk i under "<name>.part<i>". Chunks stream between a local file and
+the store a few at a time, so no artifact is ever held in memory whole and
+large ones stay under per-object size limits. Every storage call,
+compression included, runs in a worker thread; nothing blocks the event loop.
+
+An index is published as a version: its artifacts go to a fresh
+"<version>/" folder, then one small pointer object naming the version is
+replaced (see IndexStorage.publish_version).
+
+LocalIndexStorage keeps the objects in a directory (offline benchmarks,
+single-host deployments), SupabaseIndexStorage in a Supabase Storage bucket.
+"""
+import abc
+import asyncio
+import json
+import os
+import re
+import zlib
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Deque, Iterable, List, Optional, TypeVar
+
+from loguru import logger
+from supabase import create_client
+
+from app.core.config import settings
+
+CODECS = ("zstd", "zlib", "none")  # Compression applied to each chunk
+ZSTD_LEVEL = 3  # zstd's default: most of the size win at several hundred MB/s
+ZLIB_LEVEL = 6
+DEFAULT_CHUNK_BYTES = 32 << 20  # Uncompressed bytes per chunk object (below Supabase's 50 MB upload limit)
+DEFAULT_CONCURRENCY = 4  # Chunks in flight per artifact transfer
+LIST_PAGE_SIZE = 1000  # Objects listed per Supabase Storage request
+VERSION_PATTERN = re.compile(r"^\d{8}T\d{12}Z-\d+$")  # Storage folder of one published index version
+
+T = TypeVar("T")
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """Compress one chunk
+
+    Raises:
+        ValueError: If codec isn't one of CODECS
+    """
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == "none":
+        return data
+    raise ValueError(f"Unknown storage codec {codec!r}, expected one of {CODECS}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """Decompress one chunk
+
+    Raises:
+        ValueError: If codec isn't one of CODECS or the chunk is corrupt
+    """
+    if codec == "zstd":
+        import zstandard
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Corrupt zstd chunk: {e}") from e
+    if codec == "zlib":
+        try:
+            return zlib.decompress(data)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt zlib chunk: {e}") from e
+    if codec == "none":
+        return data
+    raise ValueError(f"Unknown storage codec {codec!r}, expected one of {CODECS}")
+
+
+def chunk_name(name: str, index: int) -> str:
+    """Object name of chunk index of an artifact (the first chunk keeps the artifact's own name)"""
+    return name if index == 0 else f"{name}.part{index}"
+
+
+class IndexStorage(abc.ABC):
+    """Object store for index artifacts
+
+    Subclasses implement blocking get/put/list/delete of single objects
+    (_get, _put, _list, _delete); this class runs them in worker threads and
+    layers chunked, compressed artifact transfer on top.
+    """
+
+    def __init__(self, codec: str = "zstd", chunk_bytes: int = DEFAULT_CHUNK_BYTES, concurrency: int = DEFAULT_CONCURRENCY):
+        """Initialize the storage
+
+        Args:
+            codec: Compression for uploaded chunks (one of CODECS)
+            chunk_bytes: Uncompressed size of each chunk
+            concurrency: Chunks transferred at a time per artifact
+
+        Raises:
+            ValueError: If codec is unknown or chunk_bytes/concurrency isn't positive
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown storage codec {codec!r}, expected one of {CODECS}")
+        if chunk_bytes <= 0:
+            raise ValueError(f"chunk_bytes must be positive, got {chunk_bytes}")
+        if concurrency <= 0:
+            raise ValueError(f"concurrency must be positive, got {concurrency}")
+        self.codec = codec
+        self.chunk_bytes = chunk_bytes
+        self.concurrency = concurrency
+
+    @abc.abstractmethod
+    def _get(self, name: str) -> bytes:
+        """Read one object"""
+
+    @abc.abstractmethod
+    def _put(self, name: str, data: bytes):
+        """Write one object, replacing any existing one"""
+
+    @abc.abstractmethod
+    def _list(self, prefix: Optional[str]) -> List[str]:
+        """Names of the objects and folders directly under prefix (None: the top level)"""
+
+    @abc.abstractmethod
+    def _delete(self, names: List[str]):
+        """Delete objects by name (missing ones are ignored)"""
+
+    async def get(self, name: str) -> bytes:
+        """Read a whole object as stored (uncompressed, unchunked; for small objects like the version pointer)"""
+        return await asyncio.to_thread(self._get, name)
+
+    async def put(self, name: str, data: bytes):
+        """Write a whole object as given, replacing any existing one"""
+        await asyncio.to_thread(self._put, name, data)
+
+    async def list(self, prefix: Optional[str] = None) -> List[str]:
+        """Names of the objects and folders directly under prefix (None: the top level)"""
+        return await asyncio.to_thread(self._list, prefix)
+
+    async def delete(self, names: List[str]):
+        """Delete objects by name"""
+        if names:
+            await asyncio.to_thread(self._delete, names)
+
+    async def upload_file(self, name: str, path: str) -> int:
+        """Upload a local file as compressed chunks, up to concurrency at a time
+
+        Each worker thread reads, compresses and uploads one chunk, so at most
+        concurrency chunks are in memory.
+
+        Returns:
+            Number of chunks, which download_file needs to read the artifact back
+        """
+        count = max(1, -(-os.path.getsize(path) // self.chunk_bytes))  # An empty file is one empty chunk
+        calls = (partial(self._upload_chunk, path, index, chunk_name(name, index)) for index in range(count))
+        async with aclosing(self._in_threads(calls)) as uploads:
+            async for _ in uploads:
+                pass
+        return count
+
+    async def download_file(self, name: str, path: str, chunks: Optional[int] = None, codec: Optional[str] = None):
+        """Download an artifact to path, fetching up to concurrency chunks ahead of the one being written
+
+        The file is written under a temporary name and renamed into place, so
+        a process that has the previous file mmapped keeps a consistent view.
+
+        Args:
+            name: Object name of the artifact
+            path: Local destination
+            chunks: Number of chunks upload_file returned; None for a single
+                uncompressed object (artifacts uploaded before chunking)
+            codec: Codec the chunks were compressed with (default: this storage's)
+
+        Raises:
+            ValueError: If a chunk is corrupt (path is left untouched)
+        """
+        if chunks is None:
+            chunks, codec = 1, "none"
+        codec = codec or self.codec
+        calls = (partial(self._download_chunk, chunk_name(name, index), codec) for index in range(chunks))
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # Per process: workers on a host may download the same file
+        try:
+            with open(tmp_path, "wb") as f:
+                async with aclosing(self._in_threads(calls)) as downloads:
+                    async for data in downloads:
+                        await asyncio.to_thread(f.write, data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def publish_version(self, index_path: str, name: str, keep_versions: int) -> str:
+        """Upload the artifacts at index_path as a new version and make it current
+
+        Every artifact goes to a fresh <version>/ folder as compressed chunks,
+        then the pointer object "<name>.current" (a copy of the manifest plus
+        the chunk layout) is replaced in one upload; readers see either the
+        old version or the new one, never a mix. Versions beyond
+        keep_versions are deleted afterwards.
+
+        Args:
+            index_path: Local path of the saved index (VectorIndex.save)
+            name: Object name of the index within a version folder
+            keep_versions: Newest versions to keep in storage
+
+        Returns:
+            The new version
+        """
+        with open(index_path + ".meta") as f:
+            manifest = json.load(f)
+        version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}Z-{manifest['log_seq']}"
+
+        # .faiss, .ids, .metadata and (quantized index types only) .vectors files, then the .meta manifest
+        suffixes = ["", ".ids", ".metadata"] + ([".vectors"] if os.path.exists(index_path + ".vectors") else []) + [".meta"]
+        chunks = {}
+        for suffix in suffixes:
+            chunks[suffix] = await self.upload_file(f"{version}/{name}{suffix}", index_path + suffix)
+
+        # Publish: the pointer is the only object that is overwritten
+        layout = {"codec": self.codec, "chunks": chunks}
+        await self.put(name + ".current", json.dumps(dict(manifest, version=version, layout=layout)).encode())
+
+        try:
+            await self.prune_versions(keep_versions)
+        except Exception as e:
+            logger.warning(f"Could not delete old index versions: {e}")
+        return version
+
+    async def prune_versions(self, keep_versions: int):
+        """Delete stored versions older than the newest keep_versions"""
+        versions = sorted(name for name in await self.list() if VERSION_PATTERN.match(name))
+        for version in versions[:-keep_versions]:
+            await self.delete([f"{version}/{name}" for name in await self.list(version)])
+            logger.info(f"Deleted index version {version} from storage")
+
+    def _upload_chunk(self, path: str, index: int, name: str):
+        with open(path, "rb") as f:
+            f.seek(index * self.chunk_bytes)
+            data = f.read(self.chunk_bytes)
+        self._put(name, compress(data, self.codec))
+
+    def _download_chunk(self, name: str, codec: str) -> bytes:
+        return decompress(self._get(name), codec)
+
+    async def _in_threads(self, calls: Iterable[Callable[[], T]]) -> AsyncIterator[T]:
+        """Run blocking calls in worker threads, at most concurrency at a time, yielding results in call order"""
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            for call in calls:
+                pending.append(asyncio.ensure_future(asyncio.to_thread(call)))
+                if len(pending) >= self.concurrency:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class LocalIndexStorage(IndexStorage):
+    """Objects as files under a local directory (folders in object names become subdirectories)"""
+
+    def __init__(self, root: str, **options: Any):
+        """Initialize the storage
+
+        Args:
+            root: Directory holding the objects (created on first write)
+            **options: codec, chunk_bytes and concurrency (see IndexStorage)
+        """
+        super().__init__(**options)
+        self.root = root
+
+    def _get(self, name: str) -> bytes:
+        with open(os.path.join(self.root, name), "rb") as f:
+            return f.read()
+
+    def _put(self, name: str, data: bytes):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # Readers never see a partial object
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _list(self, prefix: Optional[str]) -> List[str]:
+        directory = os.path.join(self.root, prefix) if prefix else self.root
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if not name.endswith(".tmp"))
+
+    def _delete(self, names: List[str]):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+        # Drop folders left empty, so deleted versions disappear from the listing
+        for folder in sorted({os.path.dirname(name) for name in names if os.path.dirname(name)}, reverse=True):
+            try:
+                os.rmdir(os.path.join(self.root, folder))
+            except OSError:
+                pass  # Not empty or already gone
+
+
+class SupabaseIndexStorage(IndexStorage):
+    """Objects in a Supabase Storage bucket (through the blocking storage client, in worker threads)"""
+
+    def __init__(self, client: Any, bucket_name: str = "vector-indices", **options: Any):
+        """Initialize the storage
+
+        Args:
+            client: Supabase client (from supabase.create_client)
+            bucket_name: Storage bucket holding the objects
+            **options: codec, chunk_bytes and concurrency (see IndexStorage)
+        """
+        super().__init__(**options)
+        self.bucket_name = bucket_name
+        self.bucket = client.storage.from_(bucket_name)
+
+    def _get(self, name: str) -> bytes:
+        return self.bucket.download(name)
+
+    def _put(self, name: str, data: bytes):
+        self.bucket.upload(name, data, {"upsert": "true"})
+
+    def _list(self, prefix: Optional[str]) -> List[str]:
+        names = []
+        while True:
+            page = self.bucket.list(prefix, {"limit": LIST_PAGE_SIZE, "offset": len(names)})
+            names.extend(entry["name"] for entry in page)
+            if len(page) < LIST_PAGE_SIZE:
+                return names
+
+    def _delete(self, names: List[str]):
+        self.bucket.remove(names)
+
+
+def create_index_storage() -> IndexStorage:
+    """Backend selected by VECTOR_INDEX_STORAGE
+
+    Raises:
+        ValueError: If VECTOR_INDEX_STORAGE or VECTOR_INDEX_STORAGE_CODEC is unknown
+    """
+    options = dict(
+        codec=settings.VECTOR_INDEX_STORAGE_CODEC,
+        chunk_bytes=int(settings.VECTOR_INDEX_STORAGE_CHUNK_MB * (1 << 20)),
+        concurrency=settings.VECTOR_INDEX_STORAGE_CONCURRENCY
+    )
+    if settings.VECTOR_INDEX_STORAGE == "local":
+        return LocalIndexStorage(settings.VECTOR_INDEX_STORAGE_DIR, **options)
+    if settings.VECTOR_INDEX_STORAGE == "supabase":
+        client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        return SupabaseIndexStorage(client, "vector-indices", **options)
+    raise ValueError(f"Unknown VECTOR_INDEX_STORAGE {settings.VECTOR_INDEX_STORAGE!r}, expected supabase or local")
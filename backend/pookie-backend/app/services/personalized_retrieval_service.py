@@ -47,7 +47,9 @@ class PersonalizedRetrievalService:
         Args:
             query_embedding: 384-dim query vector
             user_id: User UUID for filtering
-            faiss_results: List of (something_id, base_similarity) from FAISS
+            faiss_results: List of (something_id, base_similarity) from FAISS; when
+                the search applied a RecencyDecay, base_similarity already includes
+                the recency boost (computed from timestamps kept in the index)
             db: Database session
             top_k: Return top K results after re-ranking
 
@@ -239,7 +241,8 @@ class PersonalizedRetrievalService:
         Format retrieved somethings as RAG context for LLM.
 
         Args:
-            something_ids: List of something IDs to format
+            something_ids: List of something IDs to format, most important first
+                (entries past the token budget are dropped from the end)
             db: Database session
             max_tokens: Maximum tokens for context (default 1000)
 
@@ -255,6 +258,8 @@ class PersonalizedRetrievalService:
 
         if not somethings:
             return ""
+        rank = {sid: i for i, sid in enumerate(something_ids)}
+        somethings.sort(key=lambda s: rank.get(s.id, len(rank)))
 
         # Build context with token limiting
         lines = ["From your saved somethings:\n"]
@@ -0,0 +1,328 @@
+"""
+Offline rebuild of the FAISS index from the somethings table.
+
+Rows are streamed by keyset (id > last_id) in fixed-size chunks, embedded
+with EmbeddingService.generate_embeddings_batch across a pool of worker
+processes, and added to a fresh VectorIndex in ID order. Progress is
+checkpointed to disk as append-only shards, so an interrupted run resumes
+after the last checkpointed chunk instead of starting over.
+
+Run with:
+    python -m app.services.reindex --checkpoint-dir ./ml/reindex --upload
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import settings
+from app.ml.vector_index import VectorIndex
+
+REINDEX_CHUNK_SIZE = 1000  # Rows read and embedded per chunk
+REINDEX_CHECKPOINT_EVERY = 20  # Chunks between checkpoints
+CHECKPOINT_FILENAME = "checkpoint.json"
+INDEX_FILENAME = "somethings_index.faiss"
+
+Row = Tuple[int, str, str, str, Optional[datetime]]
+
+# Embedding model of a pool worker process (loaded once by _init_worker)
+_worker_embedding_service = None
+
+
+def _init_worker(threads: int):
+    """Load the model in a pool worker and give it an equal share of the CPU cores"""
+    global _worker_embedding_service
+    import torch
+    from app.services.embedding_service import EmbeddingService
+
+    torch.set_num_threads(threads)
+    _worker_embedding_service = EmbeddingService()
+    _worker_embedding_service.load_model()
+
+
+def _embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed a chunk in a pool worker (or in-process when the pool has one worker)"""
+    service = _worker_embedding_service
+    if service is None:
+        from app.services.embedding_service import embedding_service as service
+        if service.model is None:
+            service.load_model()
+    return np.asarray(service.generate_embeddings_batch(texts), dtype=np.float32)
+
+
+class Reindexer:
+    def __init__(
+        self,
+        checkpoint_dir: str,
+        chunk_size: int = REINDEX_CHUNK_SIZE,
+        workers: Optional[int] = None,
+        checkpoint_every: int = REINDEX_CHECKPOINT_EVERY
+    ):
+        """Initialize the reindexer
+
+        Args:
+            checkpoint_dir: Directory for checkpoints; a run resumes from the one found here
+            chunk_size: Rows read and embedded per chunk
+            workers: Embedding processes (defaults to one per CPU core; 1 embeds in-process)
+            checkpoint_every: Chunks between checkpoints
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        if checkpoint_every <= 0:
+            raise ValueError(f"checkpoint_every must be positive, got {checkpoint_every}")
+        self.checkpoint_dir = checkpoint_dir
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_every = checkpoint_every
+
+    def run(self) -> VectorIndex:
+        """Embed every something with content into a fresh index, resuming from a checkpoint if present
+
+        The index's log_seq is the last write-ahead log entry at the start of
+        the first run: every change logged before it is already in the table,
+        later ones are replayed by the workers that load the result. The run
+        holds the log at that seq (see IndexLogService.hold), so workers can't
+        prune those entries before publish or clear_checkpoint releases it. Its
+        generation is the completion time, so running workers adopt it over
+        their own snapshots (see VectorService._adopt_rebuilt_version).
+
+        Returns:
+            The rebuilt index (converted to VECTOR_INDEX_TYPE, or upgraded
+            past VECTOR_INDEX_AUTO_THRESHOLD like a live index would be)
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        index = VectorIndex(
+            dimension=384,
+            auto_index_threshold=settings.VECTOR_INDEX_AUTO_THRESHOLD,
+            auto_index_type=settings.VECTOR_INDEX_AUTO_TYPE,
+            model=settings.EMBEDDING_MODEL,
+            vector_dtype=settings.VECTOR_STORAGE_DTYPE
+        )
+        state = self._read_checkpoint()
+        if state is None:
+            from app.services.index_log_service import index_log_service
+            hold = f"reindex-{uuid.uuid4().hex}"
+            state = {"last_id": 0, "log_seq": index_log_service.hold(hold), "hold": hold, "shards": []}
+            self._write_checkpoint(state, [])  # Records the hold, so clear_checkpoint can release it after a crash
+        else:
+            for shard in state["shards"]:
+                self._load_shard(index, shard)
+            logger.info(f"Resuming reindex after something {state['last_id']} ({index.total_vectors} vectors)")
+
+        pending: List[Tuple[List[Row], np.ndarray]] = []  # Chunks added since the last checkpoint
+        chunks_since_checkpoint = 0
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(max(1, (os.cpu_count() or 1) // self.workers),)
+            )
+        chunks = self._stream_chunks(state["last_id"])
+        try:
+            # Chunks are read ahead and embedded in parallel, but added (and checkpointed) in ID order
+            in_flight: Deque[Tuple[int, List[Row], Future]] = deque()
+            read_ahead = 2 * self.workers if pool is not None else 1
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < read_ahead:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    last_id, rows = chunk
+                    in_flight.append((last_id, rows, self._submit(pool, [row[2] for row in rows])))
+                if not in_flight:
+                    break
+
+                last_id, rows, future = in_flight.popleft()
+                if rows:
+                    embeddings = future.result()
+                    index.add_batch(
+                        [row[0] for row in rows],
+                        embeddings,
+                        user_ids=[row[1] for row in rows],
+                        content_types=[row[3] for row in rows],
+                        created_at=[row[4] for row in rows]
+                    )
+                    pending.append((rows, embeddings))
+                state["last_id"] = last_id
+                chunks_since_checkpoint += 1
+                if chunks_since_checkpoint >= self.checkpoint_every:
+                    self._write_checkpoint(state, pending)
+                    pending, chunks_since_checkpoint = [], 0
+                    logger.info(f"Reindex checkpoint at something {last_id} ({index.total_vectors} vectors)")
+            self._write_checkpoint(state, pending)
+        finally:
+            chunks.close()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if settings.VECTOR_INDEX_TYPE != "flat":
+            index.rebuild(settings.VECTOR_INDEX_TYPE)
+        elif index.needs_upgrade():
+            index.rebuild()
+        index.log_seq = state["log_seq"]
+        index.generation = int(time.time())
+        logger.info(
+            f"Reindexed {index.total_vectors} somethings "
+            f"({index.index_type}, log_seq={index.log_seq}, generation={index.generation})"
+        )
+        return index
+
+    def publish(self, index: VectorIndex, output_path: Optional[str] = None, upload: bool = False):
+        """Write the rebuilt index where workers load it from, then drop the checkpoint
+
+        Args:
+            index: Result of run()
+            output_path: Local .faiss path; every artifact is written under a
+                temporary name and renamed into place (.meta last)
+            upload: Upload the artifacts to index storage as a new version and make it current
+        """
+        with tempfile.TemporaryDirectory(dir=self.checkpoint_dir) as tmpdir:
+            index_path = os.path.join(tmpdir, INDEX_FILENAME)
+            index.save(index_path)
+            if output_path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+                suffixes = sorted(
+                    (name[len(INDEX_FILENAME):] for name in os.listdir(tmpdir)),
+                    key=lambda suffix: suffix == ".meta"
+                )
+                for suffix in suffixes:
+                    shutil.copyfile(index_path + suffix, output_path + suffix + ".tmp")
+                    os.replace(output_path + suffix + ".tmp", output_path + suffix)
+                logger.info(f"Published reindexed index to {output_path}")
+            if upload:
+                from app.services.index_storage import create_index_storage
+                storage = create_index_storage()
+                version = asyncio.run(storage.publish_version(index_path, INDEX_FILENAME, settings.VECTOR_INDEX_KEEP_VERSIONS))
+                logger.info(f"Uploaded reindexed index to index storage as version {version}")
+        self.clear_checkpoint()
+
+    def clear_checkpoint(self):
+        """Forget saved progress so the next run starts from scratch, releasing the run's hold on the log"""
+        state = self._read_checkpoint()
+        if state is not None and state.get("hold"):
+            from app.services.index_log_service import index_log_service
+            index_log_service.release(state["hold"])
+        for name in os.listdir(self.checkpoint_dir) if os.path.isdir(self.checkpoint_dir) else []:
+            if name == CHECKPOINT_FILENAME or name.startswith("shard-"):
+                os.remove(os.path.join(self.checkpoint_dir, name))
+
+    def _stream_chunks(self, after_id: int):
+        """Yield (last ID read, rows with content) per chunk, by keyset pagination on id"""
+        from app.core.database import SessionLocal
+        from app.models.something import Something
+
+        db = SessionLocal()
+        try:
+            while True:
+                rows = (
+                    db.query(Something.id, Something.user_id, Something.content, Something.content_type, Something.created_at)
+                    .filter(Something.id > after_id, Something.content.isnot(None))
+                    .order_by(Something.id)
+                    .limit(self.chunk_size)
+                    .all()
+                )
+                if not rows:
+                    return
+                after_id = rows[-1].id
+                # Same rule as create_something: whitespace-only content isn't embedded
+                yield after_id, [
+                    (row.id, str(row.user_id), row.content, row.content_type, row.created_at)
+                    for row in rows
+                    if row.content.strip()
+                ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _submit(pool: Optional[ProcessPoolExecutor], texts: List[str]) -> Future:
+        if not texts:
+            future = Future()
+            future.set_result(np.empty((0, 384), dtype=np.float32))
+            return future
+        if pool is not None:
+            return pool.submit(_embed_texts, texts)
+        future = Future()
+        future.set_result(_embed_texts(texts))
+        return future
+
+    def _read_checkpoint(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.checkpoint_dir, CHECKPOINT_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_checkpoint(self, state: Dict[str, Any], pending: List[Tuple[List[Row], np.ndarray]]):
+        """Write chunks added since the last checkpoint as a new shard, then commit it in checkpoint.json
+
+        Both files are renamed into place, so a crash leaves either the old
+        or the new checkpoint (an unreferenced shard is overwritten on resume).
+        """
+        rows = [row for chunk_rows, _ in pending for row in chunk_rows]
+        if rows:
+            shard = f"shard-{len(state['shards']):06d}.npz"
+            tmp_path = os.path.join(self.checkpoint_dir, shard + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    ids=np.array([row[0] for row in rows], dtype=np.int64),
+                    embeddings=np.concatenate([embeddings for _, embeddings in pending]).astype(settings.VECTOR_STORAGE_DTYPE),
+                    user_ids=np.array([row[1] for row in rows], dtype=str),
+                    content_types=np.array([row[3] for row in rows], dtype=str),
+                    created_at=np.array([row[4].timestamp() if row[4] else np.nan for row in rows], dtype=np.float64)
+                )
+            os.replace(tmp_path, os.path.join(self.checkpoint_dir, shard))
+            state["shards"].append(shard)
+
+        path = os.path.join(self.checkpoint_dir, CHECKPOINT_FILENAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def _load_shard(self, index: VectorIndex, shard: str):
+        with np.load(os.path.join(self.checkpoint_dir, shard)) as data:
+            index.add_batch(
+                data["ids"],
+                data["embeddings"].astype(np.float32),
+                user_ids=data["user_ids"].tolist(),
+                content_types=data["content_types"].tolist(),
+                created_at=[
+                    datetime.fromtimestamp(ts, tz=timezone.utc) if not np.isnan(ts) else None
+                    for ts in data["created_at"].tolist()
+                ]
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS index from the somethings table")
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=os.path.join(settings.VECTOR_INDEX_DIR, "reindex"),
+        help="Where progress is checkpointed (an interrupted run resumes from here)"
+    )
+    parser.add_argument("--chunk-size", type=int, default=REINDEX_CHUNK_SIZE, help="Rows embedded per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: one per CPU core)")
+    parser.add_argument("--checkpoint-every", type=int, default=REINDEX_CHECKPOINT_EVERY, help="Chunks between checkpoints")
+    parser.add_argument("--output", default=None, help="Local .faiss path to publish the index to")
+    parser.add_argument("--upload", action="store_true", help="Upload the index to VECTOR_INDEX_STORAGE as a new version")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    reindexer = Reindexer(args.checkpoint_dir, args.chunk_size, args.workers, args.checkpoint_every)
+    if args.restart:
+        reindexer.clear_checkpoint()
+    reindexer.publish(reindexer.run(), output_path=args.output, upload=args.upload)
@@ -1,90 +1,966 @@
-from app.ml.vector_index import VectorIndex
+from app.ml.vector_index import VectorIndex, QUANTIZED_INDEX_TYPES
+from app.ml.vector_metadata import RecencyDecay, SearchFilter
+from app.ml.user_index_manager import UserIndexManager
 from app.core.config import settings
-from supabase import create_client
+from app.core.locks import AsyncRWLock
+from app.services.index_log_service import index_log_service
+from app.services.index_storage import VERSION_PATTERN, create_index_storage
+from app.models.vector_index_log import VectorIndexLogEntry
 import numpy as np
-from typing import List, Tuple
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 import tempfile
+import json
 import os
+import shutil
+import time
 import asyncio
 from loguru import logger
 
+LOG_REPLAY_BATCH = 1000  # Log entries applied per read while catching up
+METADATA_BACKFILL_BATCH = 1000  # Somethings looked up per query when backfilling filter metadata
+RECONCILE_EMBED_BATCH = 256  # Somethings embedded per batch when reconciling with the database
+RECONCILE_LEAF_IDS = 1024  # ID ranges this small are listed instead of counted when reconciling
+
 
 class VectorService:
     def __init__(self):
-        self.index = VectorIndex(dimension=384)
-        self.supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
-        self.bucket_name = "vector-indices"
+        self.index = self._new_index()
+        # Per-user partitions built lazily from the global index (searches scan one user's vectors,
+        # exactly with NumPy while the partition is small)
+        self.user_indices = UserIndexManager(
+            dimension=384,
+            loader=self._load_user_partition,
+            exact_max_vectors=settings.VECTOR_INDEX_EXACT_MAX_VECTORS,
+            ann_min_vectors=settings.VECTOR_INDEX_AUTO_THRESHOLD,
+            ann_index_type=settings.VECTOR_INDEX_AUTO_TYPE
+        )
+        self.storage = create_index_storage()
         self.index_filename = "somethings_index.faiss"
-        self._lock = asyncio.Lock()  # Thread safety for concurrent operations
+        self.version: Optional[str] = None  # Storage version the index was loaded from or last uploaded as
+        # Searches share the read side and run concurrently in worker threads (FAISS releases the GIL);
+        # anything that mutates the index takes the write side
+        self._lock = AsyncRWLock()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        # Write-ahead log: captures append one row; full snapshots are uploaded by the flusher
+        self.index_log = index_log_service
+        self._snapshot_seq = 0  # log_seq of the last snapshot this worker loaded or uploaded
+        self._dirty_count = 0  # Changes since the last snapshot
+        self._last_flush = time.monotonic()
+        self._flush_wakeup = asyncio.Event()
+        self._flusher_stopping = False
+        self._flusher_task: Optional[asyncio.Task] = None
+        # Change feed: other workers' log entries are applied past index.log_seq (the high-water mark)
+        self._log_gaps: Dict[int, float] = {}  # First missing seq of each open gap -> when it was first seen
+        self._change_feed_task: Optional[asyncio.Task] = None
+        # Circle changes made while a replacement index is built, carried over by swap_index
+        self._circle_updates: Optional[Dict[int, List[int]]] = None
+        self._rebuild_lock = asyncio.Lock()  # One replacement index (rebuild or reload) at a time
+
+    @staticmethod
+    def _new_index() -> VectorIndex:
+        return VectorIndex(
+            dimension=384,
+            index_type=settings.VECTOR_INDEX_TYPE,
+            auto_index_threshold=settings.VECTOR_INDEX_AUTO_THRESHOLD,
+            auto_index_type=settings.VECTOR_INDEX_AUTO_TYPE,
+            model=settings.EMBEDDING_MODEL,
+            vector_dtype=settings.VECTOR_STORAGE_DTYPE
+        )
 
     async def initialize(self):
-        """Load index from Supabase Storage on startup"""
+        """Load the latest snapshot from index storage and replay the log on top
+
+        With VECTOR_INDEX_MMAP the artifacts are kept in VECTOR_INDEX_DIR and
+        memory-mapped read-only, so workers on the same host share the index
+        pages and startup skips reading the whole index into memory. With
+        VECTOR_INDEX_MMAP or VECTOR_INDEX_CACHE a version already in
+        VECTOR_INDEX_DIR isn't downloaded again.
+
+        With VECTOR_INDEX_RECONCILE the result is then checked against the
+        somethings table (see reconcile), so a lost snapshot or a crash
+        between saves doesn't leave captures unsearchable.
+        """
+        try:
+            pointer = await self._read_pointer()
+            version = pointer["version"] if pointer else None
+            await self._load_from_storage(self.index, version, pointer)
+            self.version = version
+            self._snapshot_seq = self.index.log_seq
+            logger.info(
+                f"Loaded FAISS index version {version or '(unversioned)'} with "
+                f"{self.index.total_vectors} vectors ({self.index.index_type})"
+            )
+        except Exception as e:
+            logger.info(f"No existing index found, starting fresh: {e}")
+
         try:
-            # Download from Supabase Storage
+            replayed = await self._replay_log()
+            logger.info(f"Replayed {replayed} index log entries (log_seq={self.index.log_seq})")
+        except Exception as e:
+            logger.warning(f"Could not replay index log: {e}")
+
+        if settings.VECTOR_INDEX_RECONCILE:
+            try:
+                embedded, dropped = await self.reconcile()
+                logger.info(f"Reconciled index with the database: embedded {embedded}, dropped {dropped}")
+            except Exception as e:
+                logger.warning(f"Could not reconcile index with the database: {e}")
+
+        try:
+            await self._sync_metadata(reload_circles=True)
+        except Exception as e:
+            logger.warning(f"Could not load filter metadata: {e}")
+
+        self.user_indices.clear()
+        if self.index.needs_upgrade():
+            self._schedule_maintenance()
+
+    async def _read_pointer(self) -> Optional[Dict[str, Any]]:
+        """The current version's manifest from the pointer object, or None for the unversioned layout"""
+        try:
+            pointer = json.loads(await self.storage.get(self.index_filename + ".current"))
+        except Exception as e:
+            logger.debug(f"No index version pointer, using unversioned artifacts: {e}")
+            return None
+        return pointer if isinstance(pointer, dict) and "version" in pointer else None
+
+    async def _load_from_storage(self, index: VectorIndex, version: Optional[str], pointer: Optional[Dict[str, Any]] = None):
+        """Download a stored version (None: the unversioned layout of older uploads) and load it into index
+
+        With VECTOR_INDEX_MMAP or VECTOR_INDEX_CACHE every version gets its own
+        directory under VECTOR_INDEX_DIR, so a version being downloaded never
+        mixes with one another worker on the host has mapped. The directory
+        doubles as a cache: when the pointer's manifest matches the cached
+        one, the artifacts are loaded from disk without a download (load()
+        still verifies their checksums; a corrupt copy is downloaded again).
+
+        Args:
+            index: Index to load into
+            version: Storage version (None: unversioned artifacts)
+            pointer: Manifest of that version from the pointer object, to check the cache
+                against and read the artifacts' chunk layout from
+        """
+        if settings.VECTOR_INDEX_MMAP or settings.VECTOR_INDEX_CACHE:
+            directory = os.path.join(settings.VECTOR_INDEX_DIR, version) if version else settings.VECTOR_INDEX_DIR
+            os.makedirs(directory, exist_ok=True)
+            index_path = os.path.join(directory, self.index_filename)
+            cached = version is not None and pointer is not None and self._is_cached(index_path, pointer)
+            if cached:
+                logger.info(f"Index version {version} is cached in {directory}, skipping download")
+            else:
+                await self._download_artifacts(index_path, version, pointer)
+            try:
+                await asyncio.to_thread(index.load, index_path, mmap=settings.VECTOR_INDEX_MMAP)
+            except ValueError as e:
+                if not cached:
+                    raise
+                logger.warning(f"Cached index version {version} is unusable, downloading it again: {e}")
+                await self._download_artifacts(index_path, version, pointer)
+                await asyncio.to_thread(index.load, index_path, mmap=settings.VECTOR_INDEX_MMAP)
+            self._prune_local_versions()
+        else:
+            # FAISS reads the index from files: download into a scratch directory and load into memory
             with tempfile.TemporaryDirectory() as tmpdir:
                 index_path = os.path.join(tmpdir, self.index_filename)
+                await self._download_artifacts(index_path, version, pointer)
+                await asyncio.to_thread(index.load, index_path)
+
+    @staticmethod
+    def _is_cached(index_path: str, pointer: Dict[str, Any]) -> bool:
+        """Whether index_path holds every artifact of the version pointer describes
+
+        Compares the cached manifest's checksums with the pointer's (no remote
+        round trip beyond the pointer itself) and checks every listed file is
+        present.
+        """
+        checksums = pointer.get("checksums")
+        if not checksums or not os.path.exists(index_path + ".meta"):
+            return False
+        try:
+            with open(index_path + ".meta") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return cached.get("checksums") == checksums and all(os.path.exists(index_path + suffix) for suffix in checksums)
 
-                # Download .faiss file
-                response = self.supabase.storage.from_(self.bucket_name).download(self.index_filename)
-                with open(index_path, "wb") as f:
-                    f.write(response)
+    async def _download_artifacts(self, index_path: str, version: Optional[str] = None, pointer: Optional[Dict[str, Any]] = None):
+        """Download the .faiss, .ids, .meta, .metadata (and for quantized types .vectors) files to index_path
 
-                # Download .ids file
-                response_ids = self.supabase.storage.from_(self.bucket_name).download(self.index_filename + ".ids")
-                with open(index_path + ".ids", "wb") as f:
-                    f.write(response_ids)
+        Each file is streamed chunk by chunk under a temporary name and renamed
+        into place, so a process that has the previous version mmapped keeps a
+        consistent view.
 
-                # Load into memory
-                self.index.load(index_path)
-                logger.info(f"Loaded FAISS index with {self.index.total_vectors} vectors")
+        Args:
+            index_path: Local .faiss path
+            version: Storage version to download (None: unversioned artifacts)
+            pointer: Manifest of that version; its layout lists every artifact's chunks
+                (absent for versions uploaded before chunking: one uncompressed object each)
+        """
+        remote_path = f"{version}/{self.index_filename}" if version else self.index_filename
+        layout = pointer.get("layout") if pointer else None
+        if layout is not None:
+            # Uploaded with .meta last, so a complete download ends with the manifest
+            for suffix, chunks in layout["chunks"].items():
+                await self.storage.download_file(remote_path + suffix, index_path + suffix, chunks, layout["codec"])
+            return
+
+        # Download .faiss and .ids files
+        await self.storage.download_file(remote_path, index_path)
+        await self.storage.download_file(remote_path + ".ids", index_path + ".ids")
+
+        # Download .metadata file (filter columns; absent for older uploads, then backfilled)
+        try:
+            await self.storage.download_file(remote_path + ".metadata", index_path + ".metadata")
         except Exception as e:
-            logger.info(f"No existing index found, starting fresh: {e}")
+            logger.info(f"No filter metadata found, will backfill from the database: {e}")
+            if os.path.exists(index_path + ".metadata"):
+                os.remove(index_path + ".metadata")
+
+        # Download .meta file (manifest; absent for older uploads)
+        try:
+            await self.storage.download_file(remote_path + ".meta", index_path + ".meta")
+        except Exception as e:
+            logger.info(f"No index metadata found, inferring index type: {e}")
+            if os.path.exists(index_path + ".meta"):
+                os.remove(index_path + ".meta")  # Stale metadata from a previous download
+            return
+
+        # Download .vectors file (full-precision vectors behind a quantized index)
+        with open(index_path + ".meta") as f:
+            if json.load(f)["index_type"] in QUANTIZED_INDEX_TYPES:
+                await self.storage.download_file(remote_path + ".vectors", index_path + ".vectors")
+
+    def _prune_local_versions(self):
+        """Delete mmapped version directories older than the newest VECTOR_INDEX_KEEP_VERSIONS
+
+        Workers still mapping a deleted version keep their pages until they
+        swap or restart.
+        """
+        versions = sorted(
+            name for name in os.listdir(settings.VECTOR_INDEX_DIR)
+            if VERSION_PATTERN.match(name) and os.path.isdir(os.path.join(settings.VECTOR_INDEX_DIR, name))
+        )
+        for version in versions[:-settings.VECTOR_INDEX_KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(settings.VECTOR_INDEX_DIR, version), ignore_errors=True)
 
     async def save_to_storage(self):
-        """Save index to Supabase Storage"""
+        """Upload a full snapshot to index storage and prune the log
+
+        The index first catches up on the log, so the snapshot contains every
+        change up to its log_seq, including ones written by other workers.
+        Log entries are pruned one snapshot behind: a worker that uploads an
+        older snapshot concurrently can still be replayed to the present.
+
+        If a newer generation was published (an offline reindex), it is
+        adopted first, so the rebuilt index isn't overwritten by this one.
+        """
+        await self._adopt_rebuilt_version(raise_errors=True)
         with tempfile.TemporaryDirectory() as tmpdir:
             index_path = os.path.join(tmpdir, self.index_filename)
 
-            # Save to temp file
-            self.index.save(index_path)
+            await self._replay_log()
+            try:
+                await self._sync_metadata()
+            except Exception as e:
+                logger.warning(f"Could not backfill filter metadata, saving without it: {e}")
+            # Copy under the read lock (searches carry on, writes wait only for the copy); compaction,
+            # the delta merge, serialization and checksums then run on the copy without any lock
+            async with self._lock.read():
+                snapshot = await asyncio.to_thread(self.index.snapshot)
+                dirty_count = self._dirty_count
+                self._dirty_count = 0
 
-            # Upload .faiss file
-            with open(index_path, "rb") as f:
-                self.supabase.storage.from_(self.bucket_name).upload(
-                    self.index_filename,
-                    f,
-                    {"upsert": "true"}
-                )
+            try:
+                await asyncio.to_thread(snapshot.save, index_path)
+                self.version = await self.storage.publish_version(index_path, self.index_filename, settings.VECTOR_INDEX_KEEP_VERSIONS)
+            except Exception:
+                self._dirty_count += dirty_count  # Still unsaved; retried by the next flush
+                raise
+            snapshot_seq = snapshot.log_seq
+            logger.info(
+                f"Saved FAISS index version {self.version} to index storage "
+                f"({snapshot.total_vectors} vectors, log_seq={snapshot_seq})"
+            )
 
-            # Upload .ids file
-            with open(index_path + ".ids", "rb") as f:
-                self.supabase.storage.from_(self.bucket_name).upload(
-                    self.index_filename + ".ids",
-                    f,
-                    {"upsert": "true"}
-                )
-            logger.info(f"Saved FAISS index to Supabase Storage ({self.index.total_vectors} vectors)")
+        if self._snapshot_seq > 0:
+            await asyncio.to_thread(self.index_log.truncate_through, self._snapshot_seq)
+        self._snapshot_seq = snapshot_seq
+
+    async def add_something_embedding(
+        self,
+        something_id: int,
+        embedding: List[float],
+        user_id: Optional[str] = None,
+        content_type: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ):
+        """Add a something embedding to the index and the write-ahead log (thread-safe)
 
-    async def add_something_embedding(self, something_id: int, embedding: List[float]):
-        """Add a something embedding to the index (thread-safe)
+        Persisting the change is one log INSERT; full snapshots are left to the
+        background flusher.
 
         Args:
             something_id: Unique identifier for the embedding
             embedding: List of floats representing the embedding vector
+            user_id: Owner of the something; keeps a resident user partition up to date
+            content_type: Something content type, for filtered search
+            created_at: Something creation time, for filtered search
 
         Raises:
             ValueError: If embedding is invalid (propagated from VectorIndex)
         """
-        async with self._lock:
-            embedding_array = np.array(embedding, dtype=np.float32)
-            self.index.add(something_id, embedding_array)
+        embedding_array = np.array(embedding, dtype=np.float32)
+        async with self._lock.write():
+            # Applied first so invalid embeddings are rejected before they reach the log
+            self.index.add(something_id, embedding_array, user_id, content_type, created_at)
+            if user_id is not None:
+                self.user_indices.add(user_id, something_id, embedding_array)
+
+        # The log INSERT runs without the lock so searches aren't held up by the database
+        try:
+            await asyncio.to_thread(self.index_log.append_add, something_id, embedding_array, user_id)
+        except Exception:
+            async with self._lock.write():
+                self.index.remove([something_id])
+                self.user_indices.remove([something_id], user_id=user_id)
+            raise
+
+        if self.index.needs_upgrade():
+            self._schedule_maintenance()
+        self._record_change()
+
+    async def remove_something_embedding(self, something_id: int, user_id: Optional[str] = None) -> bool:
+        """Remove a something embedding from the index (thread-safe)
+
+        The vector is tombstoned immediately; once the tombstone ratio passes the
+        index's compaction threshold a background task rewrites the index.
+
+        Args:
+            something_id: Unique identifier for the embedding
+            user_id: Owner of the something, used to update their partition
+
+        Returns:
+            True if the embedding was present in the index
+        """
+        # Logged even if absent here: another worker's index may still hold it
+        await asyncio.to_thread(self.index_log.append_remove, something_id, user_id)
+        async with self._lock.write():
+            removed = self.index.remove([something_id])
+            self.user_indices.remove([something_id], user_id=user_id)
+
+        if self.index.needs_compaction():
+            self._schedule_maintenance()
+        self._record_change()
+        return removed > 0
+
+    async def _replay_log(self, added_ids: Optional[List[int]] = None, index: Optional[VectorIndex] = None) -> int:
+        """Apply log entries newer than the index's log_seq
+
+        Entries are read without the lock and applied under the write lock.
+        log_seq may stay below the last entry read (see _high_water_mark).
+        If the live index fell behind the pruned part of the log, the rest is
+        replayed and the index is then reconciled with the database.
+
+        Args:
+            added_ids: If given, extended with the IDs of vectors added to the index
+            index: Replacement index to catch up instead of the live one; no
+                lock is taken (it isn't searched yet, or the caller holds the
+                lock), and the caller checks for pruned entries (see swap_index)
+
+        Returns:
+            Number of log entries read
+        """
+        replayed = 0
+        truncated = index is None and await self._skip_pruned_log(self.index)
+        cursor = (self.index if index is None else index).log_seq
+        while True:
+            entries = await asyncio.to_thread(self.index_log.read_since, cursor, LOG_REPLAY_BATCH)
+            if not entries:
+                if truncated:
+                    await self._reconcile_truncated_log()
+                return replayed
+            if index is None:
+                async with self._lock.write():
+                    added = await asyncio.to_thread(self._apply_log_entries, entries)
+            else:
+                added = await asyncio.to_thread(self._apply_log_entries, entries, index)
+            replayed += len(entries)
+            cursor = entries[-1].seq
+            if added_ids is not None:
+                added_ids.extend(added)
+
+    async def _skip_pruned_log(self, index: VectorIndex) -> bool:
+        """Move index.log_seq past entries pruned from the log before it applied them
+
+        Those entries can't be replayed, and waiting for them as a sequence
+        gap would stall the index; the caller reconciles instead.
+
+        Returns:
+            True if entries the index hadn't applied were pruned
+        """
+        truncated_seq = await asyncio.to_thread(self.index_log.truncated_through)
+        if truncated_seq <= index.log_seq:
+            return False
+        logger.warning(f"Index log was pruned through seq {truncated_seq}, past log_seq {index.log_seq}; reconciling with the database")
+        index.log_seq = truncated_seq
+        return True
+
+    async def _reconcile_truncated_log(self):
+        """Recover changes pruned from the log before the live index applied them"""
+        try:
+            embedded, dropped = await self.reconcile()
+            logger.info(f"Reconciled index after pruned log entries: embedded {embedded}, dropped {dropped}")
+        except Exception as e:
+            logger.warning(f"Could not reconcile index with the database: {e}")
+
+    def _apply_log_entries(self, entries: List[VectorIndexLogEntry], index: Optional[VectorIndex] = None) -> List[int]:
+        """Apply a batch of log entries idempotently
+
+        Entries this worker wrote are already in the index and are skipped.
+        Something IDs are never reused, so an ID removed anywhere in the batch
+        doesn't need to be added first.
+
+        Args:
+            entries: Log entries in seq order
+            index: Replacement index to apply them to (user partitions are left
+                alone; swap_index drops them)
+
+        Returns:
+            IDs of the vectors added to the index
+        """
+        live = index is None
+        if live:
+            index = self.index
+        removed_ids = {entry.something_id for entry in entries if entry.op == "remove"}
+        additions = {
+            entry.something_id: entry
+            for entry in entries
+            if entry.op == "add" and entry.something_id not in removed_ids
+        }
+
+        missing = []
+        if additions:
+            ids = np.fromiter(additions, dtype=np.int64)
+            missing = [additions[sid] for sid in ids[~index.contains(ids)].tolist()]
+            if missing:
+                embeddings = np.stack([self.index_log.decode_embedding(entry.embedding) for entry in missing])
+                index.add_batch([entry.something_id for entry in missing], embeddings)
+                for entry, embedding in zip(missing, embeddings):
+                    if live and entry.user_id is not None:
+                        self.user_indices.add(str(entry.user_id), entry.something_id, embedding)
+
+        if removed_ids:
+            index.remove(removed_ids)
+            if live:
+                self.user_indices.remove(removed_ids)
+
+        index.log_seq = max(index.log_seq, self._high_water_mark(entries, index.log_seq))
+        return [entry.something_id for entry in missing]
+
+    def _high_water_mark(self, entries: List[VectorIndexLogEntry], log_seq: int) -> int:
+        """Highest seq the index can claim to contain after applying entries
+
+        Sequence numbers are taken at INSERT but become visible at COMMIT, so
+        a gap can be another worker's write still in flight. The mark stays
+        below a gap until it fills or VECTOR_INDEX_SYNC_GAP_SECONDS pass (a
+        rolled-back INSERT leaves a permanent gap), so neither the next poll
+        nor a snapshot skips past that write; entries after the gap are
+        applied anyway and skipped as already present when re-read.
+        """
+        now = time.monotonic()
+        expected = log_seq + 1
+        mark = entries[-1].seq
+        for entry in entries:
+            if entry.seq > expected:
+                first_seen = self._log_gaps.setdefault(expected, now)
+                if now - first_seen < settings.VECTOR_INDEX_SYNC_GAP_SECONDS:
+                    mark = expected - 1
+                    break
+                logger.warning(f"Skipping index log seq {expected}-{entry.seq - 1}, missing for {now - first_seen:.0f}s")
+            expected = entry.seq + 1
+        self._log_gaps = {seq: seen for seq, seen in self._log_gaps.items() if seq > mark}
+        return mark
+
+    async def sync_from_log(self) -> int:
+        """Apply index changes other workers logged since this worker's high-water mark
+
+        Catch-up reads only entries past index.log_seq, so its cost is
+        proportional to the number of changes, not the size of the index.
+
+        Returns:
+            Number of log entries read
+        """
+        added_ids: List[int] = []
+        replayed = await self._replay_log(added_ids=added_ids)
+        if added_ids:
+            # The log carries vectors and owners only; content type and creation time come from the database
+            await self._sync_metadata(something_ids=added_ids)
+        if self.index.needs_upgrade() or self.index.needs_compaction():
+            self._schedule_maintenance()
+        return replayed
+
+    def start_change_feed(self):
+        """Start the background task that tails the log every VECTOR_INDEX_SYNC_SECONDS"""
+        if settings.VECTOR_INDEX_SYNC_SECONDS <= 0:
+            return
+        if self._change_feed_task is None or self._change_feed_task.done():
+            self._change_feed_task = asyncio.create_task(self._change_feed_loop())
+
+    async def stop_change_feed(self):
+        """Stop tailing the log"""
+        if self._change_feed_task is None:
+            return
+        self._change_feed_task.cancel()
+        try:
+            await self._change_feed_task
+        except asyncio.CancelledError:
+            pass
+        self._change_feed_task = None
+
+    async def _change_feed_loop(self):
+        while True:
+            await asyncio.sleep(settings.VECTOR_INDEX_SYNC_SECONDS)
+            try:
+                replayed = await self.sync_from_log()
+                if replayed:
+                    logger.debug(f"Applied {replayed} index log entries from other workers (log_seq={self.index.log_seq})")
+            except Exception as e:
+                logger.warning(f"Index change feed poll failed: {e}")
+
+    async def set_something_circles(self, something_id: int, circle_ids: List[int]) -> bool:
+        """Replace the circles a something belongs to in the filter metadata (thread-safe)
+
+        Call after committing a circle assignment change. Other workers pick
+        the change up from the database on their next startup.
+
+        Args:
+            something_id: Something whose membership changed
+            circle_ids: All circles it now belongs to
+
+        Returns:
+            True if the something has a vector in the index
+        """
+        async with self._lock.write():
+            updated = self._set_circles(something_id, circle_ids)
+        if updated:
+            self._record_change()
+        return updated
+
+    def _set_circles(self, something_id: int, circle_ids: List[int]) -> bool:
+        """Set circles on the live index and remember them for an index being rebuilt (write lock held)"""
+        if self._circle_updates is not None:
+            self._circle_updates[something_id] = list(circle_ids)
+        return self.index.set_circles(something_id, circle_ids)
+
+    async def _sync_metadata(self, reload_circles: bool = False, something_ids: Optional[List[int]] = None):
+        """Backfill filter metadata from the database
+
+        Vectors from older snapshots or replayed from the log carry no content
+        type or creation time; they are looked up in the somethings table.
+
+        Args:
+            reload_circles: Also reload every vector's circle membership (on
+                startup, since circle changes aren't written to the log)
+            something_ids: Only backfill these vectors (e.g. ones just applied from the log)
+        """
+        missing_ids = self.index.missing_metadata_ids
+        if something_ids is not None:
+            wanted = set(something_ids)
+            missing_ids = [something_id for something_id in missing_ids if something_id in wanted]
+        if reload_circles:
+            target_ids = self.index.something_ids[self.index.contains(self.index.something_ids)].tolist()
+        else:
+            target_ids = missing_ids
+        if not target_ids:
+            return
+
+        rows, memberships = await asyncio.to_thread(self._load_metadata, missing_ids, target_ids)
+        async with self._lock.write():
+            if rows:
+                ids, user_ids, content_types, created_at = zip(*rows)
+                self.index.set_metadata(list(ids), list(user_ids), list(content_types), list(created_at))
+            for something_id in target_ids:
+                self._set_circles(something_id, memberships.get(something_id, []))
+        logger.info(f"Backfilled filter metadata for {len(rows)} vectors ({len(target_ids)} circle memberships)")
+
+    async def reconcile(self) -> Tuple[int, int]:
+        """Bring the index in line with the somethings table
+
+        A crash before the log INSERT (or a lost snapshot, which starts the
+        index empty) leaves somethings unsearchable, and rows deleted without
+        going through the API (e.g. user cascades) leave stale vectors. Rows
+        past the highest indexed ID are embedded in batches; below it, only
+        ID ranges whose row count differs from the index are listed (see
+        _diff_somethings), so the cost follows the size of the gap. Changes
+        go through the log like any capture, so other workers pick them up.
+
+        Returns:
+            (number of somethings embedded, number of vectors dropped)
+        """
+        live_ids = self.index.something_ids[self.index.contains(self.index.something_ids)]
+        live_ids = np.sort(live_ids)
+        missing_ids, stale_ids = await asyncio.to_thread(self._diff_somethings, live_ids)
+
+        embedded = 0
+        for start in range(0, len(missing_ids), RECONCILE_EMBED_BATCH):
+            rows = await asyncio.to_thread(
+                self._load_reconcile_rows, something_ids=missing_ids[start:start + RECONCILE_EMBED_BATCH]
+            )
+            embedded += await self._embed_rows(rows)
+
+        after_id = int(live_ids[-1]) if len(live_ids) else 0
+        while True:
+            rows = await asyncio.to_thread(self._load_reconcile_rows, after_id=after_id)
+            if not rows:
+                break
+            embedded += await self._embed_rows(rows)
+            after_id = rows[-1][0]
+
+        for something_id in stale_ids:
+            await self.remove_something_embedding(something_id)
+        return embedded, len(stale_ids)
+
+    async def _embed_rows(self, rows: List[Tuple[int, str, str, str, datetime]]) -> int:
+        """Embed (id, user_id, content, content_type, created_at) rows and add them to the index"""
+        from app.services.embedding_service import embedding_service
+
+        rows = [row for row in rows if row[2].strip()]  # Same rule as create_something
+        if not rows:
+            return 0
+        if embedding_service.model is None:
+            await asyncio.to_thread(embedding_service.load_model)  # e.g. in the standalone index server
+        embeddings = await asyncio.to_thread(embedding_service.generate_embeddings_batch, [row[2] for row in rows])
+        for (something_id, user_id, _, content_type, created_at), embedding in zip(rows, embeddings):
+            await self.add_something_embedding(something_id, embedding, user_id, content_type, created_at)
+        return len(rows)
+
+    @staticmethod
+    def _diff_somethings(live_ids: np.ndarray) -> Tuple[List[int], List[int]]:
+        """Compare IDs up to the highest indexed one with the somethings table
+
+        Ranges are split in half only while the count and sum of the IDs of
+        somethings with content differ from those of the indexed IDs (so a
+        missing and a stale ID don't cancel out), and listed once they span
+        fewer than RECONCILE_LEAF_IDS IDs; a range that matches costs one
+        aggregate query.
+
+        Args:
+            live_ids: Sorted IDs of the live vectors in the index
+
+        Returns:
+            (something IDs missing from the index, indexed IDs with no something)
+        """
+        from sqlalchemy import func
+        from app.core.database import SessionLocal
+        from app.models.something import Something
+
+        if len(live_ids) == 0:
+            return [], []
+
+        has_content = (Something.content.isnot(None), func.length(func.trim(Something.content)) > 0)
+        missing: List[int] = []
+        stale: List[int] = []
+        ranges = [(0, int(live_ids[-1]))]
+        db = SessionLocal()
+        try:
+            while ranges:
+                low, high = ranges.pop()
+                in_range = (Something.id >= low, Something.id <= high, *has_content)
+                indexed = live_ids[np.searchsorted(live_ids, low):np.searchsorted(live_ids, high, side="right")]
+                if high - low < RECONCILE_LEAF_IDS:
+                    stored = {row[0] for row in db.query(Something.id).filter(*in_range)}
+                    indexed_set = set(indexed.tolist())
+                    missing.extend(stored - indexed_set)
+                    stale.extend(indexed_set - stored)
+                    continue
+                count, id_sum = db.query(func.count(Something.id), func.sum(Something.id)).filter(*in_range).one()
+                if count == len(indexed) and (id_sum or 0) == int(indexed.sum()):
+                    continue
+                middle = (low + high) // 2
+                ranges.extend([(middle + 1, high), (low, middle)])
+        finally:
+            db.close()
+        return sorted(missing), sorted(stale)
+
+    @staticmethod
+    def _load_reconcile_rows(
+        something_ids: Optional[List[int]] = None,
+        after_id: Optional[int] = None
+    ) -> List[Tuple[int, str, str, str, datetime]]:
+        """Fetch (id, user_id, content, content_type, created_at) for the given IDs, or the next batch after after_id"""
+        from app.core.database import SessionLocal
+        from app.models.something import Something
+
+        db = SessionLocal()
+        try:
+            query = db.query(
+                Something.id, Something.user_id, Something.content, Something.content_type, Something.created_at
+            ).filter(Something.content.isnot(None))
+            if something_ids is not None:
+                query = query.filter(Something.id.in_(something_ids))
+            if after_id is not None:
+                query = query.filter(Something.id > after_id)
+            rows = query.order_by(Something.id).limit(RECONCILE_EMBED_BATCH).all()
+        finally:
+            db.close()
+        return [(row.id, str(row.user_id), row.content, row.content_type, row.created_at) for row in rows]
+
+    @staticmethod
+    def _load_metadata(
+        missing_ids: List[int],
+        circle_ids_for: List[int]
+    ) -> Tuple[List[Tuple[int, str, str, datetime]], Dict[int, List[int]]]:
+        """Fetch (id, user_id, content_type, created_at) rows and circle memberships in batches"""
+        from app.core.database import SessionLocal
+        from app.models.something import Something
+        from app.models.something_circle import SomethingCircle
+
+        rows = []
+        memberships: Dict[int, List[int]] = {}
+        db = SessionLocal()
+        try:
+            for start in range(0, len(missing_ids), METADATA_BACKFILL_BATCH):
+                batch = missing_ids[start:start + METADATA_BACKFILL_BATCH]
+                rows.extend(
+                    (row.id, str(row.user_id), row.content_type, row.created_at)
+                    for row in db.query(Something.id, Something.user_id, Something.content_type, Something.created_at)
+                    .filter(Something.id.in_(batch))
+                )
+            for start in range(0, len(circle_ids_for), METADATA_BACKFILL_BATCH):
+                batch = circle_ids_for[start:start + METADATA_BACKFILL_BATCH]
+                for something_id, circle_id in (
+                    db.query(SomethingCircle.something_id, SomethingCircle.circle_id)
+                    .filter(SomethingCircle.something_id.in_(batch))
+                ):
+                    memberships.setdefault(something_id, []).append(circle_id)
+        finally:
+            db.close()
+        return rows, memberships
+
+    def _record_change(self):
+        """Mark the index dirty, waking the flusher once VECTOR_INDEX_SNAPSHOT_INTERVAL changes pile up"""
+        self._dirty_count += 1
+        if self._dirty_count >= settings.VECTOR_INDEX_SNAPSHOT_INTERVAL:
+            self._flush_wakeup.set()
+
+    def start_flusher(self):
+        """Start the background task that uploads snapshots
+
+        Changes are coalesced: a snapshot is uploaded once
+        VECTOR_INDEX_SNAPSHOT_INTERVAL changes accumulate or
+        VECTOR_INDEX_FLUSH_SECONDS pass with unsaved changes, whichever comes first.
+        """
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_stopping = False
+            self._flusher_task = asyncio.create_task(self._flush_loop())
+
+    async def stop_flusher(self):
+        """Stop the flusher after a final snapshot of any unsaved changes"""
+        if self._flusher_task is None:
+            return
+        self._flusher_stopping = True
+        self._flush_wakeup.set()
+        await self._flusher_task
+        self._flusher_task = None
+
+    async def _flush_loop(self):
+        while True:
+            if not self._flusher_stopping:
+                elapsed = time.monotonic() - self._last_flush
+                try:
+                    await asyncio.wait_for(
+                        self._flush_wakeup.wait(),
+                        timeout=max(0.0, settings.VECTOR_INDEX_FLUSH_SECONDS - elapsed)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_wakeup.clear()
+
+            due = (
+                self._flusher_stopping
+                or self._dirty_count >= settings.VECTOR_INDEX_SNAPSHOT_INTERVAL
+                or time.monotonic() - self._last_flush >= settings.VECTOR_INDEX_FLUSH_SECONDS
+            )
+            if not due:
+                continue
+
+            failed = False
+            if self._dirty_count > 0:
+                try:
+                    await self.save_to_storage()
+                except Exception as e:
+                    failed = True
+                    logger.error(f"Background index flush failed: {e}")
+            elif not self._flusher_stopping:
+                await self._adopt_rebuilt_version()
+            # Also after a failure, so a storage outage is retried once per interval
+            self._last_flush = time.monotonic()
+
+            # On shutdown, keep flushing changes that arrived during the last upload
+            if self._flusher_stopping and (self._dirty_count == 0 or failed):
+                return
+
+    def _schedule_maintenance(self):
+        """Start background compaction/upgrade unless one is already running"""
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.create_task(self._run_maintenance())
+
+    async def _run_maintenance(self):
+        """Rebuild the global index in the background and swap it in
+
+        Upgrades a flat index that passed the auto threshold to an approximate
+        one, otherwise compacts. The live vectors are copied under the read
+        lock and rebuilt without any lock, so searches and writes carry on;
+        swap_index then takes the write lock only to exchange the reference.
+        """
+        async with self._rebuild_lock:
+            try:
+                async with self._lock.read():
+                    upgrade = self.index.needs_upgrade()
+                    if not upgrade and not self.index.needs_compaction():
+                        return
+                    removed = len(self.index.deleted_positions)
+                    index_type, index_params = self.index.index_type, self.index.index_params
+                    self._circle_updates = {}
+                    clone = await asyncio.to_thread(self.index.clone)
+
+                if upgrade:
+                    await asyncio.to_thread(clone.rebuild)
+                elif index_type != "flat":
+                    await asyncio.to_thread(clone.rebuild, index_type, index_params)
+                await self.swap_index(clone)
+            finally:
+                self._circle_updates = None
+
+        if upgrade:
+            logger.info(f"Background rebuild switched index to {self.index.index_type}")
+        else:
+            logger.info(f"Background compaction removed {removed} tombstoned vectors")
+
+    async def swap_index(self, new_index: VectorIndex, reload_circles: bool = False):
+        """Replace the live index with new_index (blue/green)
+
+        new_index is caught up on the log without the lock, then the write
+        lock is held only for the last few entries and the reference swap:
+        searches already running finish on the old index, later ones use the
+        new one. Resident user partitions are dropped and rebuilt on demand.
+        If the log was pruned past new_index's log_seq, it is reconciled with
+        the database once swapped in.
+
+        Args:
+            new_index: Loaded or rebuilt index, not yet searched
+            reload_circles: Reload circle membership from the database
+                afterwards (for indices loaded from storage)
+
+        Raises:
+            ValueError: If new_index was built with another dimension or embedding model
+        """
+        if new_index.dimension != self.index.dimension:
+            raise ValueError(f"Index dimension {new_index.dimension} doesn't match {self.index.dimension}")
+        if new_index.model and self.index.model and new_index.model != self.index.model:
+            raise ValueError(f"Index was built with model {new_index.model}, expected {self.index.model}")
+
+        truncated = await self._skip_pruned_log(new_index)
+        await self._replay_log(index=new_index)
+        async with self._lock.write():
+            await self._replay_log(index=new_index)
+            for something_id, circle_ids in (self._circle_updates or {}).items():
+                new_index.set_circles(something_id, circle_ids)
+            if self._circle_updates is not None:
+                self._circle_updates = {}
+            self.index = new_index
+            self.user_indices.clear()
+
+        if truncated:
+            await self._reconcile_truncated_log()
+
+        try:
+            # Adds from the log (and made while new_index was built) carry no content type or creation time
+            await self._sync_metadata(reload_circles=reload_circles)
+        except Exception as e:
+            logger.warning(f"Could not backfill filter metadata after index swap: {e}")
+
+    async def reload_from_storage(self, pointer: Optional[Dict[str, Any]] = None) -> bool:
+        """Load the current stored version and hot-swap it in, if it isn't the one in use
+
+        Args:
+            pointer: Manifest of the current version (read from storage if omitted)
+
+        Returns:
+            True if a new version was swapped in
+
+        Raises:
+            ValueError: If the stored artifacts are corrupt or incompatible (the live index is kept)
+        """
+        async with self._rebuild_lock:
+            if pointer is None:
+                pointer = await self._read_pointer()
+            if pointer is None or pointer["version"] == self.version:
+                return False
+
+            new_index = self._new_index()
+            self._circle_updates = {}
+            try:
+                await self._load_from_storage(new_index, pointer["version"], pointer)
+                snapshot_seq = new_index.log_seq
+                await self.swap_index(new_index, reload_circles=True)
+            finally:
+                self._circle_updates = None
+
+        self.version = pointer["version"]
+        self._snapshot_seq = snapshot_seq
+        logger.info(
+            f"Swapped in index version {self.version} "
+            f"(generation {new_index.generation}, {new_index.live_vectors} vectors, {new_index.index_type})"
+        )
+        return True
 
-    async def search_similar(self, query_embedding: List[float], top_k: int = 5) -> List[Tuple[int, float]]:
+    async def _adopt_rebuilt_version(self, raise_errors: bool = False) -> bool:
+        """Swap in a stored version of a newer generation than the live index (see app.services.reindex)
+
+        Args:
+            raise_errors: Re-raise storage errors instead of logging them
+                (corrupt or incompatible artifacts are always only logged)
+
+        Returns:
+            True if a new version was swapped in
+        """
+        try:
+            pointer = await self._read_pointer()
+            if pointer is None or pointer.get("generation", 0) <= self.index.generation:
+                return False
+            return await self.reload_from_storage(pointer)
+        except ValueError as e:
+            logger.error(f"Rejected stored index version: {e}")
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.warning(f"Could not check for a rebuilt index version: {e}")
+        return False
+
+    async def search_similar(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        user_id: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None,
+        recency: Optional[RecencyDecay] = None
+    ) -> List[Tuple[int, float]]:
         """Search for similar somethings (thread-safe)
 
+        Searches hold the read lock only and run in the default thread pool,
+        so concurrent queries use multiple cores.
+
         Args:
             query_embedding: Query vector as list of floats
             top_k: Number of results to return
+            user_id: If given, only this user's somethings are searched
+            search_filter: Metadata predicate (content type, creation time, circles)
+                applied inside the scan; top_k results are returned as long as
+                enough somethings match
+            recency: Boost recent somethings by their created_at, from the global
+                index's metadata (scores returned include the boost)
 
         Returns:
             List of (something_id, similarity_score) tuples
@@ -92,10 +968,134 @@ class VectorService:
         Raises:
             ValueError: If query is invalid (propagated from VectorIndex)
         """
-        async with self._lock:
-            query_array = np.array(query_embedding, dtype=np.float32)
-            return self.index.search(query_array, top_k)
+        query_array = np.array(query_embedding, dtype=np.float32)
+        search_filter = self._scoped_filter(search_filter, user_id, recency)
+        async with self._lock.read():
+            if search_filter is not None or recency is not None:
+                return await asyncio.to_thread(self.index.search, query_array, top_k, search_filter, recency)
+            if user_id is not None:
+                return await asyncio.to_thread(self.user_indices.search, user_id, query_array, top_k)
+            return await asyncio.to_thread(self.index.search, query_array, top_k)
+
+    async def search_similar_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        user_id: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None,
+        recency: Optional[RecencyDecay] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Search for somethings similar to each of several queries (thread-safe)
+
+        All queries share one lock acquisition and one FAISS call, e.g. to
+        compute suggestions for every circle centroid of a user at once.
+
+        Args:
+            query_embeddings: Query vectors as lists of floats
+            top_k: Number of results to return per query
+            user_id: If given, only this user's somethings are searched
+            search_filter: Metadata predicate applied inside the scan
+            recency: Boost recent somethings by their created_at (see search_similar)
+
+        Returns:
+            One list of (something_id, similarity_score) tuples per query
+
+        Raises:
+            ValueError: If any query is invalid (propagated from VectorIndex)
+        """
+        query_array = np.array(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        search_filter = self._scoped_filter(search_filter, user_id, recency)
+        async with self._lock.read():
+            if search_filter is not None or recency is not None:
+                return await asyncio.to_thread(self.index.search_batch, query_array, top_k, search_filter, recency)
+            if user_id is not None:
+                return await asyncio.to_thread(self.user_indices.search_batch, user_id, query_array, top_k)
+            return await asyncio.to_thread(self.index.search_batch, query_array, top_k)
+
+    async def range_search_similar(
+        self,
+        query_embedding: List[float],
+        min_similarity: float,
+        user_id: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[Tuple[int, float]]:
+        """Find every something at least min_similarity to the query (thread-safe)
+
+        Used for duplicate detection: there is no top_k, the threshold decides
+        how many results come back. Unfiltered searches for a user scan only
+        that user's partition, so the cost doesn't grow with the global index.
+
+        Args:
+            query_embedding: Query vector as list of floats
+            min_similarity: Cosine similarity threshold in [-1, 1]
+            user_id: If given, only this user's somethings are searched
+            search_filter: Metadata predicate applied inside the scan
+
+        Returns:
+            List of (something_id, similarity_score) tuples, sorted by similarity desc
+
+        Raises:
+            ValueError: If query or threshold is invalid (propagated from VectorIndex)
+        """
+        query_array = np.array(query_embedding, dtype=np.float32)
+        search_filter = self._scoped_filter(search_filter, user_id)
+        async with self._lock.read():
+            if search_filter is None and user_id is not None:
+                return await asyncio.to_thread(self.user_indices.range_search, user_id, query_array, min_similarity)
+            return await asyncio.to_thread(self.index.range_search, query_array, min_similarity, search_filter)
+
+    async def get_something_embeddings(self, something_ids: List[int]) -> Tuple[List[int], np.ndarray]:
+        """Stored (normalized) embeddings of somethings, e.g. to diversify retrieved candidates (thread-safe)
+
+        Returns:
+            Tuple of (found_ids, embeddings); IDs not in the index are skipped
+        """
+        async with self._lock.read():
+            return await asyncio.to_thread(self.index.get_embeddings, something_ids)
+
+    @staticmethod
+    def _scoped_filter(
+        search_filter: Optional[SearchFilter],
+        user_id: Optional[str],
+        recency: Optional[RecencyDecay] = None
+    ) -> Optional[SearchFilter]:
+        """Fold user_id into search_filter; filtered and recency-weighted searches run on the global index's metadata"""
+        if user_id is None:
+            return search_filter
+        if search_filter is None:
+            return SearchFilter(user_id=user_id) if recency is not None else None
+        if search_filter.user_id is not None and search_filter.user_id != str(user_id):
+            raise ValueError(f"search_filter is scoped to user {search_filter.user_id}, not {user_id}")
+        return SearchFilter(
+            user_id=user_id,
+            content_types=search_filter.content_types,
+            created_after=search_filter.created_after,
+            created_before=search_filter.created_before,
+            circle_ids=search_filter.circle_ids,
+            exclude_circle_ids=search_filter.exclude_circle_ids
+        )
+
+    def _load_user_partition(self, user_id: str) -> Tuple[List[int], np.ndarray]:
+        """Build a user's partition from the global index
+
+        Ownership lives in the somethings table, so a cold partition costs one
+        ID lookup; every search after that stays in memory.
+        """
+        from app.core.database import SessionLocal
+        from app.models.something import Something
+
+        db = SessionLocal()
+        try:
+            rows = db.query(Something.id).filter(Something.user_id == user_id).all()
+        finally:
+            db.close()
+
+        return self.index.get_embeddings([row[0] for row in rows])
 
 
-# Singleton instance
-vector_service = VectorService()
+# Singleton instance (a thin client of the shared index server when one is configured)
+if settings.VECTOR_INDEX_SERVER_SOCKET:
+    from app.services.index_client import RemoteVectorService
+    vector_service = RemoteVectorService(settings.VECTOR_INDEX_SERVER_SOCKET, settings.VECTOR_INDEX_SERVER_POOL_SIZE)
+else:
+    vector_service = VectorService()
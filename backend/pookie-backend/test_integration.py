@@ -68,7 +68,7 @@ async def test_integration():
 
     # Verify data persisted
     assert vector_service.index.total_vectors == 2, "Should have 2 vectors after reload"
-    assert vector_service.index.something_ids == [1, 2], "IDs should match"
+    assert vector_service.index.something_ids.tolist() == [1, 2], "IDs should match"
 
     # Verify search still works
     results3 = await vector_service.search_similar(emb1, top_k=1)
@@ -80,7 +80,7 @@ async def test_integration():
     print("=" * 60)
     print(f"\nFinal state:")
     print(f"  - Total vectors in index: {vector_service.index.total_vectors}")
-    print(f"  - Something IDs: {vector_service.index.something_ids}")
+    print(f"  - Something IDs: {vector_service.index.something_ids.tolist()}")
     print(f"  - Bucket: vector-indices (Supabase Storage)")
     print()
 
@@ -7,7 +7,9 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 from typing import Generator
+from unittest.mock import patch
 import uuid
 
 from app.main import app
@@ -16,6 +18,8 @@ from app.core.config import settings
 from app.models.base import Base
 from app.models.user import User
 from app.models.something import Something
+from app.models.vector_index_log import VectorIndexLogEntry, VectorIndexLogMark
+from app.services.index_log_service import IndexLogService
 
 
 @pytest.fixture(scope="function")
@@ -208,3 +212,26 @@ def create_test_action(db_session: Session):
     return _create_action
 
 
+@pytest.fixture(scope="function")
+def index_log(tmp_path):
+    """Index write-ahead log backed by a SQLite database file
+
+    Each thread gets its own connection: background maintenance reads the
+    log from a worker thread while a test appends to it.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'index_log.db'}", connect_args={"check_same_thread": False})
+    VectorIndexLogEntry.__table__.create(engine)
+    VectorIndexLogMark.__table__.create(engine)
+    yield IndexLogService(session_factory=sessionmaker(bind=engine))
+    engine.dispose()
+
+
+@pytest.fixture
+def somethings_db():
+    """somethings table in an in-memory SQLite database, used by the service's DB helpers"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Something.__table__.create(engine)
+    session_factory = sessionmaker(bind=engine)
+    with patch("app.core.database.SessionLocal", session_factory):
+        yield session_factory
+    engine.dispose()
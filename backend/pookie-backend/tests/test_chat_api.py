@@ -72,6 +72,7 @@ async def test_stream_chat_sse_format(client, mock_user_id):
             assert "Hello" in content
             assert "world" in content
             assert "Fitness" in content
+            assert mock_stream.call_args.kwargs["diversity"] == 0.0  # MMR is opt-in
     finally:
         app.dependency_overrides.clear()
 
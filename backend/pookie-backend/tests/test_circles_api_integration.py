@@ -353,6 +353,45 @@ class TestPredictSimilar:
         suggestions = response.json()["suggestions"]
         assert len(suggestions) <= 3
 
+    def test_predict_similar_excludes_members_the_index_filter_missed(self, client: TestClient, mock_auth_headers):
+        """Test members assigned through another worker (not yet in this worker's circle filter) aren't suggested."""
+        from unittest.mock import AsyncMock, patch
+
+        circle_response = client.post(
+            "/circles/",
+            json={"circleName": "Stale Filter"},
+            headers=mock_auth_headers
+        )
+        circle_id = circle_response.json()["circleId"]
+
+        member_ids = []
+        for content in ["Morning run by the river", "Evening run in the park"]:
+            response = client.post(
+                "/somethings/",
+                json={"content": content, "contentType": "text"},
+                headers=mock_auth_headers
+            )
+            member_ids.append(response.json()["somethingId"])
+        client.post(
+            "/somethings/",
+            json={"content": "Run a half marathon this spring", "contentType": "text"},
+            headers=mock_auth_headers
+        )
+
+        # The assignments commit, but this worker's index never hears about them
+        with patch("app.api.routes.circles.vector_service.set_something_circles", new=AsyncMock()):
+            for something_id in member_ids:
+                client.post(f"/circles/{circle_id}/somethings/{something_id}", headers=mock_auth_headers)
+
+        response = client.get(
+            f"/circles/{circle_id}/predict-similar?top_k=3",
+            headers=mock_auth_headers
+        )
+        assert response.status_code == 200
+        suggested_ids = [suggestion["somethingId"] for suggestion in response.json()["suggestions"]]
+        assert suggested_ids
+        assert not set(suggested_ids) & set(member_ids)
+
 
 class TestFullRLLoop:
     """Test complete RL loop: assign -> centroid shifts -> predictions change"""
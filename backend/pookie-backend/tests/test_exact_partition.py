@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from app.ml.exact_partition import ExactPartition, measure_crossover
+from app.ml.vector_index import VectorIndex
+
+
+def test_results_match_flat_index():
+    """Test exact NumPy scoring returns the same ranking and scores as a flat FAISS index"""
+    embeddings = np.random.randn(50, 384).astype(np.float32)
+    queries = np.random.randn(3, 384).astype(np.float32)
+    partition = ExactPartition(384)
+    partition.add_batch(list(range(100, 150)), embeddings)
+    flat = VectorIndex(dimension=384)
+    flat.add_batch(list(range(100, 150)), embeddings)
+
+    for top_k in (5, 50, 80):
+        expected = flat.search_batch(queries, top_k=top_k)
+        for query, batch_results, truth in zip(queries, partition.search_batch(queries, top_k=top_k), expected):
+            single = partition.search(query, top_k=top_k)
+            assert [sid for sid, _ in single] == [sid for sid, _ in truth]
+            assert [sid for sid, _ in batch_results] == [sid for sid, _ in truth]
+            np.testing.assert_allclose([sim for _, sim in single], [sim for _, sim in truth], atol=1e-5)
+
+
+def test_range_search_matches_flat_index():
+    """Test the threshold search returns the same neighbours and scores as a flat FAISS index"""
+    embeddings = np.random.randn(50, 384).astype(np.float32)
+    embeddings[10:13] = embeddings[0] + 0.05 * np.random.randn(3, 384).astype(np.float32)
+    partition = ExactPartition(384)
+    partition.add_batch(list(range(100, 150)), embeddings)
+    flat = VectorIndex(dimension=384)
+    flat.add_batch(list(range(100, 150)), embeddings)
+
+    results = partition.range_search(embeddings[0], min_similarity=0.95)
+    truth = flat.range_search(embeddings[0], min_similarity=0.95)
+    assert [sid for sid, _ in results] == [sid for sid, _ in truth]
+    assert sorted(sid for sid, _ in results) == [100, 110, 111, 112]
+    np.testing.assert_allclose([sim for _, sim in results], [sim for _, sim in truth], atol=1e-5)
+
+    assert ExactPartition(384).range_search(embeddings[0], 0.95) == []
+    with pytest.raises(ValueError, match="min_similarity"):
+        partition.range_search(embeddings[0], 1.5)
+
+
+def test_add_and_remove_keep_matrix_dense():
+    """Test one-at-a-time adds grow the matrix and removals compact it immediately"""
+    partition = ExactPartition(384)
+    embeddings = np.random.randn(100, 384).astype(np.float32)
+    for sid, embedding in enumerate(embeddings):
+        partition.add(sid, embedding)
+
+    assert partition.remove([3, 4, 1000]) == 2
+    assert partition.live_vectors == partition.total_vectors == 98
+    assert partition.needs_compaction() is False
+    assert 3 not in partition.something_ids.tolist()
+    assert partition.search(embeddings[5], top_k=1)[0][0] == 5
+
+
+def test_invalid_inputs_rejected():
+    """Test zero-norm vectors, wrong shapes and non-positive top_k raise ValueError"""
+    partition = ExactPartition(384)
+    with pytest.raises(ValueError, match="zero or near-zero norm"):
+        partition.add(1, np.zeros(384, dtype=np.float32))
+    with pytest.raises(ValueError, match="shape"):
+        partition.add_batch([1], np.ones((1, 128), dtype=np.float32))
+
+    assert partition.search(np.ones(384, dtype=np.float32)) == []  # Empty partition
+    partition.add(1, np.ones(384, dtype=np.float32))
+    with pytest.raises(ValueError, match="zero or near-zero norm"):
+        partition.search(np.zeros(384, dtype=np.float32))
+    with pytest.raises(ValueError, match="top_k must be positive"):
+        partition.search(np.ones(384, dtype=np.float32), top_k=0)
+
+
+def test_measure_crossover_returns_a_timed_size():
+    """Test the calibration reports one of the timed sizes (or 0 if FAISS always wins)"""
+    assert measure_crossover(dimension=32, sizes=(8, 16)) in (0, 8, 16)
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from app.ml.vector_metadata import RecencyDecay, SearchFilter
+from app.services.index_client import RemoteVectorService
+from app.services.index_protocol import IndexServerError, decode_results, encode_results
+from app.services.index_server import IndexServer
+from app.services.vector_service import VectorService
+
+
+@pytest_asyncio.fixture
+async def server(index_log):
+    """Index server on a localhost Unix socket, backed by an in-process VectorService"""
+    # Unix socket paths are limited to ~100 bytes, so avoid pytest's long tmp_path
+    socket_dir = tempfile.mkdtemp(dir="/tmp")
+    with patch("app.services.vector_service.index_log_service", index_log):
+        service = VectorService()
+
+    # Ownership comes from the somethings table; stub the lookup with the index's own metadata
+    def fake_loader(user_id):
+        owned = service.index.metadata.mask(SearchFilter(user_id=user_id))[:service.index.total_vectors]
+        return service.index.get_embeddings(service.index.something_ids[owned].tolist())
+
+    service.user_indices.loader = fake_loader
+    index_server = IndexServer(service, os.path.join(socket_dir, "index.sock"))
+    await index_server.start()
+    yield index_server
+    await index_server.close()
+    shutil.rmtree(socket_dir)
+
+
+@pytest_asyncio.fixture
+async def client(server):
+    remote = RemoteVectorService(server.socket_path, pool_size=2)
+    yield remote
+    await remote.stop_flusher()
+
+
+def test_results_round_trip():
+    """Test result lists survive the binary encoding, including empty ones"""
+    results = [[(3, 0.9), (1, 0.5)], [], [(7, -0.25)]]
+    header, body = encode_results(results)
+    decoded = decode_results(header, body)
+    assert [[sid for sid, _ in r] for r in decoded] == [[3, 1], [], [7]]
+    assert decoded[0][0][1] == pytest.approx(0.9)
+
+
+@pytest.mark.asyncio
+async def test_client_writes_are_visible_to_every_client(server, client):
+    """Test adds through one client are searchable from another (one shared index)"""
+    other = RemoteVectorService(server.socket_path)
+    user_id = str(uuid.uuid4())
+    embeddings = np.random.randn(3, 384).astype(np.float32)
+    for sid, embedding in enumerate(embeddings, start=1):
+        await client.add_something_embedding(sid, embedding.tolist(), user_id=user_id, content_type="text")
+
+    results = await other.search_similar(embeddings[1].tolist(), top_k=2)
+    assert results[0][0] == 2
+    assert server.service.index.live_vectors == 3
+
+    found_ids, stored = await other.get_something_embeddings([3, 1, 99])
+    assert sorted(found_ids) == [1, 3]
+    np.testing.assert_allclose(stored[found_ids.index(3)], embeddings[2] / np.linalg.norm(embeddings[2]), atol=1e-6)
+
+    assert await other.remove_something_embedding(2, user_id=user_id)
+    results = await client.search_similar(embeddings[1].tolist(), top_k=3, user_id=user_id)
+    assert {sid for sid, _ in results} == {1, 3}
+    await other.stop_flusher()
+
+
+@pytest.mark.asyncio
+async def test_filters_circles_and_range_search(client):
+    """Test filtered search, circle updates and range search through the server"""
+    user_id = str(uuid.uuid4())
+    embedding = np.random.randn(384).astype(np.float32)
+    await client.add_something_embedding(1, embedding.tolist(), user_id=user_id, content_type="text")
+    await client.add_something_embedding(2, (embedding * 2).tolist(), user_id=user_id, content_type="url")
+    assert await client.set_something_circles(2, [5])
+
+    results = await client.search_similar(embedding.tolist(), top_k=5, search_filter=SearchFilter(circle_ids=[5]))
+    assert [sid for sid, _ in results] == [2]
+    results = await client.range_search_similar(embedding.tolist(), 0.95, user_id=user_id)
+    assert {sid for sid, _ in results} == {1, 2}
+    results = await client.search_similar_batch([embedding.tolist()] * 2, top_k=1, search_filter=SearchFilter(content_types=["text"]))
+    assert [r[0][0] for r in results] == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_recency_weighted_search(client):
+    """Test a recency decay sent through the server ranks a newer, slightly less similar something first"""
+    user_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    embedding = np.random.randn(384).astype(np.float32)
+    near = embedding + 0.1 * np.random.randn(384).astype(np.float32)
+    await client.add_something_embedding(1, embedding.tolist(), user_id=user_id, created_at=now - timedelta(days=60))
+    await client.add_something_embedding(2, near.tolist(), user_id=user_id, created_at=now)
+
+    results = await client.search_similar(embedding.tolist(), top_k=2, user_id=user_id)
+    assert [sid for sid, _ in results] == [1, 2]
+    recency = RecencyDecay(timedelta(days=7), weight=0.2, now=now)
+    results = await client.search_similar(embedding.tolist(), top_k=2, user_id=user_id, recency=recency)
+    assert [sid for sid, _ in results] == [2, 1]
+    assert results[1][1] == pytest.approx(1.0 + 0.2 * 0.5 ** (60 / 7), abs=1e-4)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_are_coalesced(server, client):
+    """Test concurrent searches with the same parameters share one batched request"""
+    embeddings = np.random.randn(8, 384).astype(np.float32)
+    for sid, embedding in enumerate(embeddings):
+        await client.add_something_embedding(sid, embedding.tolist())
+
+    with patch.object(server.service, "search_similar_batch", wraps=server.service.search_similar_batch) as batch:
+        results = await asyncio.gather(*(client.search_similar(e.tolist(), top_k=1) for e in embeddings))
+
+    assert [r[0][0] for r in results] == list(range(8))
+    assert batch.call_count == 1
+    assert len(client._idle) <= client.pool_size
+
+
+@pytest.mark.asyncio
+async def test_errors_are_propagated(server, client):
+    """Test invalid requests raise ValueError and an unreachable server IndexServerError"""
+    with pytest.raises(ValueError, match="zero or near-zero norm"):
+        await client.add_something_embedding(1, [0.0] * 384)
+    with pytest.raises(ValueError, match="zero or near-zero norm"):
+        await client.search_similar([0.0] * 384)
+
+    # The connection stays usable after an error response
+    await client.add_something_embedding(1, np.random.randn(384).tolist())
+
+    unreachable = RemoteVectorService(server.socket_path + ".missing")
+    with pytest.raises(IndexServerError, match="Cannot connect"):
+        await unreachable.search_similar(np.random.randn(384).tolist())
+    await unreachable.initialize()  # Only logs a warning
+
+
+@pytest.mark.asyncio
+async def test_stale_pooled_connection_is_retried(server, client):
+    """Test a pooled connection the server closed (e.g. on a restart) is replaced instead of failing the request"""
+    async def hang_up(reader, writer):
+        writer.close()
+
+    stale_path = server.socket_path + ".stale"
+    stale_server = await asyncio.start_unix_server(hang_up, path=stale_path)
+    stale = await asyncio.open_unix_connection(stale_path)
+    client._idle.append(stale)
+    await asyncio.sleep(0.01)  # Let the server hang up while the connection sits in the pool
+
+    embedding = np.random.randn(384).tolist()
+    await client.add_something_embedding(1, embedding)
+    assert [sid for sid, _ in await client.search_similar(embedding, top_k=1)] == [1]
+    assert stale not in client._idle
+
+    # A fresh connection that breaks is not retried
+    client._idle.clear()
+    with patch.object(client, "_connect", return_value=await asyncio.open_unix_connection(stale_path)):
+        await asyncio.sleep(0.01)
+        with pytest.raises(IndexServerError, match="connection failed"):
+            await client.save_to_storage()
+    stale_server.close()
+    await stale_server.wait_closed()
+    os.remove(stale_path)
@@ -0,0 +1,101 @@
+import os
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from app.services.index_storage import CODECS, IndexStorage, LocalIndexStorage, SupabaseIndexStorage
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    """A 100 KB local file of compressible data"""
+    path = os.path.join(tmp_path, "artifact.bin")
+    with open(path, "wb") as f:
+        f.write(np.arange(12_800, dtype=np.int64).tobytes())
+    return path
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec", CODECS)
+async def test_file_round_trips_through_compressed_chunks(tmp_path, artifact, codec):
+    """Test a file is uploaded as compressed chunks of chunk_bytes and downloaded back byte for byte"""
+    storage = LocalIndexStorage(os.path.join(tmp_path, "store"), codec=codec, chunk_bytes=16_384, concurrency=2)
+
+    chunks = await storage.upload_file("v1/artifact.bin", artifact)
+    assert chunks == 7
+    assert await storage.list("v1") == ["artifact.bin"] + [f"artifact.bin.part{i}" for i in range(1, 7)]
+    stored = sum(os.path.getsize(os.path.join(tmp_path, "store", "v1", name)) for name in await storage.list("v1"))
+    if codec != "none":
+        assert stored < os.path.getsize(artifact) / 2
+
+    target = os.path.join(tmp_path, "downloaded.bin")
+    await storage.download_file("v1/artifact.bin", target, chunks, codec)
+    with open(artifact, "rb") as expected, open(target, "rb") as actual:
+        assert actual.read() == expected.read()
+
+
+@pytest.mark.asyncio
+async def test_unchunked_object_and_corrupt_chunk(tmp_path, artifact):
+    """Test objects uploaded before chunking are read as-is and a corrupt chunk leaves the destination untouched"""
+    storage = LocalIndexStorage(os.path.join(tmp_path, "store"), chunk_bytes=16_384)
+    with open(artifact, "rb") as f:
+        await storage.put("legacy.bin", f.read())
+    target = os.path.join(tmp_path, "downloaded.bin")
+    await storage.download_file("legacy.bin", target)
+    assert os.path.getsize(target) == os.path.getsize(artifact)
+
+    chunks = await storage.upload_file("artifact.bin", artifact)
+    await storage.put("artifact.bin.part3", b"not zstd")
+    with pytest.raises(ValueError, match="Corrupt"):
+        await storage.download_file("artifact.bin", target, chunks, "zstd")
+    assert os.path.getsize(target) == os.path.getsize(artifact)  # The earlier download
+    assert sorted(os.listdir(tmp_path)) == ["artifact.bin", "downloaded.bin", "store"]  # No leftover temp file
+
+
+@pytest.mark.asyncio
+async def test_deleting_a_folder_removes_it_from_the_listing(tmp_path, artifact):
+    """Test deleting every object of a version folder removes the folder itself"""
+    storage = LocalIndexStorage(os.path.join(tmp_path, "store"), chunk_bytes=65_536)
+    await storage.upload_file("v1/artifact.bin", artifact)
+    await storage.upload_file("v2/artifact.bin", artifact)
+    await storage.put("pointer", b"v2")
+    assert await storage.list() == ["pointer", "v1", "v2"]
+
+    await storage.delete([f"v1/{name}" for name in await storage.list("v1")])
+    assert await storage.list() == ["pointer", "v2"]
+    assert await storage.get("pointer") == b"v2"
+
+
+@pytest.mark.asyncio
+async def test_supabase_storage_lists_every_page():
+    """Test listing a Supabase folder pages through more objects than one request returns"""
+    bucket = MagicMock()
+    bucket.list.side_effect = [[{"name": f"chunk{i}"} for i in range(1000)], [{"name": "chunk1000"}]]
+    client = MagicMock()
+    client.storage.from_.return_value = bucket
+
+    names = await SupabaseIndexStorage(client).list("v1")
+    assert len(names) == 1001
+    assert bucket.list.call_args_list[1].args == ("v1", {"limit": 1000, "offset": 1000})
+
+
+def test_unknown_codec_is_rejected(tmp_path):
+    """Test an unknown codec fails when the storage is created, not at the first upload"""
+    with pytest.raises(ValueError, match="codec"):
+        LocalIndexStorage(str(tmp_path), codec="lz4")
+
+
+def test_backends_must_implement_every_primitive():
+    """Test a backend missing one of the object primitives can't be created"""
+    class ReadOnlyStorage(IndexStorage):
+        def _get(self, name):
+            return b""
+
+        def _list(self, prefix):
+            return []
+
+    with pytest.raises(TypeError, match="_delete"):
+        ReadOnlyStorage()
+    with pytest.raises(TypeError):
+        IndexStorage()
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.core.locks import AsyncRWLock
+
+
+@pytest.mark.asyncio
+async def test_readers_share_the_lock():
+    """Test several readers hold the lock at once"""
+    lock = AsyncRWLock()
+    inside = asyncio.Event()
+    release = asyncio.Event()
+
+    async def reader():
+        async with lock.read():
+            if lock.readers == 3:
+                inside.set()
+            await release.wait()
+
+    tasks = [asyncio.create_task(reader()) for _ in range(3)]
+    await asyncio.wait_for(inside.wait(), timeout=1)
+    release.set()
+    await asyncio.gather(*tasks)
+    assert lock.readers == 0
+
+
+@pytest.mark.asyncio
+async def test_writer_excludes_readers_and_blocks_new_ones():
+    """Test a waiting writer gets in before readers that arrive after it"""
+    lock = AsyncRWLock()
+    order = []
+
+    async with lock.read():
+        writer = asyncio.create_task(_record(lock.write(), order, "writer"))
+        await asyncio.sleep(0)
+        late_reader = asyncio.create_task(_record(lock.read(), order, "reader"))
+        await asyncio.sleep(0)
+        assert order == []  # Writer waits for the held read lock; reader waits for the writer
+
+    await asyncio.gather(writer, late_reader)
+    assert order == ["writer", "reader"]
+    assert not lock.write_locked
+
+
+@pytest.mark.asyncio
+async def test_cancelled_writer_unblocks_readers():
+    """Test readers aren't stuck behind a writer that gave up waiting"""
+    lock = AsyncRWLock()
+
+    async with lock.read():
+        writer = asyncio.create_task(_record(lock.write(), [], "writer"))
+        await asyncio.sleep(0)
+        writer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await writer
+
+        async with lock.read():
+            assert lock.readers == 2
+
+
+async def _record(context, order, name):
+    async with context:
+        order.append(name)
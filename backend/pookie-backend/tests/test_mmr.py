@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.ml.mmr import mmr_select
+from app.services.chat_service import ChatService
+
+
+def test_mmr_skips_near_duplicates():
+    """Test MMR trades a near-duplicate of the best candidate for a distinct one, and diversity=0 ranks by relevance"""
+    base = np.random.randn(384).astype(np.float32)
+    other = np.random.randn(384).astype(np.float32)
+    embeddings = np.stack([base, base + 0.01 * np.random.randn(384).astype(np.float32), other])
+    relevance = np.array([0.9, 0.89, 0.7])
+
+    assert mmr_select(relevance, embeddings, 2, diversity=0.0) == [0, 1]
+    assert mmr_select(relevance, embeddings, 2, diversity=0.5) == [0, 2]
+    assert mmr_select(relevance, embeddings, 10, diversity=0.5) == [0, 2, 1]  # k larger than n picks everything
+
+    with pytest.raises(ValueError, match="diversity"):
+        mmr_select(relevance, embeddings, 2, diversity=1.5)
+    with pytest.raises(ValueError, match="Expected 3 embeddings"):
+        mmr_select(relevance, embeddings[:2], 2, diversity=0.5)
+
+
+@pytest.mark.asyncio
+async def test_chat_context_selection_is_diverse():
+    """Test stream_chat's selection fetches candidate embeddings once and drops redundant captures"""
+    base = np.random.randn(384).astype(np.float32)
+    embeddings = np.stack([base, base, np.random.randn(384).astype(np.float32)])
+    reranked = [{"something_id": sid, "final_score": score} for sid, score in [(10, 0.9), (11, 0.88), (12, 0.6)]]
+
+    with patch(
+        "app.services.chat_service.vector_service.get_something_embeddings",
+        new_callable=AsyncMock,
+        return_value=([10, 11, 12], embeddings)
+    ) as fetch:
+        assert await ChatService()._select_diverse(reranked, top_k=2, diversity=0.5) == [10, 12]
+        assert fetch.await_count == 1
+        assert await ChatService()._select_diverse(reranked, top_k=2, diversity=0.0) == [10, 11]
+        assert fetch.await_count == 1  # No MMR, no fetch
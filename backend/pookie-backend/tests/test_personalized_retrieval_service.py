@@ -245,3 +245,22 @@ def test_format_rag_context_no_circles(service):
 
     assert "Random thought" in context
     assert "[Circle: Uncategorized]" in context
+
+
+def test_format_rag_context_keeps_ranking_order(service):
+    """Test context entries follow the given ID order, not the database's"""
+    somethings = []
+    for sid, content in [(1, "First fetched"), (2, "Second fetched")]:
+        something = Mock()
+        something.id = sid
+        something.content = content
+        something.meaning = None
+        something.circles = []
+        somethings.append(something)
+
+    mock_db = Mock()
+    mock_db.query.return_value.filter.return_value.all.return_value = somethings
+
+    context = service.format_rag_context([2, 1], mock_db)
+
+    assert context.index("Second fetched") < context.index("First fetched")
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.ml.vector_index import VectorIndex
+from app.ml.vector_metadata import SearchFilter
+from app.models.something import Something
+from app.services.reindex import CHECKPOINT_FILENAME, Reindexer
+
+
+def fake_embed(texts):
+    """Deterministic stand-in for the embedding model"""
+    return np.stack([
+        np.random.default_rng(int(text.split()[-1])).standard_normal(384).astype(np.float32) for text in texts
+    ])
+
+
+@pytest.fixture
+def somethings(somethings_db, index_log):
+    """Somethings 1-9 with content, plus one media-only and one whitespace-only row"""
+    user_id = uuid.uuid4()
+    db = somethings_db()
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for sid in range(1, 10):
+        db.add(Something(id=sid, user_id=user_id, content=f"note {sid}", content_type="url" if sid == 4 else "text", created_at=created))
+    db.add(Something(id=10, user_id=user_id, content=None, content_type="image"))
+    db.add(Something(id=11, user_id=user_id, content="   ", content_type="text"))
+    db.commit()
+    db.close()
+    index_log.append_remove(99)
+    with patch("app.services.index_log_service.index_log_service", index_log):
+        yield str(user_id)
+
+
+def test_reindex_builds_index_with_metadata(somethings, tmp_path):
+    """Test every something with content is embedded, with filter metadata and the log position"""
+    reindexer = Reindexer(str(tmp_path), chunk_size=4, workers=1)
+    with patch("app.services.reindex._embed_texts", side_effect=fake_embed):
+        index = reindexer.run()
+
+    assert index.something_ids.tolist() == list(range(1, 10))
+    assert index.log_seq == 1
+    assert index.missing_metadata_ids == []
+    results = index.search(fake_embed(["note 4"])[0], top_k=3, search_filter=SearchFilter(user_id=somethings, content_types=["url"]))
+    assert [sid for sid, _ in results] == [4]
+
+
+def test_reindex_resumes_after_interruption(somethings, tmp_path):
+    """Test a failed run resumes after its last checkpoint without re-embedding checkpointed chunks"""
+    calls = []
+
+    def failing_embed(texts):
+        calls.append(texts)
+        if len(calls) == 3:
+            raise RuntimeError("worker died")
+        return fake_embed(texts)
+
+    with patch("app.services.reindex._embed_texts", side_effect=failing_embed):
+        with pytest.raises(RuntimeError):
+            Reindexer(str(tmp_path), chunk_size=3, workers=1, checkpoint_every=1).run()
+        assert os.path.exists(os.path.join(tmp_path, CHECKPOINT_FILENAME))
+
+        calls.clear()
+        index = Reindexer(str(tmp_path), chunk_size=3, workers=1, checkpoint_every=1).run()
+
+    assert calls == [["note 7", "note 8", "note 9"]]
+    assert index.something_ids.tolist() == list(range(1, 10))
+    results = index.search(fake_embed(["note 2"])[0], top_k=1)
+    assert results[0][0] == 2
+
+
+def test_publish_replaces_artifacts_and_clears_checkpoint(somethings, tmp_path):
+    """Test the published index loads like a snapshot and the next run starts over"""
+    checkpoint_dir = os.path.join(tmp_path, "checkpoint")
+    output_path = os.path.join(tmp_path, "index", "somethings_index.faiss")
+    reindexer = Reindexer(checkpoint_dir, chunk_size=4, workers=1)
+    with patch("app.services.reindex._embed_texts", side_effect=fake_embed):
+        reindexer.publish(reindexer.run(), output_path=output_path)
+
+    loaded = VectorIndex(dimension=384)
+    assert loaded.load(output_path)
+    assert loaded.total_vectors == 9
+    assert loaded.log_seq == 1
+    assert not [name for name in os.listdir(os.path.dirname(output_path)) if name.endswith(".tmp")]
+    assert os.listdir(checkpoint_dir) == []
+
+
+def test_publish_uploads_a_current_version(somethings, tmp_path, monkeypatch):
+    """Test an uploaded reindex becomes the current version workers load from index storage"""
+    from app.core.config import settings
+    from app.services.index_storage import create_index_storage
+
+    monkeypatch.setattr(settings, "VECTOR_INDEX_STORAGE", "local")
+    monkeypatch.setattr(settings, "VECTOR_INDEX_STORAGE_DIR", str(tmp_path / "store"))
+    reindexer = Reindexer(str(tmp_path / "checkpoint"), chunk_size=4, workers=1)
+    with patch("app.services.reindex._embed_texts", side_effect=fake_embed):
+        reindexer.publish(reindexer.run(), upload=True)
+
+    storage = create_index_storage()
+    pointer = json.loads(asyncio.run(storage.get("somethings_index.faiss.current")))
+    assert pointer["log_seq"] == 1
+    assert "somethings_index.faiss.ids" in asyncio.run(storage.list(pointer["version"]))
+
+
+def test_log_is_not_truncated_past_a_reindex_in_progress(somethings, tmp_path, index_log):
+    """Test workers can't prune log entries the rebuilt index still needs until it is published"""
+    def failing_embed(texts):
+        raise RuntimeError("worker died")
+
+    reindexer = Reindexer(str(tmp_path), chunk_size=4, workers=1)
+    with patch("app.services.reindex._embed_texts", side_effect=failing_embed):
+        with pytest.raises(RuntimeError):
+            reindexer.run()
+
+    # A worker saves a snapshot while the reindex is interrupted
+    index_log.append_remove(5)
+    index_log.append_remove(6)
+    assert index_log.truncate_through(index_log.latest_seq()) == 1  # Only the entry before the hold
+    assert [entry.seq for entry in index_log.read_since(1)] == [2, 3]
+    assert index_log.truncated_through() == 1
+
+    with patch("app.services.reindex._embed_texts", side_effect=fake_embed):
+        index = reindexer.run()
+    assert index.log_seq == 1
+    reindexer.publish(index, output_path=os.path.join(tmp_path, "index", "somethings_index.faiss"))
+
+    assert index_log.truncate_through(index_log.latest_seq()) == 2
+    assert index_log.truncated_through() == 3
@@ -7,6 +7,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from app.models.something import Something
+from app.models.vector_index_log import VectorIndexLogEntry
 from uuid import UUID
 
 
@@ -78,16 +79,16 @@ class TestCreateSomething:
         # Should get 401 Unauthorized from FastAPI security
         assert response.status_code == 401
 
-    def test_create_somethings_triggers_faiss_save_at_mod_10(
+    def test_create_somethings_appends_to_index_log(
         self,
         client: TestClient,
         mock_auth_headers: dict,
         test_user: object,
-        test_user_id: str
+        test_user_id: str,
+        db_session: Session
     ):
-        """Test that creating somethings triggers FAISS save every 10 items (testing bug fix)."""
-        # Create 10 somethings to trigger save at ID 10
-        # This test catches the critical bug where save_index() was called instead of save_to_storage()
+        """Test that each capture is persisted as one index log entry instead of a full index upload."""
+        created_ids = []
         for i in range(10):
             response = client.post(
                 "/api/v1/somethings",
@@ -98,10 +99,37 @@ class TestCreateSomething:
                 headers=mock_auth_headers
             )
             assert response.status_code == 201, f"Failed to create something {i + 1}: {response.text}"
+            created_ids.append(response.json()["id"])
 
-        # If we got here without AttributeError, the save_to_storage() method exists
-        # This would have failed with the old save_index() bug
-        assert True
+        entries = db_session.query(VectorIndexLogEntry).filter(
+            VectorIndexLogEntry.something_id.in_(created_ids)
+        ).all()
+        assert sorted(entry.something_id for entry in entries) == sorted(created_ids)
+        assert all(entry.op == "add" and len(entry.embedding) == 384 * 4 for entry in entries)
+
+    def test_create_near_duplicate_is_flagged(
+        self,
+        client: TestClient,
+        mock_auth_headers: dict,
+        test_user: object
+    ):
+        """Test that capturing the same content twice flags the second as a duplicate of the first."""
+        first = client.post(
+            "/api/v1/somethings",
+            json={"content": "Call grandma on Sunday", "contentType": "text"},
+            headers=mock_auth_headers
+        )
+        assert first.status_code == 201
+        assert first.json()["duplicateOf"] is None
+
+        second = client.post(
+            "/api/v1/somethings",
+            json={"content": "Call grandma on Sunday", "contentType": "text"},
+            headers=mock_auth_headers
+        )
+        assert second.status_code == 201
+        assert second.json()["duplicateOf"] == first.json()["id"]
+        assert second.json()["duplicateSimilarity"] >= 0.95
 
 
 class TestListSomethings:
@@ -0,0 +1,143 @@
+import pytest
+import numpy as np
+from app.ml.user_index_manager import UserIndexManager
+
+
+def make_loader(corpus):
+    """Build a loader over {user_id: (ids, embeddings)} that records calls"""
+    calls = []
+
+    def loader(user_id):
+        calls.append(user_id)
+        ids, embeddings = corpus.get(user_id, ([], np.empty((0, 384), dtype=np.float32)))
+        return ids, embeddings
+
+    return loader, calls
+
+
+def test_partition_created_lazily_from_loader():
+    """Test partitions are built on first access and cached afterwards"""
+    corpus = {"alice": ([1, 2, 3], np.random.randn(3, 384).astype(np.float32))}
+    loader, calls = make_loader(corpus)
+    manager = UserIndexManager(dimension=384, loader=loader)
+
+    assert "alice" not in manager
+
+    partition = manager.get("alice")
+    assert partition.total_vectors == 3
+    assert "alice" in manager
+
+    manager.get("alice")
+    assert calls == ["alice"]  # Second access hits the cache
+
+
+def test_search_only_returns_users_own_vectors():
+    """Test search is scoped to a single user's partition"""
+    alice_embeddings = np.random.randn(3, 384).astype(np.float32)
+    bob_embeddings = np.random.randn(3, 384).astype(np.float32)
+    corpus = {
+        "alice": ([1, 2, 3], alice_embeddings),
+        "bob": ([4, 5, 6], bob_embeddings),
+    }
+    loader, _ = make_loader(corpus)
+    manager = UserIndexManager(dimension=384, loader=loader)
+
+    # Query with one of bob's vectors from alice's partition
+    results = manager.search("alice", bob_embeddings[0], top_k=10)
+
+    assert {sid for sid, _ in results} == {1, 2, 3}
+
+
+def test_add_only_updates_resident_partitions():
+    """Test writes never trigger a partition load"""
+    loader, calls = make_loader({})
+    manager = UserIndexManager(dimension=384, loader=loader)
+
+    manager.add("alice", 1, np.random.randn(384).astype(np.float32))
+    assert "alice" not in manager
+    assert calls == []
+
+    manager.get("alice")
+    manager.add("alice", 2, np.random.randn(384).astype(np.float32))
+    assert manager.get("alice").something_ids.tolist() == [2]
+
+
+def test_lru_eviction_under_memory_budget():
+    """Test least recently used partitions are evicted when over budget"""
+    corpus = {
+        user: ([i * 10 + j for j in range(10)], np.random.randn(10, 384).astype(np.float32))
+        for i, user in enumerate(["a", "b", "c"])
+    }
+    loader, calls = make_loader(corpus)
+    # Budget fits two partitions of 10 vectors each
+    manager = UserIndexManager(dimension=384, max_memory_bytes=2 * 10 * 384 * 4, loader=loader)
+
+    manager.get("a")
+    manager.get("b")
+    manager.get("a")  # "b" is now least recently used
+    manager.get("c")
+
+    assert "a" in manager
+    assert "b" not in manager
+    assert "c" in manager
+    assert manager.memory_bytes <= manager.max_memory_bytes
+
+    # Evicted partition is rebuilt on next access
+    assert manager.get("b").total_vectors == 10
+    assert calls.count("b") == 2
+
+
+def test_invalid_memory_budget_rejected():
+    """Test non-positive memory budget raises ValueError"""
+    with pytest.raises(ValueError, match="must be positive"):
+        UserIndexManager(max_memory_bytes=0)
+
+
+def test_remove_from_resident_partition():
+    """Test removals reach the user's partition and compact it inline"""
+    corpus = {"alice": ([1, 2], np.random.randn(2, 384).astype(np.float32))}
+    loader, _ = make_loader(corpus)
+    manager = UserIndexManager(dimension=384, loader=loader)
+    manager.get("alice")
+
+    assert manager.remove([1], user_id="alice") == 1
+    assert manager.get("alice").something_ids.tolist() == [2]  # 50% tombstones -> compacted
+
+
+def test_planner_picks_structure_from_partition_size():
+    """Test small partitions are exact, grow into FAISS past the threshold and shrink back after compaction"""
+    from app.ml.exact_partition import ExactPartition
+    from app.ml.vector_index import VectorIndex
+
+    embeddings = np.random.randn(12, 384).astype(np.float32)
+    corpus = {"alice": ([1, 2, 3], embeddings[:3]), "bob": (list(range(100, 112)), embeddings)}
+    loader, _ = make_loader(corpus)
+    manager = UserIndexManager(dimension=384, loader=loader, exact_max_vectors=4, ann_min_vectors=10)
+
+    assert isinstance(manager.get("alice"), ExactPartition)
+    assert manager.get("bob").index_type == "hnsw"
+
+    manager.add("alice", 4, embeddings[3])
+    assert isinstance(manager.get("alice"), ExactPartition)
+    manager.add("alice", 5, embeddings[4])
+    partition = manager.get("alice")
+    assert isinstance(partition, VectorIndex) and partition.index_type == "flat"
+    assert manager.search("alice", embeddings[4], top_k=1)[0][0] == 5
+
+    # 3 of 5 tombstoned passes the compaction threshold; 2 live vectors fit half the exact budget
+    assert manager.remove([1, 2, 3], user_id="alice") == 3
+    assert isinstance(manager.get("alice"), ExactPartition)
+    assert sorted(manager.get("alice").something_ids.tolist()) == [4, 5]
+    assert manager.search("alice", embeddings[3], top_k=1)[0][0] == 4
+
+
+def test_default_plan_needs_no_measurement():
+    """Test the exact/FAISS boundary is the fixed default, not timed on the first search"""
+    from unittest.mock import patch
+    from app.ml.user_index_manager import DEFAULT_EXACT_MAX_VECTORS
+
+    with patch("app.ml.exact_partition.time_search_paths") as timed:
+        manager = UserIndexManager(dimension=384)
+        assert manager.plan(DEFAULT_EXACT_MAX_VECTORS) == "exact"
+        assert manager.plan(DEFAULT_EXACT_MAX_VECTORS + 1) == "flat"
+    timed.assert_not_called()
@@ -3,6 +3,7 @@ import numpy as np
 import tempfile
 import os
 from app.ml.vector_index import VectorIndex
+from app.ml.vector_metadata import RecencyDecay, SearchFilter
 
 
 def test_vector_index_initialization():
@@ -25,7 +26,7 @@ def test_add_single_embedding():
 
     # Verify state
     assert index.total_vectors == 1
-    assert index.something_ids == [1]
+    assert index.something_ids.tolist() == [1]
 
 
 def test_add_batch_embeddings():
@@ -41,7 +42,7 @@ def test_add_batch_embeddings():
 
     # Verify state
     assert index.total_vectors == 5
-    assert index.something_ids == [1, 2, 3, 4, 5]
+    assert index.something_ids.tolist() == [1, 2, 3, 4, 5]
 
 
 def test_search_exact_match():
@@ -105,7 +106,7 @@ def test_save_and_load():
 
         assert success is True
         assert index2.total_vectors == 5
-        assert index2.something_ids == [10, 20, 30, 40, 50]
+        assert index2.something_ids.tolist() == [10, 20, 30, 40, 50]
 
         # Verify search results match original
         query = embeddings[2]  # Use third embedding as query
@@ -193,3 +194,734 @@ def test_invalid_top_k():
 
     with pytest.raises(ValueError, match="must be positive"):
         index.search(query, top_k=-5)
+
+
+def test_search_top_k_larger_than_index():
+    """Test top_k above index size returns only real results (no -1 padding)"""
+    index = VectorIndex(dimension=384)
+    index.add_batch([7, 8], np.random.randn(2, 384).astype(np.float32))
+
+    results = index.search(np.random.randn(384).astype(np.float32), top_k=10)
+
+    assert sorted(sid for sid, _ in results) == [7, 8]
+
+
+def test_get_embeddings():
+    """Test stored embeddings can be reconstructed by something_id"""
+    index = VectorIndex(dimension=384)
+    embeddings = np.random.randn(3, 384).astype(np.float32)
+    index.add_batch([10, 20, 30], embeddings)
+
+    found_ids, vectors = index.get_embeddings([30, 10, 99])
+
+    assert found_ids == [10, 30]
+    assert vectors.shape == (2, 384)
+    expected = embeddings[2] / np.linalg.norm(embeddings[2])
+    assert np.allclose(vectors[1], expected, atol=1e-5)
+
+
+def test_remove_excludes_from_search():
+    """Test removed vectors no longer appear in results or take top_k slots"""
+    index = VectorIndex(dimension=384)
+    embeddings = np.random.randn(5, 384).astype(np.float32)
+    index.add_batch([1, 2, 3, 4, 5], embeddings)
+
+    assert index.remove([2, 99]) == 1  # Unknown IDs are ignored
+    assert index.live_vectors == 4
+
+    results = index.search(embeddings[1], top_k=4)
+    ids = [sid for sid, _ in results]
+    assert 2 not in ids
+    assert len(ids) == 4  # Full top_k despite the tombstone
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "pq"])
+def test_tombstones_do_not_inflate_search_depth(index_type):
+    """Test searches skip tombstones without asking FAISS for k plus every tombstone (efSearch stays small for HNSW)"""
+    from unittest.mock import patch
+
+    index = VectorIndex(dimension=384, index_type=index_type)
+    embeddings = np.random.randn(3000, 384).astype(np.float32)
+    index.add_batch(list(range(1, 3001)), embeddings)
+    removed = list(range(1, 3001, 7))  # ~14%, below the compaction threshold
+    index.remove(removed)
+
+    requested = []
+    search_params = index._search_params
+    with patch.object(index, "_search_params", side_effect=lambda k, sel=None: requested.append(k) or search_params(k, sel)):
+        results = index.search_batch(embeddings[:20], top_k=10)
+
+    assert max(requested) <= 10 * max(index.index_params.get("rerank_factor", 1), 2)
+    removed_set = set(removed)
+    for row in results:
+        assert len(row) == 10
+        assert not removed_set & {sid for sid, _ in row}
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "sq8"])
+def test_snapshot_is_independent_of_later_changes(tmp_path, index_type):
+    """Test a snapshot keeps the state it was taken in and saves like the original would have"""
+    index = VectorIndex(dimension=384, index_type=index_type)
+    embeddings = np.random.randn(1200, 384).astype(np.float32)
+    index.add_batch(list(range(1, 1201)), embeddings)
+    index.remove([5])
+    index.log_seq = 7
+
+    snapshot = index.snapshot()
+    index.add(1201, np.random.randn(384).astype(np.float32))
+    index.remove([6])
+    index.log_seq = 9
+
+    path = str(tmp_path / "snapshot.faiss")
+    snapshot.save(path)
+    loaded = VectorIndex(dimension=384)
+    loaded.load(path)
+    assert loaded.index_type == index_type
+    assert loaded.log_seq == 7
+    assert sorted(loaded.something_ids.tolist()) == [i for i in range(1, 1201) if i != 5]
+    assert index.live_vectors == 1199 and index.contains([1201, 6]).tolist() == [True, False]
+    assert loaded.search(embeddings[9], top_k=1)[0][0] == 10
+
+
+def test_compact_rewrites_index():
+    """Test compaction physically drops tombstoned vectors"""
+    index = VectorIndex(dimension=384, compaction_threshold=0.5)
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    index.add_batch([1, 2, 3, 4], embeddings)
+
+    index.remove([1])
+    assert not index.needs_compaction()
+    index.remove([3])
+    assert index.needs_compaction()
+
+    assert index.compact() == 2
+    assert index.total_vectors == 2
+    assert index.something_ids.tolist() == [2, 4]
+    assert index.tombstone_ratio == 0.0
+    assert index.search(embeddings[3], top_k=1)[0][0] == 4
+
+
+def test_save_compacts_tombstones():
+    """Test deleted vectors are not persisted"""
+    index = VectorIndex(dimension=384)
+    index.add_batch([1, 2, 3], np.random.randn(3, 384).astype(np.float32))
+    index.remove([2])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath)
+
+    assert loaded.something_ids.tolist() == [1, 3]
+    assert loaded.total_vectors == 2
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf"])
+def test_approximate_index_types(index_type):
+    """Test HNSW/IVF indices find exact matches and survive save/load"""
+    params = {"nlist": 4} if index_type == "ivf" else None
+    index = VectorIndex(dimension=384, index_type=index_type, index_params=params)
+    embeddings = np.random.randn(200, 384).astype(np.float32)
+    index.add_batch(list(range(200)), embeddings)
+
+    assert index.search(embeddings[42], top_k=1)[0][0] == 42
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+
+        loaded = VectorIndex(dimension=384)  # Defaults to flat
+        loaded.load(filepath)
+
+    assert loaded.index_type == index_type
+    assert loaded.index_params == index.index_params
+    assert loaded.search(embeddings[7], top_k=1)[0][0] == 7
+
+
+def test_needs_upgrade_and_rebuild():
+    """Test a flat index reports the auto threshold and rebuilds as ANN"""
+    index = VectorIndex(dimension=384, auto_index_threshold=50, auto_index_type="ivf")
+    embeddings = np.random.randn(60, 384).astype(np.float32)
+    index.add_batch(list(range(40)), embeddings[:40])
+    assert not index.needs_upgrade()
+
+    index.add_batch(list(range(40, 60)), embeddings[40:])
+    assert index.needs_upgrade()
+
+    index.rebuild(index_params={"nlist": 2})
+    assert index.index_type == "ivf"
+    assert index.index_params["nlist"] == 2
+    assert not index.needs_upgrade()
+    assert index.search(embeddings[10], top_k=1)[0][0] == 10
+
+
+def test_ivf_trains_with_full_nlist_once_enough_vectors_arrive():
+    """Test an IVF index stays exact until every list gets enough training points, instead of locking in a tiny nlist"""
+    import faiss
+
+    index = VectorIndex(dimension=32, index_type="ivf", index_params={"nlist": 8})
+    embeddings = np.random.randn(400, 32).astype(np.float32)
+    index.add(0, embeddings[0])
+    assert isinstance(index.index, faiss.IndexFlat)
+    index.add_batch(list(range(1, 300)), embeddings[1:300])
+    assert isinstance(index.index, faiss.IndexFlat)  # 300 < 8 * 39
+    assert index.search(embeddings[5], top_k=1)[0][0] == 5
+
+    index.add_batch(list(range(300, 400)), embeddings[300:])
+    assert isinstance(index.index, faiss.IndexIVF)
+    assert index.index.nlist == index.index_params["nlist"] == 8
+    assert index.search(embeddings[5], top_k=1)[0][0] == 5
+
+
+def test_invalid_index_type_rejected():
+    """Test unknown index types and params raise ValueError"""
+    with pytest.raises(ValueError, match="Unknown index_type"):
+        VectorIndex(dimension=384, index_type="lsh")
+
+    with pytest.raises(ValueError, match="Unknown hnsw index params"):
+        VectorIndex(dimension=384, index_type="hnsw", index_params={"nprobe": 4})
+
+
+def test_ids_saved_as_versioned_binary():
+    """Test id mapping is written as a raw int64 array (no pickle) and memory-mapped on load"""
+    from app.ml.index_io import IDS_MAGIC, IDS_HEADER_SIZE
+
+    index = VectorIndex(dimension=384)
+    index.add_batch([10, 20, 30], np.random.randn(3, 384).astype(np.float32))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+
+        with open(filepath + ".ids", "rb") as f:
+            raw = f.read()
+        assert raw.startswith(IDS_MAGIC)
+        assert np.frombuffer(raw[IDS_HEADER_SIZE:], dtype="<i8").tolist() == [10, 20, 30]
+
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath)
+        assert isinstance(loaded.something_ids, np.memmap)
+
+        # First add copies the mapping to the heap; the file stays untouched
+        loaded.add(40, np.random.randn(384).astype(np.float32))
+        assert loaded.something_ids.tolist() == [10, 20, 30, 40]
+        assert np.frombuffer(open(filepath + ".ids", "rb").read()[IDS_HEADER_SIZE:], dtype="<i8").tolist() == [10, 20, 30]
+
+
+def test_load_legacy_pickled_ids():
+    """Test artifacts saved with a pickled id list still load"""
+    import pickle
+    import faiss
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "legacy.faiss")
+        legacy = faiss.IndexFlatIP(384)
+        legacy.add(np.random.randn(2, 384).astype(np.float32))
+        faiss.write_index(legacy, filepath)
+        with open(filepath + ".ids", "wb") as f:
+            pickle.dump([5, 6], f)
+
+        index = VectorIndex(dimension=384)
+        assert index.load(filepath) is True
+
+    assert index.something_ids.tolist() == [5, 6]
+    assert index.index_type == "flat"
+
+
+def write_legacy_manifest(filepath):
+    """Rewrite a .meta file the way it looked before manifests carried checksums"""
+    import json
+    with open(filepath + ".meta") as f:
+        meta = json.load(f)
+    with open(filepath + ".meta", "w") as f:
+        json.dump({key: meta[key] for key in ("dimension", "index_type", "index_params", "log_seq")}, f)
+
+
+def test_load_rejects_mismatched_id_count():
+    """Test a truncated or mismatched id mapping fails loudly"""
+    from app.ml.index_io import write_ids
+
+    index = VectorIndex(dimension=384)
+    index.add_batch([1, 2], np.random.randn(2, 384).astype(np.float32))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+        write_ids(filepath + ".ids", np.array([1], dtype=np.int64))
+
+        with pytest.raises(ValueError, match="Checksum mismatch for .*\\.ids"):
+            VectorIndex(dimension=384).load(filepath)
+
+        write_legacy_manifest(filepath)
+        with pytest.raises(ValueError, match="Id mapping has 1 entries"):
+            VectorIndex(dimension=384).load(filepath)
+
+
+def test_manifest_is_validated_on_load():
+    """Test the manifest records what was saved and a mismatched model or corrupt file is rejected"""
+    import json
+
+    index = VectorIndex(dimension=384, model="all-MiniLM-L6-v2")
+    index.add_batch([1, 2], np.random.randn(2, 384).astype(np.float32))
+    index.generation = 3
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+        with open(filepath + ".meta") as f:
+            meta = json.load(f)
+        assert meta["model"] == "all-MiniLM-L6-v2"
+        assert meta["count"] == 2
+        assert set(meta["checksums"]) == {"", ".ids", ".metadata"}
+
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath)
+        assert (loaded.model, loaded.generation) == ("all-MiniLM-L6-v2", 3)
+
+        current = VectorIndex(dimension=384, model="other-model")
+        current.add(7, np.random.randn(384).astype(np.float32))
+        with pytest.raises(ValueError, match="built with model all-MiniLM-L6-v2"):
+            current.load(filepath)
+        assert current.something_ids.tolist() == [7]  # Untouched by the failed load
+
+        with open(filepath, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"\x00" if f.read(1) != b"\x00" else b"\x01")
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            VectorIndex(dimension=384).load(filepath)
+
+
+def test_clone_copies_live_vectors():
+    """Test a clone holds the live vectors and metadata and is independent of the original"""
+    index = VectorIndex(dimension=384, index_type="hnsw", model="m")
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    index.add_batch([1, 2, 3, 4], embeddings, user_ids=["alice", "bob", "alice", "bob"])
+    index.remove([2])
+    index.log_seq = 12
+
+    clone = index.clone()
+    assert clone.index_type == "flat"
+    assert clone.something_ids.tolist() == [1, 3, 4]
+    assert (clone.log_seq, clone.model) == (12, "m")
+    results = clone.search(embeddings[3], top_k=3, search_filter=SearchFilter(user_id="bob"))
+    assert [sid for sid, _ in results] == [4]
+
+    clone.rebuild("hnsw")
+    clone.add(5, embeddings[1])
+    assert index.total_vectors == 4 and 5 not in index.something_ids
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_mmap_load_with_delta_buffer(index_type):
+    """Test mmap loading serves searches and buffers new vectors in memory"""
+    index = VectorIndex(dimension=384, index_type=index_type)
+    embeddings = np.random.randn(50, 384).astype(np.float32)
+    index.add_batch(list(range(50)), embeddings)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+
+        mapped = VectorIndex(dimension=384)
+        mapped.load(filepath, mmap=True)
+        assert mapped.is_mmapped
+        assert mapped.index_type == index_type
+        assert mapped.search(embeddings[3], top_k=1)[0][0] == 3
+
+        # New vectors land in the delta buffer and are searchable
+        new_embedding = np.random.randn(384).astype(np.float32)
+        mapped.add(100, new_embedding)
+        assert mapped.delta_index.ntotal == 1
+        assert mapped.total_vectors == 51
+        assert mapped.search(new_embedding, top_k=1)[0][0] == 100
+        assert mapped.get_embeddings([100, 3])[0] == [3, 100]
+
+        # Removal spans both; saving merges everything into one index
+        mapped.remove([3, 100])
+        resaved = os.path.join(tmpdir, "resaved.faiss")
+        mapped.save(resaved)
+        assert not mapped.is_mmapped
+
+        reloaded = VectorIndex(dimension=384)
+        reloaded.load(resaved)
+
+    assert reloaded.total_vectors == 49
+    assert 3 not in reloaded.something_ids.tolist()
+
+
+def test_contains_and_log_seq_round_trip():
+    """Test contains() ignores tombstones and log_seq survives save/load"""
+    index = VectorIndex(dimension=384)
+    index.add_batch([1, 2, 3], np.random.randn(3, 384).astype(np.float32))
+    index.remove([2])
+    index.log_seq = 42
+
+    assert index.contains([1, 2, 3, 4]).tolist() == [True, False, True, False]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test.faiss")
+        index.save(filepath)
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath)
+
+    assert loaded.log_seq == 42
+
+
+def test_search_batch_matches_single_searches():
+    """Test search_batch returns the same results as one search() per query"""
+    index = VectorIndex(dimension=384)
+    embeddings = np.random.randn(50, 384).astype(np.float32)
+    index.add_batch(list(range(50)), embeddings)
+    index.remove([0])
+
+    queries = np.vstack([embeddings[:5], np.random.randn(3, 384).astype(np.float32)])
+    batch_results = index.search_batch(queries, top_k=4)
+
+    assert len(batch_results) == 8
+    for query, results in zip(queries, batch_results):
+        single = index.search(query, top_k=4)
+        assert [sid for sid, _ in results] == [sid for sid, _ in single]
+        np.testing.assert_allclose([s for _, s in results], [s for _, s in single], rtol=1e-5)
+    assert all(0 not in [sid for sid, _ in r] for r in batch_results)
+    assert batch_results[1][0][0] == 1
+
+
+def test_search_batch_validation():
+    """Test search_batch rejects malformed queries and handles empty input"""
+    index = VectorIndex(dimension=384)
+    assert index.search_batch(np.random.randn(2, 384).astype(np.float32)) == [[], []]
+
+    index.add(1, np.random.randn(384).astype(np.float32))
+    assert index.search_batch(np.empty((0, 384), dtype=np.float32)) == []
+
+    with pytest.raises(ValueError, match="2D"):
+        index.search_batch(np.random.randn(384).astype(np.float32))
+    with pytest.raises(ValueError, match="dimension mismatch"):
+        index.search_batch(np.random.randn(2, 128).astype(np.float32))
+    with pytest.raises(ValueError, match=r"indices \[1\]"):
+        index.search_batch(np.vstack([np.ones(384), np.zeros(384)]).astype(np.float32))
+    with pytest.raises(ValueError, match="top_k"):
+        index.search_batch(np.random.randn(2, 384).astype(np.float32), top_k=0)
+
+
+@pytest.mark.parametrize("index_type,params,train_points", [
+    ("sq8", None, 1000),
+    ("pq", {"nbits": 4}, 16 * 39),
+    ("pca", None, 1000),
+    ("rp", {"dim": 96}, 1000),
+])
+def test_quantized_index_types(index_type, params, train_points):
+    """Test SQ8/PQ/reduced-dimension indices stay exact until trainable, then re-score shortlists exactly"""
+    index = VectorIndex(dimension=384, index_type=index_type, index_params=params)
+    embeddings = np.random.randn(train_points, 384).astype(np.float32)
+
+    index.add_batch(list(range(train_points - 1)), embeddings[:-1])
+    assert not index.is_quantized  # Exact warm-up index
+    index.add(train_points - 1, embeddings[-1])
+    assert index.is_quantized
+
+    # Scores come from the full-precision store, not the compressed codes
+    sid, similarity = index.search(embeddings[42], top_k=1)[0]
+    assert sid == 42
+    assert similarity == pytest.approx(1.0, abs=1e-5)
+    assert index.get_embeddings([42])[1][0] == pytest.approx(embeddings[42] / np.linalg.norm(embeddings[42]), abs=1e-6)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+        assert os.path.exists(filepath + ".vectors")
+
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath, mmap=True)
+        assert loaded.index_type == index_type
+        assert loaded.is_quantized
+        assert loaded.vector_store.resident_bytes == 0  # Full-precision rows stay on disk
+
+        new_embedding = np.random.randn(384).astype(np.float32)
+        loaded.add(10_000, new_embedding)
+        assert loaded.search(new_embedding, top_k=1)[0][0] == 10_000
+        assert loaded.search(embeddings[7], top_k=1)[0][0] == 7
+
+
+def test_rebuild_flat_to_quantized_and_back():
+    """Test rebuilding converts between exact and quantized storage"""
+    index = VectorIndex(dimension=384)
+    embeddings = np.random.randn(1000, 384).astype(np.float32)
+    index.add_batch(list(range(1000)), embeddings)
+
+    index.rebuild("sq8")
+    assert index.is_quantized
+    assert len(index.vector_store) == 1000
+
+    index.remove([0])
+    index.compact()
+    assert len(index.vector_store) == 999
+    assert index.search(embeddings[5], top_k=1)[0][0] == 5
+
+    index.rebuild("flat")
+    assert index.vector_store is None
+    assert index.search(embeddings[5], top_k=1)[0][0] == 5
+
+
+@pytest.mark.parametrize("index_type,params", [
+    ("flat", None),
+    ("hnsw", None),
+    ("ivf", {"nlist": 16}),
+    ("sq8", None),
+    ("pq", {"m": 8, "nbits": 4}),
+    ("pca", {"dim": 8}),
+    ("rp", {"dim": 16}),
+    ("binary", None),
+])
+def test_filtered_search_returns_full_top_k(index_type, params):
+    """Test selective and broad filters both fill top_k with matching vectors only"""
+    index = VectorIndex(dimension=32, index_type=index_type, index_params=params)
+    n = 10_000
+    embeddings = np.random.randn(n, 32).astype(np.float32)
+    users = ["alice" if i % 50 == 0 else "bob" for i in range(n)]
+    content_types = ["text" if i % 2 else "image" for i in range(n)]
+    index.add_batch(list(range(n)), embeddings, user_ids=users, content_types=content_types)
+    index.remove([0])
+
+    # 199 candidates: scored exactly
+    results = index.search(embeddings[100], top_k=10, search_filter=SearchFilter(user_id="alice"))
+    assert len(results) == 10
+    assert results[0][0] == 100
+    assert all(sid % 50 == 0 and sid != 0 for sid, _ in results)
+
+    # 5000 candidates: pushed into the FAISS scan as an ID selector
+    results = index.search_batch(embeddings[[101, 103]], top_k=10, search_filter=SearchFilter(content_types=["text"]))
+    assert [r[0][0] for r in results] == [101, 103]
+    assert all(len(r) == 10 and all(sid % 2 == 1 for sid, _ in r) for r in results)
+
+
+def test_filtered_search_by_time_and_circles():
+    """Test created_at ranges and circle membership filters"""
+    from datetime import datetime, timedelta, timezone
+
+    index = VectorIndex(dimension=384)
+    now = datetime.now(timezone.utc)
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    created = [now - timedelta(days=d) for d in (1, 10, 40, 2)]
+    index.add_batch([1, 2, 3, 4], embeddings, user_ids=["alice"] * 4, created_at=created)
+    assert index.set_circles(1, [7])
+    assert index.set_circles(2, [7, 8])
+    assert not index.set_circles(99, [7])
+
+    recent = SearchFilter(created_after=now - timedelta(days=30))
+    assert {sid for sid, _ in index.search(embeddings[0], top_k=5, search_filter=recent)} == {1, 2, 4}
+    in_circle = SearchFilter(circle_ids=[7])
+    assert {sid for sid, _ in index.search(embeddings[0], top_k=5, search_filter=in_circle)} == {1, 2}
+    outside_circle = SearchFilter(exclude_circle_ids=[8])
+    assert {sid for sid, _ in index.search(embeddings[0], top_k=5, search_filter=outside_circle)} == {1, 3, 4}
+    assert index.search(embeddings[0], top_k=5, search_filter=SearchFilter(user_id="bob")) == []
+
+
+def test_metadata_survives_compaction_save_and_mmap_load():
+    """Test metadata stays aligned with positions through compaction, save/load and delta adds"""
+    index = VectorIndex(dimension=384)
+    embeddings = np.random.randn(6, 384).astype(np.float32)
+    index.add_batch([1, 2, 3, 4, 5], embeddings[:5], user_ids=["alice", "bob"] * 2 + ["alice"])
+    index.remove([1, 2])
+    index.compact()
+    alice = SearchFilter(user_id="alice")
+    assert {sid for sid, _ in index.search(embeddings[0], top_k=5, search_filter=alice)} == {3, 5}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+        assert os.path.exists(filepath + ".metadata")
+
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath, mmap=True)
+        loaded.add(6, embeddings[5], user_id="alice", content_type="text")
+        results = loaded.search(embeddings[5], top_k=5, search_filter=alice)
+        assert [sid for sid, _ in results][0] == 6
+        assert {sid for sid, _ in results} == {3, 5, 6}
+
+        # Artifacts without a .metadata file load with unknown metadata to backfill
+        os.remove(filepath + ".metadata")
+        write_legacy_manifest(filepath)
+        legacy = VectorIndex(dimension=384)
+        legacy.load(filepath)
+        assert legacy.missing_metadata_ids == [3, 4, 5]
+        legacy.set_metadata([5, 99], user_ids=["alice", "bob"], content_types=["text", "text"])
+        assert legacy.missing_metadata_ids == [3, 4]
+
+
+def test_add_rejects_unknown_content_type():
+    """Test metadata is validated before the vector is added"""
+    index = VectorIndex(dimension=384)
+    with pytest.raises(ValueError, match="Unknown content types"):
+        index.add(1, np.random.randn(384).astype(np.float32), content_type="audio")
+    with pytest.raises(ValueError, match="user_ids has 1 entries"):
+        index.add_batch([1, 2], np.random.randn(2, 384).astype(np.float32), user_ids=["alice"])
+    assert index.total_vectors == 0
+
+
+@pytest.mark.parametrize("index_type,params", [
+    ("flat", None),
+    ("hnsw", None),
+    ("ivf", {"nlist": 16}),
+    ("sq8", None),
+    ("pq", {"m": 8, "nbits": 4}),
+    ("pca", {"dim": 8}),
+    ("rp", {"dim": 16}),
+    ("binary", None),
+])
+def test_range_search_returns_every_near_duplicate(index_type, params):
+    """Test range search returns all live vectors above the threshold, best first"""
+    index = VectorIndex(dimension=32, index_type=index_type, index_params=params)
+    n = 10_000
+    embeddings = np.random.randn(n, 32).astype(np.float32)
+    embeddings[5000:5004] = embeddings[10] + 0.01 * np.random.randn(4, 32).astype(np.float32)
+    users = ["alice" if i % 2 else "bob" for i in range(n)]
+    index.add_batch(list(range(n)), embeddings, user_ids=users)
+    index.remove([5003])
+
+    results = index.range_search(embeddings[10], min_similarity=0.95)
+    assert {sid for sid, _ in results} == {10, 5000, 5001, 5002}
+    assert results[0][0] == 10
+    assert all(a[1] >= b[1] >= 0.95 for a, b in zip(results, results[1:]))
+
+    # Filtered: only alice's (odd) near-duplicates
+    results = index.range_search_batch(embeddings[[10, 11]], 0.95, search_filter=SearchFilter(user_id="alice"))
+    assert [sid for sid, _ in results[0]] == [5001]
+    assert [sid for sid, _ in results[1]] == [11]
+
+
+def test_range_search_validation_and_empty_index():
+    """Test range search input validation"""
+    index = VectorIndex(dimension=384)
+    query = np.random.randn(384).astype(np.float32)
+    assert index.range_search(query, 0.9) == []
+
+    index.add(1, query)
+    with pytest.raises(ValueError, match="min_similarity"):
+        index.range_search(query, 1.5)
+    with pytest.raises(ValueError, match="1D"):
+        index.range_search(np.random.randn(2, 384).astype(np.float32), 0.9)
+    with pytest.raises(ValueError, match="zero or near-zero norm"):
+        index.range_search(np.zeros(384, dtype=np.float32), 0.9)
+    assert index.range_search_batch(np.empty((0, 384), dtype=np.float32), 0.9) == []
+
+
+def test_reduced_dimension_index_cuts_first_stage_memory():
+    """Test a PCA first pass stores dim floats per vector, finds the exact top-k and round-trips its projection"""
+    index = VectorIndex(dimension=384, index_type="pca", index_params={"dim": 64})
+    embeddings = np.random.randn(2000, 384).astype(np.float32)
+    index.add_batch(list(range(2000)), embeddings)
+    exact = VectorIndex(dimension=384)
+    exact.add_batch(list(range(2000)), embeddings)
+
+    assert (index.index.index.d, index.index.index.ntotal) == (64, 2000)  # First stage holds 64 floats per vector
+    for query in embeddings[:5]:
+        (sid, similarity), = index.search(query, top_k=1)
+        (exact_sid, exact_similarity), = exact.search(query, top_k=1)
+        assert sid == exact_sid and similarity == pytest.approx(exact_similarity, abs=1e-5)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+        os.remove(filepath + ".meta")  # Type and dim are recovered from the stored projection
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath)
+        assert (loaded.index_type, loaded.index_params["dim"]) == ("pca", 64)
+        assert loaded.search(embeddings[3], top_k=1)[0][0] == 3
+
+    with pytest.raises(ValueError, match="dim=512"):
+        VectorIndex(dimension=384, index_type="rp", index_params={"dim": 512}).add_batch(
+            list(range(1000)), np.random.randn(1000, 384).astype(np.float32)
+        )
+
+
+def test_binary_index_shortlists_by_hamming_distance():
+    """Test the sign-hash index keeps 48-byte codes, re-scores exactly and round-trips through mmap with a delta"""
+    from app.ml.binary_codes import hamming_distances, sign_codes
+
+    index = VectorIndex(dimension=384, index_type="binary")
+    embeddings = np.random.randn(2000, 384).astype(np.float32)
+    index.add_batch(list(range(2000)), embeddings)
+    assert index.is_quantized  # Nothing to train: codes from the first add
+    assert (index.index.code_size, index.index.ntotal) == (48, 2000)
+
+    codes = sign_codes(embeddings[:3])
+    assert codes.shape == (3, 6)
+    assert hamming_distances(codes, codes).diagonal().tolist() == [0, 0, 0]
+    assert hamming_distances(codes[:1], sign_codes(-embeddings[:1]))[0, 0] == 384
+
+    sid, similarity = index.search(embeddings[42], top_k=1)[0]
+    assert sid == 42
+    assert similarity == pytest.approx(1.0, abs=1e-5)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        index.save(filepath)
+        os.remove(filepath + ".meta")  # Type is recovered from the stored IndexLSH
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath, mmap=True)
+        assert loaded.index_type == "binary"
+
+        new_embedding = np.random.randn(384).astype(np.float32)
+        loaded.add(10_000, new_embedding)
+        assert loaded.search(new_embedding, top_k=1)[0][0] == 10_000
+        assert loaded.search(embeddings[7], top_k=1)[0][0] == 7
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_recency_search_matches_brute_force_ranking(index_type):
+    """Test recency-weighted search returns the exact top-k of similarity plus boost, filtered or not"""
+    from datetime import datetime, timedelta, timezone
+
+    now = datetime.now(timezone.utc)
+    index = VectorIndex(dimension=32, index_type=index_type)
+    n = 3000
+    embeddings = np.random.randn(n, 32).astype(np.float32)
+    ages = np.random.uniform(0, 90, n)
+    users = ["alice" if i % 2 else "bob" for i in range(n)]
+    index.add_batch(list(range(n)), embeddings, user_ids=users, created_at=[now - timedelta(days=a) for a in ages])
+    index.remove([1])
+
+    recency = RecencyDecay(timedelta(days=7), weight=0.3, now=now)
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = embeddings[:3]
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit.T + 0.3 * 0.5 ** (ages / 7)
+    scores[:, 1] = -np.inf
+
+    results = index.search_batch(queries, top_k=10, recency=recency)
+    for row, result in zip(scores, results):
+        assert [sid for sid, _ in result] == np.argsort(-row)[:10].tolist()
+        assert [s for _, s in result] == pytest.approx(np.sort(row)[::-1][:10], abs=1e-4)
+
+    scores[:, ::2] = -np.inf  # Only alice's (odd) vectors
+    result = index.search(queries[0], top_k=10, search_filter=SearchFilter(user_id="alice"), recency=recency)
+    assert [sid for sid, _ in result] == np.argsort(-scores[0])[:10].tolist()
+
+
+def test_float16_vector_store_keeps_cosine_ranking():
+    """Test a float16 re-scoring store halves the sidecar and leaves top-k rankings and scores practically unchanged"""
+    embeddings = np.random.randn(3000, 384).astype(np.float32)
+    queries = embeddings[:50] + 0.5 * np.random.randn(50, 384).astype(np.float32)
+    full = VectorIndex(dimension=384, index_type="sq8")
+    half = VectorIndex(dimension=384, index_type="sq8", vector_dtype="float16")
+    full.add_batch(list(range(3000)), embeddings)
+    half.add_batch(list(range(3000)), embeddings)
+    assert half.vector_store.resident_bytes * 2 == full.vector_store.resident_bytes
+
+    full_results = full.search_batch(queries, top_k=10)
+    half_results = half.search_batch(queries, top_k=10)
+    overlap = np.mean([len({i for i, _ in a} & {i for i, _ in b}) / 10 for a, b in zip(full_results, half_results)])
+    assert overlap >= 0.99
+    assert [r[0][0] for r in half_results] == [r[0][0] for r in full_results]
+    assert max(abs(a[0][1] - b[0][1]) for a, b in zip(full_results, half_results)) < 1e-3
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "test_index.faiss")
+        half.save(filepath)
+        loaded = VectorIndex(dimension=384)
+        loaded.load(filepath, mmap=True)
+        assert loaded.vector_dtype == "float16"
+        assert loaded.search(embeddings[9], top_k=1)[0][0] == 9
+        assert loaded.clone().vector_dtype == "float16"
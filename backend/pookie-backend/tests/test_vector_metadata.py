@@ -0,0 +1,106 @@
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from app.ml.vector_metadata import MAX_CIRCLES_PER_USER, RecencyDecay, SearchFilter, VectorMetadata
+
+
+def test_append_and_mask():
+    """Test each filter condition narrows the mask and unknown rows never match"""
+    metadata = VectorMetadata()
+    jan, mar = datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 3, 1, tzinfo=timezone.utc)
+    metadata.append(3, user_ids=["alice", "bob", "alice"], content_types=["text", "url", "image"], created_at=[jan, mar, mar])
+    metadata.append(1)
+
+    assert len(metadata) == 4
+    assert metadata.mask(SearchFilter(user_id="alice")).tolist() == [True, False, True, False]
+    assert metadata.mask(SearchFilter(content_types=["text", "url"])).tolist() == [True, True, False, False]
+    assert metadata.mask(SearchFilter(created_after=mar)).tolist() == [False, True, True, False]
+    assert metadata.mask(SearchFilter(created_before=mar)).tolist() == [True, False, False, True]
+    assert metadata.mask(SearchFilter(user_id="carol")).tolist() == [False] * 4
+    assert metadata.missing_positions.tolist() == [3]
+
+
+def test_circle_bits_are_per_user():
+    """Test circles are matched by owner and a user's bits are capped"""
+    metadata = VectorMetadata()
+    metadata.append(2, user_ids=["alice", "bob"])
+    metadata.set_circles(np.array([0]), [10, 11])
+    metadata.set_circles(np.array([1]), [20])
+
+    # Both users' first circle share bit 0 without matching each other's vectors
+    assert metadata.circle_bits[10][1] == metadata.circle_bits[20][1] == 0
+    assert metadata.mask(SearchFilter(circle_ids=[20])).tolist() == [False, True]
+    assert metadata.mask(SearchFilter(exclude_circle_ids=[11])).tolist() == [False, True]
+
+    with pytest.raises(ValueError, match="circles"):
+        metadata.set_circles(np.array([0]), range(100, 100 + MAX_CIRCLES_PER_USER))
+
+
+def test_empty_circle_bits_are_reused():
+    """Test a new circle takes the lowest bit of a circle left without members once the owner's bits run out"""
+    metadata = VectorMetadata()
+    metadata.append(3, user_ids=["alice", "alice", "bob"])
+    metadata.set_circles(np.array([0]), [10, 11, 12] + list(range(100, 100 + MAX_CIRCLES_PER_USER - 3)))
+    metadata.set_circles(np.array([1]), [11])
+    metadata.set_circles(np.array([2]), [20])
+
+    # Circle 11 loses its members (e.g. it was deleted), then alice needs a new circle
+    metadata.set_circles(np.array([0]), [10, 12] + list(range(100, 100 + MAX_CIRCLES_PER_USER - 3)))
+    metadata.set_circles(np.array([1]), [])
+    metadata.set_circles(np.array([1]), [13])
+    assert 11 not in metadata.circle_bits
+    assert metadata.circle_bits[13] == (metadata.circle_bits[10][0], 1)
+    assert metadata.mask(SearchFilter(circle_ids=[13])).tolist() == [False, True, False]
+    assert metadata.mask(SearchFilter(circle_ids=[10, 12])).tolist() == [True, False, False]
+    assert metadata.mask(SearchFilter(circle_ids=[20])).tolist() == [False, False, True]
+
+    # Circles in the new assignment are never reclaimed
+    metadata.set_circles(np.array([0]), [])
+    metadata.set_circles(np.array([1]), [13, 200])
+    assert metadata.circle_bits[200][1] == 0
+    assert 10 not in metadata.circle_bits
+    assert metadata.mask(SearchFilter(circle_ids=[200])).tolist() == [False, True, False]
+    assert metadata.mask(SearchFilter(circle_ids=[10, 100])).tolist() == [False, False, False]
+
+
+def test_take_save_and_load(tmp_path):
+    """Test rows can be selected and round-trip through an .npz file"""
+    metadata = VectorMetadata()
+    metadata.append(3, user_ids=["alice", "bob", "alice"], content_types=["text", None, "url"])
+    metadata.set_circles(np.array([2]), [5])
+    taken = metadata.take(np.array([1, 2]))
+
+    filepath = os.path.join(tmp_path, "test.metadata")
+    taken.save(filepath)
+    loaded = VectorMetadata.load(filepath)
+
+    assert len(loaded) == 2
+    assert loaded.missing_positions.tolist() == [0]
+    assert loaded.mask(SearchFilter(user_id="alice", circle_ids=[5])).tolist() == [False, True]
+    loaded.append(1, user_ids=["bob"])
+    assert loaded.mask(SearchFilter(user_id="bob")).tolist() == [True, False, True]
+
+
+def test_invalid_columns_rejected():
+    """Test length and content type validation"""
+    metadata = VectorMetadata()
+    with pytest.raises(ValueError, match="content_types has 1 entries"):
+        metadata.append(2, content_types=["text"])
+    with pytest.raises(ValueError, match="Unknown content types"):
+        SearchFilter(content_types=["audio"])
+    assert len(metadata) == 0
+
+
+def test_recency_boosts_halve_every_half_life():
+    """Test the recency boost decays by half per half-life, with no boost for unknown times"""
+    now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    recency = RecencyDecay(timedelta(days=7), weight=0.2, now=now)
+    created_at = np.array([now.timestamp(), (now - timedelta(days=7)).timestamp(),
+                           (now - timedelta(days=14)).timestamp(), (now + timedelta(days=1)).timestamp(), 0])
+    assert recency.boosts(created_at) == pytest.approx([0.2, 0.1, 0.05, 0.2, 0.0])
+
+    with pytest.raises(ValueError, match="half_life"):
+        RecencyDecay(timedelta(0))
+    with pytest.raises(ValueError, match="weight"):
+        RecencyDecay(timedelta(days=1), weight=-0.1)
@@ -1,17 +1,22 @@
 import pytest
+import uuid
 import numpy as np
 from unittest.mock import Mock, patch, AsyncMock, MagicMock
+from app.services.index_log_service import IndexLogService
 from app.services.vector_service import VectorService
 from app.ml.vector_index import VectorIndex
+from app.ml.vector_metadata import SearchFilter
 
 
 @pytest.fixture(autouse=True)
-def reset_singleton():
-    """Reset singleton between tests"""
+def reset_singleton(index_log):
+    """Reset singleton between tests and point new services at the test log"""
     from app.services import vector_service
     # Re-import the module to reset singleton
     import importlib
     importlib.reload(vector_service)
+    with patch.object(vector_service, "index_log_service", index_log):
+        yield
 
 
 def test_vector_service_initialization():
@@ -20,7 +25,7 @@ def test_vector_service_initialization():
 
     assert isinstance(service.index, VectorIndex)
     assert service.index.dimension == 384
-    assert service.bucket_name == "vector-indices"
+    assert service.storage.bucket_name == "vector-indices"
     assert service.index_filename == "somethings_index.faiss"
 
 
@@ -37,7 +42,7 @@ async def test_add_something_embedding():
 
     # Verify it was added
     assert service.index.total_vectors == 1
-    assert service.index.something_ids == [1]
+    assert service.index.something_ids.tolist() == [1]
 
 
 @pytest.mark.asyncio
@@ -63,7 +68,7 @@ async def test_search_similar():
 
 
 @pytest.mark.asyncio
-@patch('app.services.vector_service.create_client')
+@patch('app.services.index_storage.create_client')
 async def test_initialize_with_existing_index(mock_create_client):
     """Test initialize() loads index from Supabase Storage"""
     import tempfile
@@ -87,8 +92,9 @@ async def test_initialize_with_existing_index(mock_create_client):
             ids_bytes = f.read()
 
     # Setup mocks
+    # No version pointer: files of older uploads sit at the bucket root
     mock_bucket = MagicMock()
-    mock_bucket.download.side_effect = [faiss_bytes, ids_bytes]
+    mock_bucket.download.side_effect = [Exception("Not found"), faiss_bytes, ids_bytes, Exception("Not found"), Exception("Not found")]
     mock_storage = MagicMock()
     mock_storage.from_.return_value = mock_bucket
     mock_client = MagicMock()
@@ -103,11 +109,11 @@ async def test_initialize_with_existing_index(mock_create_client):
 
     # Verify index loaded
     assert service.index.total_vectors == 3
-    assert service.index.something_ids == [10, 20, 30]
+    assert service.index.something_ids.tolist() == [10, 20, 30]
 
 
 @pytest.mark.asyncio
-@patch('app.services.vector_service.create_client')
+@patch('app.services.index_storage.create_client')
 async def test_initialize_no_existing_index(mock_create_client):
     """Test initialize() handles missing index gracefully"""
     # Mock Supabase to raise exception (no index found)
@@ -130,7 +136,7 @@ async def test_initialize_no_existing_index(mock_create_client):
 
 
 @pytest.mark.asyncio
-@patch('app.services.vector_service.create_client')
+@patch('app.services.index_storage.create_client')
 async def test_save_to_storage(mock_create_client):
     """Test save_to_storage() uploads to Supabase"""
     # Mock Supabase client
@@ -152,12 +158,721 @@ async def test_save_to_storage(mock_create_client):
     # Save
     await service.save_to_storage()
 
-    # Verify upload was called twice (.faiss and .ids)
-    assert mock_bucket.upload.call_count == 2
+    # Verify the version's four files (.faiss, .ids, .metadata, then the .meta manifest) and the pointer were uploaded
+    assert mock_bucket.upload.call_count == 5
 
     # Check upload arguments
     calls = mock_bucket.upload.call_args_list
-    assert calls[0][0][0] == "somethings_index.faiss"
-    assert calls[1][0][0] == "somethings_index.faiss.ids"
-    assert calls[0][0][2] == {"upsert": "true"}
-    assert calls[1][0][2] == {"upsert": "true"}
+    assert calls[0][0][0] == f"{service.version}/somethings_index.faiss"
+    assert calls[1][0][0] == f"{service.version}/somethings_index.faiss.ids"
+    assert calls[2][0][0] == f"{service.version}/somethings_index.faiss.metadata"
+    assert calls[3][0][0] == f"{service.version}/somethings_index.faiss.meta"
+    assert calls[4][0][0] == "somethings_index.faiss.current"
+    assert all(call[0][2] == {"upsert": "true"} for call in calls)
+
+
+@pytest.mark.asyncio
+async def test_search_similar_scoped_to_user():
+    """Test user-scoped search only scans the user's partition"""
+    service = VectorService()
+
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    for i, emb in enumerate(embeddings):
+        await service.add_something_embedding(i + 1, emb.tolist())
+
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+
+    # Ownership comes from the somethings table; stub the lookup
+    def fake_loader(user_id):
+        owned = {alice: [1, 2], bob: [3, 4]}[user_id]
+        return service.index.get_embeddings(owned)
+
+    service.user_indices.loader = fake_loader
+
+    results = await service.search_similar(embeddings[3].tolist(), top_k=10, user_id=alice)
+    assert {sid for sid, _ in results} == {1, 2}
+
+    # New captures land in the resident partition without a reload
+    await service.add_something_embedding(5, embeddings[3].tolist(), user_id=alice)
+    results = await service.search_similar(embeddings[3].tolist(), top_k=1, user_id=alice)
+    assert results[0][0] == 5
+
+    # Duplicate checks on capture scan the partition too, not the global index
+    with patch.object(service.index, "range_search") as global_range_search:
+        duplicates = await service.range_search_similar(embeddings[3].tolist(), 0.99, user_id=alice)
+    assert [sid for sid, _ in duplicates] == [5]
+    global_range_search.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_remove_something_embedding_triggers_compaction():
+    """Test removal tombstones the vector and compacts in the background"""
+    service = VectorService()
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    service.index.add_batch([1, 2, 3, 4], embeddings)
+
+    assert await service.remove_something_embedding(1) is True
+    assert await service.remove_something_embedding(1) is False  # Already removed
+
+    results = await service.search_similar(embeddings[0].tolist(), top_k=4)
+    assert 1 not in [sid for sid, _ in results]
+
+    # 1/4 tombstoned passes the default 0.2 threshold
+    await service._maintenance_task
+    assert service.index.total_vectors == 3
+    assert service.index.something_ids.tolist() == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_add_past_threshold_upgrades_index_in_background():
+    """Test a flat index is rebuilt as HNSW once it passes the auto threshold"""
+    service = VectorService()
+    service.index.auto_index_threshold = 20
+    service.index.add_batch(list(range(1, 20)), np.random.randn(19, 384).astype(np.float32))
+    assert service.index.index_type == "flat"
+
+    await service.add_something_embedding(20, np.random.randn(384).tolist())
+    await service._maintenance_task
+
+    assert service.index.index_type == "hnsw"
+    assert service.index.total_vectors == 20
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_initialize_mmap_mode(mock_create_client, tmp_path):
+    """Test initialize() keeps artifacts in VECTOR_INDEX_DIR and maps them read-only"""
+    import os
+
+    source = VectorIndex(dimension=384)
+    source.add_batch([1, 2], np.random.randn(2, 384).astype(np.float32))
+    source_path = os.path.join(tmp_path, "source.faiss")
+    source.save(source_path)
+    payloads = [open(source_path + suffix, "rb").read() for suffix in ["", ".ids", ".metadata", ".meta"]]
+
+    mock_bucket = MagicMock()
+    mock_bucket.download.side_effect = [Exception("Not found")] + payloads
+    mock_create_client.return_value.storage.from_.return_value = mock_bucket
+
+    index_dir = os.path.join(tmp_path, "index")
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_MMAP', True), \
+         patch('app.services.vector_service.settings.VECTOR_INDEX_DIR', index_dir):
+        service = VectorService()
+        await service.initialize()
+
+    assert service.index.is_mmapped
+    assert service.index.something_ids.tolist() == [1, 2]
+    assert os.path.exists(os.path.join(index_dir, "somethings_index.faiss"))
+
+    await service.add_something_embedding(3, [0.1] * 384)
+    assert service.index.total_vectors == 3
+
+
+@pytest.mark.asyncio
+async def test_add_and_remove_append_to_index_log(index_log):
+    """Test each change is persisted as one log entry"""
+    service = VectorService()
+    embedding = np.random.randn(384).astype(np.float32)
+
+    user_id = str(uuid.uuid4())
+
+    await service.add_something_embedding(1, embedding.tolist(), user_id=user_id)
+    await service.remove_something_embedding(1, user_id=user_id)
+
+    entries = index_log.read_since(0)
+    assert [(e.op, e.something_id) for e in entries] == [("add", 1), ("remove", 1)]
+    np.testing.assert_allclose(index_log.decode_embedding(entries[0].embedding), embedding)
+
+
+def test_index_log_float16_embeddings():
+    """Test float16 log entries are half the size and decode alongside float32 ones"""
+    embedding = np.random.randn(384).astype(np.float32)
+    full = IndexLogService.encode_embedding(embedding)
+    half = IndexLogService.encode_embedding(embedding, "float16")
+    assert len(half) == len(full) // 2 + 1
+    np.testing.assert_allclose(IndexLogService.decode_embedding(half), embedding, rtol=1e-3, atol=1e-3)
+    np.testing.assert_array_equal(IndexLogService.decode_embedding(full), embedding)
+
+
+@pytest.mark.asyncio
+async def test_invalid_embedding_is_not_logged(index_log):
+    """Test embeddings rejected by the index never reach the log"""
+    service = VectorService()
+
+    with pytest.raises(ValueError):
+        await service.add_something_embedding(1, [0.0] * 384)
+
+    assert index_log.latest_seq() == 0
+    assert service.index.live_vectors == 0
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_initialize_replays_log_on_top_of_snapshot(mock_create_client, index_log, tmp_path):
+    """Test initialize() applies only log entries newer than the snapshot"""
+    import os
+
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    snapshot_seq = index_log.append_add(99, embeddings[3])  # Already reflected in the snapshot
+    index_log.append_add(30, embeddings[2])
+    index_log.append_remove(10)
+
+    snapshot = VectorIndex(dimension=384)
+    snapshot.add_batch([10, 20], embeddings[:2])
+    snapshot.log_seq = snapshot_seq
+    snapshot_path = os.path.join(tmp_path, "snapshot.faiss")
+    snapshot.save(snapshot_path)
+    payloads = [open(snapshot_path + suffix, "rb").read() for suffix in ["", ".ids", ".metadata", ".meta"]]
+
+    mock_bucket = MagicMock()
+    mock_bucket.download.side_effect = [Exception("Not found")] + payloads
+    mock_create_client.return_value.storage.from_.return_value = mock_bucket
+
+    service = VectorService()
+    await service.initialize()
+
+    assert sorted(service.index.something_ids[service.index._live_mask()].tolist()) == [20, 30]
+    assert service.index.log_seq == index_log.latest_seq()
+
+    # Replaying again is a no-op
+    await service._replay_log()
+    assert service.index.live_vectors == 2
+
+
+async def wait_for_uploads(mock_bucket, count, timeout=5.0):
+    """Poll until the flusher has made count uploads"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while mock_bucket.upload.call_count < count and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    assert mock_bucket.upload.call_count == count
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_flusher_snapshots_after_n_changes_and_prunes_log(mock_create_client, index_log):
+    """Test the flusher uploads once VECTOR_INDEX_SNAPSHOT_INTERVAL changes pile up and prunes the log behind it"""
+    mock_bucket = MagicMock()
+    mock_create_client.return_value.storage.from_.return_value = mock_bucket
+
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_SNAPSHOT_INTERVAL', 2), \
+         patch('app.services.vector_service.settings.VECTOR_INDEX_FLUSH_SECONDS', 3600):
+        service = VectorService()
+        service.start_flusher()
+
+        await service.add_something_embedding(1, np.random.randn(384).tolist())
+        await service.add_something_embedding(2, np.random.randn(384).tolist())
+        await wait_for_uploads(mock_bucket, 5)
+        assert service.index.log_seq == 2
+
+        # The next snapshot prunes entries covered by the previous one
+        await service.add_something_embedding(3, np.random.randn(384).tolist())
+        await service.add_something_embedding(4, np.random.randn(384).tolist())
+        await wait_for_uploads(mock_bucket, 10)
+
+        await service.stop_flusher()
+
+    assert [e.something_id for e in index_log.read_since(0)] == [3, 4]
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_flusher_snapshots_after_interval_and_on_stop(mock_create_client):
+    """Test a single change is flushed after VECTOR_INDEX_FLUSH_SECONDS and pending ones on shutdown"""
+    mock_bucket = MagicMock()
+    mock_create_client.return_value.storage.from_.return_value = mock_bucket
+
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_FLUSH_SECONDS', 0.05):
+        service = VectorService()
+        service.start_flusher()
+        await service.add_something_embedding(1, np.random.randn(384).tolist())
+        await wait_for_uploads(mock_bucket, 5)
+
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_FLUSH_SECONDS', 3600):
+        await service.add_something_embedding(2, np.random.randn(384).tolist())
+        assert mock_bucket.upload.call_count == 5  # Nothing uploaded on the request path
+
+        await service.stop_flusher()
+        assert mock_bucket.upload.call_count == 10
+        assert service._dirty_count == 0
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_failed_flush_keeps_changes_dirty(mock_create_client):
+    """Test changes stay pending when the upload fails"""
+    mock_bucket = MagicMock()
+    mock_bucket.upload.side_effect = Exception("Storage unavailable")
+    mock_create_client.return_value.storage.from_.return_value = mock_bucket
+
+    service = VectorService()
+    await service.add_something_embedding(1, np.random.randn(384).tolist())
+
+    with pytest.raises(Exception, match="Storage unavailable"):
+        await service.save_to_storage()
+    assert service._dirty_count == 1
+
+
+@pytest.mark.asyncio
+async def test_searches_run_concurrently():
+    """Test searches share the lock and run in worker threads while writers wait"""
+    import asyncio
+    import threading
+
+    service = VectorService()
+    service.index.add_batch([1, 2, 3], np.random.randn(3, 384).astype(np.float32))
+
+    # Both searches must be inside FAISS at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    search = service.index.search
+
+    def blocking_search(query, top_k):
+        barrier.wait()
+        return search(query, top_k)
+
+    service.index.search = blocking_search
+    query = np.random.randn(384).tolist()
+    results = await asyncio.gather(
+        service.search_similar(query, top_k=2),
+        service.search_similar(query, top_k=2)
+    )
+    assert [len(r) for r in results] == [2, 2]
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_snapshot_is_saved_without_blocking_searches_or_writes(mock_create_client):
+    """Test save_to_storage() saves a copy of the index off-lock, so captures and searches carry on meanwhile"""
+    import asyncio
+    import json
+    import threading
+
+    bucket = FakeBucket()
+    mock_create_client.return_value.storage.from_.return_value = bucket
+    service = VectorService()
+    embeddings = np.random.randn(3, 384).astype(np.float32)
+    service.index.add_batch([1, 2], embeddings[:2])
+    service.index.remove([2])
+
+    saving, release = threading.Event(), threading.Event()
+    save = VectorIndex.save
+
+    def blocking_save(index, filepath):
+        saving.set()
+        release.wait(5)
+        save(index, filepath)
+
+    with patch.object(VectorIndex, "save", blocking_save):
+        flush = asyncio.create_task(service.save_to_storage())
+        assert await asyncio.to_thread(saving.wait, 5)
+        await asyncio.wait_for(service.add_something_embedding(3, embeddings[2].tolist()), 1)
+        results = await asyncio.wait_for(service.search_similar(embeddings[2].tolist(), top_k=1), 1)
+        assert results[0][0] == 3
+        release.set()
+        await flush
+
+    pointer = json.loads(bucket.download("somethings_index.faiss.current"))
+    assert pointer["count"] == 1  # The copy taken before the capture, compacted
+    assert service.index.live_vectors == 2 and service.index.deleted_positions  # The live index is left alone
+
+
+@pytest.mark.asyncio
+async def test_search_similar_batch():
+    """Test batched search returns one result list per query, optionally user-scoped"""
+    service = VectorService()
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    service.index.add_batch([1, 2, 3, 4], embeddings)
+    user_id = str(uuid.uuid4())
+    service.user_indices.loader = lambda uid: service.index.get_embeddings([3, 4])
+
+    results = await service.search_similar_batch(embeddings[:2].tolist(), top_k=1)
+    assert [r[0][0] for r in results] == [1, 2]
+
+    results = await service.search_similar_batch(embeddings[:2].tolist(), top_k=4, user_id=user_id)
+    assert all({sid for sid, _ in r} == {3, 4} for r in results)
+
+
+@pytest.mark.asyncio
+async def test_search_similar_with_filter():
+    """Test filtered search is scoped to the user and skips excluded circles inside the scan"""
+    service = VectorService()
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+    embeddings = np.random.randn(4, 384).astype(np.float32)
+    for sid, owner in zip([1, 2, 3, 4], [alice, alice, alice, bob]):
+        await service.add_something_embedding(sid, embeddings[sid - 1].tolist(), user_id=owner, content_type="text")
+    assert await service.set_something_circles(1, [10])
+
+    results = await service.search_similar(
+        embeddings[0].tolist(), top_k=5, user_id=alice, search_filter=SearchFilter(exclude_circle_ids=[10])
+    )
+    assert {sid for sid, _ in results} == {2, 3}
+
+    results = await service.search_similar_batch(
+        embeddings[:1].tolist(), top_k=5, search_filter=SearchFilter(circle_ids=[10])
+    )
+    assert [sid for sid, _ in results[0]] == [1]
+
+    with pytest.raises(ValueError, match="scoped to user"):
+        await service.search_similar(embeddings[0].tolist(), user_id=alice, search_filter=SearchFilter(user_id=bob))
+
+
+@pytest.mark.asyncio
+async def test_initialize_backfills_filter_metadata():
+    """Test vectors without metadata (older snapshots, replayed log entries) are backfilled from the database"""
+    from datetime import datetime, timezone
+
+    service = VectorService()
+    user_id = str(uuid.uuid4())
+    embeddings = np.random.randn(2, 384).astype(np.float32)
+    service.index.add_batch([1, 2], embeddings)
+    assert service.index.missing_metadata_ids == [1, 2]
+
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [(1, user_id, "text", created), (2, user_id, "url", created)]
+    with patch.object(service, "_load_metadata", return_value=(rows, {2: [7]})) as mock_load:
+        await service._sync_metadata(reload_circles=True)
+    mock_load.assert_called_once_with([1, 2], [1, 2])
+
+    assert service.index.missing_metadata_ids == []
+    results = await service.search_similar(
+        embeddings[0].tolist(), top_k=5, user_id=user_id, search_filter=SearchFilter(content_types=["url"])
+    )
+    assert [sid for sid, _ in results] == [2]
+    results = await service.search_similar(embeddings[0].tolist(), search_filter=SearchFilter(circle_ids=[7]))
+    assert [sid for sid, _ in results] == [2]
+
+
+@pytest.mark.asyncio
+async def test_range_search_similar_scoped_to_user():
+    """Test duplicate lookups only consider the user's own somethings"""
+    service = VectorService()
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+    embedding = np.random.randn(384).astype(np.float32)
+    await service.add_something_embedding(1, embedding.tolist(), user_id=alice)
+    await service.add_something_embedding(2, (embedding * 1.01).tolist(), user_id=bob)
+    await service.add_something_embedding(3, np.random.randn(384).tolist(), user_id=alice)
+
+    # Ownership comes from the somethings table; stub the lookup with the index's own metadata
+    def fake_loader(user_id):
+        owned = service.index.metadata.mask(SearchFilter(user_id=user_id))[:service.index.total_vectors]
+        return service.index.get_embeddings(service.index.something_ids[owned].tolist())
+
+    service.user_indices.loader = fake_loader
+    results = await service.range_search_similar(embedding.tolist(), min_similarity=0.95, user_id=alice)
+    assert [sid for sid, _ in results] == [1]
+    results = await service.range_search_similar(embedding.tolist(), min_similarity=0.95)
+    assert {sid for sid, _ in results} == {1, 2}
+
+
+@pytest.mark.asyncio
+async def test_sync_from_log_applies_other_workers_changes(index_log):
+    """Test a worker catches up on another worker's captures by reading only new log entries"""
+    from datetime import datetime, timezone
+
+    writer, follower = VectorService(), VectorService()
+    user_id = str(uuid.uuid4())
+    embeddings = np.random.randn(3, 384).astype(np.float32)
+    await writer.add_something_embedding(1, embeddings[0].tolist(), user_id=user_id, content_type="text")
+    await writer.add_something_embedding(2, embeddings[1].tolist(), user_id=user_id, content_type="url")
+
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = [(1, user_id, "text", created), (2, user_id, "url", created)]
+    with patch.object(follower, "_load_metadata", return_value=(rows, {})) as mock_load:
+        assert await follower.sync_from_log() == 2
+    mock_load.assert_called_once_with([1, 2], [1, 2])
+    assert follower.index.log_seq == index_log.latest_seq()
+    results = await follower.search_similar(embeddings[1].tolist(), top_k=5, search_filter=SearchFilter(content_types=["url"]))
+    assert [sid for sid, _ in results] == [2]
+
+    # Only the delta past the high-water mark is read
+    await writer.remove_something_embedding(1, user_id=user_id)
+    if writer._maintenance_task is not None:
+        await writer._maintenance_task  # Compaction replays the log too
+    with patch.object(index_log, "read_since", wraps=index_log.read_since) as read_since:
+        assert await follower.sync_from_log() == 1
+    assert read_since.call_args_list[0].args[0] == 2
+    assert follower.index.live_vectors == 1
+    assert await follower.sync_from_log() == 0
+
+
+@pytest.mark.asyncio
+async def test_replay_past_pruned_log_reconciles(index_log):
+    """Test an index that fell behind the pruned part of the log is reconciled instead of missing changes"""
+    writer = VectorService()
+    for sid in range(1, 4):
+        await writer.add_something_embedding(sid, np.random.randn(384).tolist())
+    index_log.truncate_through(2)
+
+    follower = VectorService()
+    with patch.object(follower, "reconcile", AsyncMock(return_value=(2, 0))) as reconcile, \
+            patch.object(follower, "_sync_metadata", AsyncMock()):
+        assert await follower.sync_from_log() == 1
+        reconcile.assert_awaited_once()
+
+        # Caught up past the pruned prefix: replay alone suffices
+        reconcile.reset_mock()
+        await writer.add_something_embedding(4, np.random.randn(384).tolist())
+        assert await follower.sync_from_log() == 1
+        reconcile.assert_not_awaited()
+
+        # A rebuilt index from before the pruning is reconciled once swapped in
+        await follower.swap_index(VectorIndex(dimension=384))
+        reconcile.assert_awaited_once()
+    assert follower.index.log_seq == 4
+
+
+def test_high_water_mark_stays_below_recent_gap(monkeypatch):
+    """Test a sequence gap holds log_seq back until it is old enough to be a rolled-back write"""
+    from app.core.config import settings
+    from app.models.vector_index_log import VectorIndexLogEntry
+    from app.services.index_log_service import IndexLogService
+
+    service = VectorService()
+    embeddings = np.random.randn(2, 384).astype(np.float32)
+    entries = [
+        VectorIndexLogEntry(seq=seq, op="add", something_id=sid, embedding=IndexLogService.encode_embedding(e))
+        for seq, sid, e in [(1, 1, embeddings[0]), (3, 3, embeddings[1])]
+    ]
+
+    # Entries after the gap are applied, but the mark stays below it
+    assert service._apply_log_entries(entries) == [1, 3]
+    assert service.index.log_seq == 1
+    assert service.index.live_vectors == 2
+
+    monkeypatch.setattr(settings, "VECTOR_INDEX_SYNC_GAP_SECONDS", 0.0)
+    assert service._apply_log_entries(entries[1:]) == []
+    assert service.index.log_seq == 3
+    assert service._log_gaps == {}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_embeds_missing_and_drops_deleted(somethings_db):
+    """Test reconcile() fills holes and the tail past the snapshot and drops vectors of deleted rows"""
+    from app.models.something import Something
+    from app.services import vector_service as vector_service_module
+
+    user_id = uuid.uuid4()
+    db = somethings_db()
+    for sid in [1, 2, 3, 4, 5, 6, 7, 8, 10, 11, 12, 13, 14, 15, 16]:
+        db.add(Something(id=sid, user_id=user_id, content=None if sid == 13 else f"note {sid}", content_type="text"))
+    db.commit()
+    db.close()
+
+    service = VectorService()
+    indexed = [1, 2, 3, 4, 6, 7, 8, 9, 10, 11, 12]  # 5 was never logged, 9 was deleted, 14-16 came after the snapshot
+    service.index.add_batch(indexed, np.random.randn(len(indexed), 384).astype(np.float32))
+
+    def fake_embed(texts):
+        return np.random.randn(len(texts), 384).tolist()
+
+    with patch.object(vector_service_module, "RECONCILE_LEAF_IDS", 4), \
+            patch("app.services.embedding_service.embedding_service.model", MagicMock()), \
+            patch("app.services.embedding_service.embedding_service.generate_embeddings_batch", side_effect=fake_embed) as embed:
+        assert await service.reconcile() == (4, 1)
+        assert sorted(text for call in embed.call_args_list for text in call.args[0]) == ["note 14", "note 15", "note 16", "note 5"]
+
+        live = service.index.something_ids[service.index.contains(service.index.something_ids)]
+        assert sorted(live.tolist()) == [1, 2, 3, 4, 5, 6, 7, 8, 10, 11, 12, 14, 15, 16]
+        assert service.index.missing_metadata_ids == indexed[:7] + indexed[8:]  # Reconciled rows carry metadata
+
+        # Already in line: nothing to embed
+        embed.reset_mock()
+        assert await service.reconcile() == (0, 0)
+        embed.assert_not_called()
+
+
+class FakeBucket:
+    """In-memory stand-in for a Supabase Storage bucket"""
+
+    def __init__(self):
+        self.files = {}
+
+    def download(self, path):
+        if path not in self.files:
+            raise Exception(f"Object not found: {path}")
+        return self.files[path]
+
+    def upload(self, path, file, options=None):
+        self.files[path] = file.read() if hasattr(file, "read") else file
+
+    def list(self, path=None, options=None):
+        if path is None:
+            names = {name.split("/")[0] for name in self.files}
+        else:
+            names = {name[len(path) + 1:] for name in self.files if name.startswith(path + "/")}
+        return [{"name": name} for name in sorted(names)]
+
+    def remove(self, paths):
+        for path in paths:
+            self.files.pop(path, None)
+
+
+async def publish_index(service, tmp_path, ids, generation):
+    """Upload an index built elsewhere (as app.services.reindex does) as the current version"""
+    import os
+    from app.core.config import settings
+
+    index = VectorIndex(dimension=384, model=service.index.model)
+    index.add_batch(ids, np.random.randn(len(ids), 384).astype(np.float32))
+    index.generation = generation
+    index_path = os.path.join(tmp_path, f"rebuilt-{generation}.faiss")
+    index.save(index_path)
+    return await service.storage.publish_version(index_path, service.index_filename, settings.VECTOR_INDEX_KEEP_VERSIONS)
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_versions_are_published_through_pointer_and_pruned(mock_create_client):
+    """Test each snapshot is a new version, workers load the current one and old versions are deleted"""
+    bucket = FakeBucket()
+    mock_create_client.return_value.storage.from_.return_value = bucket
+
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_KEEP_VERSIONS', 2):
+        writer = VectorService()
+        versions = []
+        for something_id in range(1, 4):
+            await writer.add_something_embedding(something_id, np.random.randn(384).tolist())
+            await writer.save_to_storage()
+            versions.append(writer.version)
+
+    assert len(set(versions)) == 3
+    assert {entry["name"] for entry in bucket.list()} == set(versions[1:]) | {"somethings_index.faiss.current"}
+
+    reader = VectorService()
+    await reader.initialize()
+    assert reader.version == versions[-1]
+    assert sorted(reader.index.something_ids.tolist()) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_cached_version_is_loaded_without_download(mock_create_client, tmp_path):
+    """Test a restart loads the current version from VECTOR_INDEX_DIR, re-downloading only a corrupt or outdated copy"""
+    import os
+
+    bucket = FakeBucket()
+    mock_create_client.return_value.storage.from_.return_value = bucket
+    version = await publish_index(VectorService(), tmp_path, [1, 2], generation=1)
+    index_dir = str(tmp_path / "cache")
+
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_CACHE', True), \
+         patch('app.services.vector_service.settings.VECTOR_INDEX_DIR', index_dir), \
+         patch.object(bucket, "download", wraps=bucket.download) as download:
+        await VectorService().initialize()
+        artifact_downloads = [c.args[0] for c in download.call_args_list if c.args[0].startswith(version)]
+        assert len(artifact_downloads) == 4  # .faiss, .ids, .metadata, .meta
+
+        download.reset_mock()
+        restarted = VectorService()
+        await restarted.initialize()
+        assert restarted.version == version
+        assert sorted(restarted.index.something_ids.tolist()) == [1, 2]
+        assert not [c for c in download.call_args_list if c.args[0].startswith(version)]  # Only the pointer was read
+
+        # A damaged cached artifact fails its checksum and is fetched again
+        with open(os.path.join(index_dir, version, "somethings_index.faiss.ids"), "ab") as f:
+            f.write(b"garbage")
+        download.reset_mock()
+        repaired = VectorService()
+        await repaired.initialize()
+        assert sorted(repaired.index.something_ids.tolist()) == [1, 2]
+        assert any(c.args[0] == f"{version}/somethings_index.faiss.ids" for c in download.call_args_list)
+
+        # A new version is downloaded into its own directory
+        new_version = await publish_index(VectorService(), tmp_path, [1, 2, 3], generation=2)
+        download.reset_mock()
+        updated = VectorService()
+        await updated.initialize()
+        assert updated.version == new_version
+        assert any(c.args[0].startswith(new_version) for c in download.call_args_list)
+        assert os.path.isdir(os.path.join(index_dir, new_version))
+
+
+@pytest.mark.asyncio
+async def test_local_storage_publishes_chunked_compressed_versions(tmp_path):
+    """Test VECTOR_INDEX_STORAGE=local uploads versions as compressed chunks that another worker loads back"""
+    import json
+    import os
+
+    storage_dir = str(tmp_path / "storage")
+    embeddings = np.random.randn(50, 384).astype(np.float32)
+    with patch('app.services.vector_service.settings.VECTOR_INDEX_STORAGE', "local"), \
+         patch('app.services.vector_service.settings.VECTOR_INDEX_STORAGE_DIR', storage_dir), \
+         patch('app.services.vector_service.settings.VECTOR_INDEX_STORAGE_CHUNK_MB', 0.01):
+        writer = VectorService()
+        writer.index.add_batch(list(range(1, 51)), embeddings)
+        await writer.save_to_storage()
+
+        with open(os.path.join(storage_dir, "somethings_index.faiss.current")) as f:
+            layout = json.load(f)["layout"]
+        assert layout["codec"] == "zstd"
+        assert layout["chunks"][""] > 1  # ~77 KB of vectors in ~10 KB chunks
+        assert "somethings_index.faiss.part1" in os.listdir(os.path.join(storage_dir, writer.version))
+
+        reader = VectorService()
+        await reader.initialize()
+
+    assert reader.version == writer.version
+    assert reader.index.something_ids.tolist() == list(range(1, 51))
+    results = await reader.search_similar(embeddings[7].tolist(), top_k=1)
+    assert results[0][0] == 8
+
+
+@pytest.mark.asyncio
+async def test_swap_index_waits_for_running_searches():
+    """Test a replacement index catches up on the log off-lock and is swapped in after in-flight searches"""
+    import asyncio
+
+    service = VectorService()
+    embeddings = np.random.randn(3, 384).astype(np.float32)
+    await service.add_something_embedding(1, embeddings[0].tolist())
+    await service.add_something_embedding(2, embeddings[1].tolist())
+
+    replacement = service.index.clone()
+    await service.add_something_embedding(3, embeddings[2].tolist())  # Written while the replacement was built
+    service._circle_updates = {}
+    await service.set_something_circles(2, [9])
+    old_index = service.index
+
+    async with service._lock.read():
+        swap = asyncio.create_task(service.swap_index(replacement))
+        await asyncio.sleep(0.05)
+        assert service.index is old_index  # Searches in flight keep the old index
+        assert replacement.contains(np.array([3])).all()  # Caught up without the lock
+
+    await swap
+    service._circle_updates = None
+    assert service.index is replacement
+    results = await service.search_similar(embeddings[2].tolist(), top_k=1)
+    assert results[0][0] == 3
+    results = await service.search_similar(embeddings[1].tolist(), top_k=3, search_filter=SearchFilter(circle_ids=[9]))
+    assert [sid for sid, _ in results] == [2]
+
+    with pytest.raises(ValueError, match="model"):
+        await service.swap_index(VectorIndex(dimension=384, model="another-model"))
+
+
+@pytest.mark.asyncio
+@patch('app.services.index_storage.create_client')
+async def test_rebuilt_generation_is_adopted_and_corrupt_upload_rejected(mock_create_client, somethings_db, tmp_path):
+    """Test a worker swaps in a newer generation from storage and keeps its index when the upload is corrupt"""
+    bucket = FakeBucket()
+    mock_create_client.return_value.storage.from_.return_value = bucket
+
+    service = VectorService()
+    await service.add_something_embedding(1, np.random.randn(384).tolist())
+    await service.save_to_storage()
+    assert await service._adopt_rebuilt_version() is False  # Its own upload
+
+    version = await publish_index(service, tmp_path, [1, 2, 3], generation=5)
+    assert await service._adopt_rebuilt_version() is True
+    assert service.version == version
+    assert service.index.generation == 5
+    assert sorted(service.index.something_ids.tolist()) == [1, 2, 3]
+
+    version = await publish_index(service, tmp_path, [4], generation=6)
+    bucket.files[f"{version}/somethings_index.faiss.ids"] = np.array([5], dtype=np.int64).tobytes()
+    assert await service._adopt_rebuilt_version() is False
+    assert service.index.generation == 5
+    assert sorted(service.index.something_ids.tolist()) == [1, 2, 3]
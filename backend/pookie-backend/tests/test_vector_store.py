@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import pytest
+from app.ml.vector_store import VectorStore
+
+
+def test_append_and_take():
+    """Test rows are returned by position across appends"""
+    store = VectorStore(dimension=4)
+    vectors = np.random.randn(5, 4).astype(np.float32)
+    store.append(vectors[:2])
+    store.append(vectors[2:])
+
+    assert len(store) == 5
+    np.testing.assert_array_equal(store.take(np.array([4, 0])), vectors[[4, 0]])
+
+
+def test_save_and_mmap_load_with_tail(tmp_path):
+    """Test loaded rows stay memory-mapped and new rows go to the in-memory tail"""
+    vectors = np.random.randn(3, 4).astype(np.float32)
+    store = VectorStore(dimension=4)
+    store.append(vectors)
+    filepath = os.path.join(tmp_path, "test.vectors")
+    store.save(filepath)
+
+    loaded = VectorStore.load(filepath, dimension=4)
+    assert loaded.resident_bytes == 0
+    extra = np.random.randn(1, 4).astype(np.float32)
+    loaded.append(extra)
+
+    assert len(loaded) == 4
+    np.testing.assert_array_equal(loaded.take(np.array([3, 1])), np.vstack([extra, vectors[1:2]]))
+
+
+def test_load_rejects_wrong_dimension(tmp_path):
+    """Test a store saved with another dimension is rejected"""
+    store = VectorStore(dimension=4)
+    store.append(np.ones((1, 4), dtype=np.float32))
+    filepath = os.path.join(tmp_path, "test.vectors")
+    store.save(filepath)
+
+    with pytest.raises(ValueError, match="dimension mismatch"):
+        VectorStore.load(filepath, dimension=8)
+
+
+def test_float16_store_halves_bytes_and_widens_on_take(tmp_path):
+    """Test float16 rows take half the memory and disk, come back as float32 and keep their dtype across save/load"""
+    vectors = np.random.randn(2000, 384).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    full, half = VectorStore(dimension=384), VectorStore(dimension=384, dtype="float16")
+    full.append(vectors)
+    half.append(vectors)
+    assert half.resident_bytes * 2 == full.resident_bytes
+
+    taken = half.take(np.array([7, 3]))
+    assert taken.dtype == np.float32
+    np.testing.assert_allclose(taken, vectors[[7, 3]], atol=1e-3)
+
+    full.save(os.path.join(tmp_path, "full.vectors"))
+    half.save(os.path.join(tmp_path, "half.vectors"))
+    size = os.path.getsize(os.path.join(tmp_path, "half.vectors"))
+    assert size - 64 == (os.path.getsize(os.path.join(tmp_path, "full.vectors")) - 64) // 2
+    loaded = VectorStore.load(os.path.join(tmp_path, "half.vectors"), dimension=384)
+    assert loaded.dtype == "float16"
+    np.testing.assert_array_equal(loaded.take(np.array([7, 3])), taken)
+
+    with pytest.raises(ValueError, match="Unknown vector dtype"):
+        VectorStore(dimension=384, dtype="int8")